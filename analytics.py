@@ -1,11 +1,14 @@
 """
 Упрощённый аналитический движок на основе доступных данных API-Football
 """
+import asyncio
 import logging
 import math
-from typing import Dict, Optional, List
+from typing import Dict, Iterable, Optional, List, Tuple
 from datetime import datetime
 
+from models import Fixture
+
 logger = logging.getLogger(__name__)
 
 
@@ -19,12 +22,27 @@ class MatchAnalytics:
         self.standings_cache = {}
         self.h2h_cache = {}
 
-    async def analyze_match_70min(self, match_data: Dict, fixture_id: int) -> Optional[Dict]:
+    def prune_caches(self) -> int:
+        """
+        Удаляет турнирные таблицы прошлых дней (ключ кэша содержит дату)
+
+        Returns:
+            Сколько записей удалено
+        """
+        today = datetime.now().strftime('%Y-%m-%d')
+        stale = [key for key in self.standings_cache if not key.endswith(today)]
+
+        for key in stale:
+            del self.standings_cache[key]
+
+        return len(stale)
+
+    async def analyze_match_70min(self, match_data: Fixture, fixture_id: int) -> Optional[Dict]:
         """
         Полный анализ матча на 70-й минуте
 
         Args:
-            match_data: Базовые данные матча
+            match_data: Матч
             fixture_id: ID матча
 
         Returns:
@@ -35,15 +53,15 @@ class MatchAnalytics:
 
             # Получаем дополнительные данные
             statistics = await self.get_match_statistics(fixture_id)
-            standings = await self.get_standings(match_data['league']['id'], match_data['league']['season'])
+            standings = await self.get_standings(match_data.league_id, match_data.season)
             h2h = await self.get_h2h(
-                match_data['teams']['home']['id'],
-                match_data['teams']['away']['id']
+                match_data.home.id,
+                match_data.away.id
             )
 
             # Определяем проигрывающую команду
-            home_goals = match_data['goals']['home'] or 0
-            away_goals = match_data['goals']['away'] or 0
+            home_goals = match_data.score.home
+            away_goals = match_data.score.away
 
             if home_goals == away_goals:
                 logger.info(f"⚖️ Ничья - анализ камбэка не требуется")
@@ -167,6 +185,26 @@ class MatchAnalytics:
 
         return []
 
+    async def prefetch_standings(self, leagues: Iterable[Tuple[int, int]]) -> int:
+        """
+        Заранее загружает турнирные таблицы (чтобы анализ на 70-й минуте не ждал запроса)
+
+        Args:
+            leagues: Пары (ID лиги, сезон)
+
+        Returns:
+            Сколько таблиц загружено
+        """
+        leagues = set(leagues)
+        results = await asyncio.gather(*(
+            self.get_standings(league_id, season) for league_id, season in leagues
+        ))
+
+        loaded = sum(1 for standings in results if standings)
+        logger.info(f"📊 Заранее загружено {loaded} из {len(leagues)} турнирных таблиц")
+
+        return loaded
+
     async def get_h2h(self, home_team_id: int, away_team_id: int) -> List[Dict]:
         """Получает историю личных встреч (с кэшированием)"""
         cache_key = f"{min(home_team_id, away_team_id)}_{max(home_team_id, away_team_id)}"
@@ -192,7 +230,7 @@ class MatchAnalytics:
 
         return []
 
-    def calculate_match_importance(self, standings: List[Dict], match_data: Dict) -> Dict:
+    def calculate_match_importance(self, standings: List[Dict], match_data: Fixture) -> Dict:
         """
         Определяет важность матча на основе турнирной таблицы
         """
@@ -204,8 +242,8 @@ class MatchAnalytics:
                     'reason': 'Нет данных о таблице'
                 }
 
-            home_team_id = match_data['teams']['home']['id']
-            away_team_id = match_data['teams']['away']['id']
+            home_team_id = match_data.home.id
+            away_team_id = match_data.away.id
 
             # Находим команды в таблице
             home_standing = next((t for t in standings if t['team']['id'] == home_team_id), None)
@@ -260,8 +298,8 @@ class MatchAnalytics:
                     reason = 'Борьба за выживание'
 
             # 4. ДЕРБИ (бонус к важности)
-            home_name = match_data['teams']['home']['name'].lower()
-            away_name = match_data['teams']['away']['name'].lower()
+            home_name = match_data.home.name.lower()
+            away_name = match_data.away.name.lower()
 
             derby_cities = [
                 'manchester', 'liverpool', 'london', 'madrid', 'barcelona',
@@ -318,7 +356,7 @@ class MatchAnalytics:
                 'reason': 'Ошибка расчета'
             }
 
-    def calculate_comeback_probability(self, match_data: Dict, statistics: Optional[Dict],
+    def calculate_comeback_probability(self, match_data: Fixture, statistics: Optional[Dict],
                                       standings: List[Dict], h2h: List[Dict],
                                       losing_team: str, score_diff: int) -> Dict:
         """
@@ -398,7 +436,7 @@ class MatchAnalytics:
 
             # 2. ФОРМА КОМАНД (20% веса)
             if standings:
-                losing_team_id = match_data['teams'][losing_team]['id']
+                losing_team_id = match_data.team(losing_team).id
                 losing_form = self.get_team_form(standings, losing_team_id)
 
                 form_score = losing_form
@@ -420,7 +458,7 @@ class MatchAnalytics:
             if h2h:
                 h2h_score = self.analyze_h2h_pattern(
                     h2h,
-                    match_data['teams'][losing_team]['id']
+                    match_data.team(losing_team).id
                 )
                 probability += h2h_score * 0.10
                 factors['История встреч'] = f"{int(h2h_score * 100)}%"
@@ -468,7 +506,7 @@ class MatchAnalytics:
                 'emoji': '⚠️'
             }
 
-    def predict_remaining_goals(self, match_data: Dict, statistics: Optional[Dict],
+    def predict_remaining_goals(self, match_data: Fixture, statistics: Optional[Dict],
                                current_minute: int) -> Dict:
         """
         Прогноз голов на оставшееся время (70' - 90'+)
@@ -517,8 +555,8 @@ class MatchAnalytics:
             away_ratio = 1 - home_ratio
 
             # Корректировка: проигрывающая команда атакует активнее
-            home_goals = match_data['goals']['home'] or 0
-            away_goals = match_data['goals']['away'] or 0
+            home_goals = match_data.score.home
+            away_goals = match_data.score.away
 
             if home_goals < away_goals:  # Home проигрывает
                 home_ratio = min(0.75, home_ratio * 1.4)
@@ -560,7 +598,7 @@ class MatchAnalytics:
                 'over_1_5_prob': 35
             }
 
-    def calculate_stakes(self, standings: List[Dict], match_data: Dict, importance: Dict) -> Dict:
+    def calculate_stakes(self, standings: List[Dict], match_data: Fixture, importance: Dict) -> Dict:
         """
         Определяет что на кону в матче
         """
@@ -568,8 +606,8 @@ class MatchAnalytics:
             if not standings:
                 return {'summary': 'Нет данных о ставках'}
 
-            home_id = match_data['teams']['home']['id']
-            away_id = match_data['teams']['away']['id']
+            home_id = match_data.home.id
+            away_id = match_data.away.id
 
             home_standing = next((t for t in standings if t['team']['id'] == home_id), None)
             away_standing = next((t for t in standings if t['team']['id'] == away_id), None)
@@ -4,11 +4,11 @@
 """
 import asyncio
 import logging
-import json
-from pathlib import Path
+import time
 from datetime import datetime, timedelta
-from typing import Dict, Set
+from typing import Dict, Optional, Set, Tuple
 from functools import wraps
+import pytz
 from telegram import Update
 from telegram.ext import (
     Application,
@@ -22,14 +22,35 @@ from config import (
     CHECK_INTERVAL,
     CHECK_INTERVAL_ACTIVE,
     CHECK_INTERVAL_IDLE,
+    JANITOR_INTERVAL_MINUTES,
+    POLL_INTERVAL_FAST,
+    POLL_INTERVAL_SLOW_MAX,
+    POLL_KICKOFF_LOOKAHEAD_MINUTES,
+    MAX_CONCURRENT_MATCHES,
+    MATCH_PROCESSING_DEADLINE,
     MESSAGES,
-    MODE_70_MINUTE,
-    MODE_PENALTY_EARLY,
     ALLOWED_USERS,
-    ACCESS_DENIED_MESSAGE
+    ACCESS_DENIED_MESSAGE,
+    RULE_HELP_MESSAGE
 )
-from football_api import FootballAPI
+from database import Database
+from dedupe import NotificationDedupe
+from dispatcher import NotificationDispatcher
+from eligibility import EligibilityFilter
+from fixture_store import FixtureStore
+from football_api import FootballAPI, is_quota_exceeded
+from match_tracker import MatchTracker
+from metrics import metrics
+from models import Fixture, GoalEvent
+from modes import NotificationMode, build_default_registry
 from notifications import NotificationManager
+from outbox import NotificationOutbox
+from persistence import UserStatePersistence
+from poll_planner import PollPlanner
+from rules import RuleStore
+from subscriptions import Subscriptions
+from supervisor import ServiceSupervisor
+from timers import NUDGE, WakeupTimers
 
 # Настройка логирования
 logging.basicConfig(
@@ -88,100 +109,176 @@ class FootballBot:
     
     def __init__(self):
         self.api = FootballAPI()
+
+        # Единое хранилище матчей: расписание + live данные
+        self.store = FixtureStore()
         self.notification_manager = NotificationManager()
 
         # Аналитический движок
         from analytics import MatchAnalytics
         self.analytics = MatchAnalytics(self.api)
 
-        # JSON файл для сохранения активных пользователей
-        self.active_users_file = Path('active_users.json')
-        
         # Планировщик матчей (инициализируется позже)
         self.scheduler = None
         
         # Словарь для хранения состояния каждого пользователя
         self.user_states: Dict[int, Dict] = {}
         
-        # Множество для отслеживания уже отправленных уведомлений
-        self.sent_notifications: Set[tuple] = set()
+        # Индекс уже отправленных уведомлений (по отпечатку гола, с очисткой после FT)
+        self.dedupe = NotificationDedupe()
+        
+        # База данных и outbox уведомлений (переживают перезапуск)
+        self.db = Database()
+        self.outbox = NotificationOutbox(self.db)
+        
+        # Активные пользователи: отложенная запись пачками (БД или JSON файл)
+        self.persistence = UserStatePersistence(self.db)
+        
+        # Реестр режимов уведомлений (скомпилирован в таблицу по минутам)
+        self.modes = build_default_registry()
+        
+        # Пользовательские правила уведомлений (индекс по минуте и лиге)
+        self.rules = RuleStore(self.db)
+        
+        # Подписки на лиги и режимы + маска активных пользователей
+        self.subscriptions = Subscriptions((mode.key for mode in self.modes.modes), self.db)
+        
+        # Частота live опроса по близости матчей к окнам режимов и правил
+        self.poll_planner = PollPlanner(self.modes, self.rules.index, self.subscriptions)
+        
+        # Отсев матчей, которым события не нужны (ни один режим/правило не сработает)
+        self.eligibility = EligibilityFilter(self.modes, self.rules.index, self.subscriptions)
+        
+        # Обработанные голы каждого live матча: fixture_id -> MatchTracker
+        self.trackers: Dict[int, MatchTracker] = {}
+        
+        # Запомненные режимы: (fixture_id, отпечаток гола) -> режим или None
+        self.event_modes: Dict[Tuple[int, int], Optional[NotificationMode]] = {}
+        
+        # Запомненные тексты: (fixture_id, отпечаток гола, режим) -> текст уведомления
+        self.rendered_alerts: Dict[Tuple[int, int, str], str] = {}
         
         # Флаг работы глобального цикла
         self.global_loop_running = False
         
+        # Таймеры пробуждения глобального цикла + внешние толчки
+        self.timers = WakeupTimers()
+        
+        # Фоновые сервисы (по одному экземпляру, перезапуск после падения)
+        self.supervisor = ServiceSupervisor()
+        
+        # Ограничение параллельно обрабатываемых матчей
+        self.match_semaphore = asyncio.Semaphore(MAX_CONCURRENT_MATCHES)
+        
         # Application для доступа из глобального цикла
         self.application = None
+        
+        # Диспетчер исходящих уведомлений (инициализируется вместе с application)
+        self.dispatcher = None
     
-    def load_active_users(self):
-        """Загружает список активных пользователей из JSON файла"""
-        if self.active_users_file.exists():
-            try:
-                with open(self.active_users_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    logger.info(f"📂 Загружено {len(data)} активных пользователей")
-                    return data
-            except Exception as e:
-                logger.error(f"❌ Ошибка загрузки активных пользователей: {e}")
-        return []
+    async def restore_active_users(self) -> int:
+        """
+        Восстанавливает активных пользователей после перезапуска
+        (из БД, без DATABASE_URL - из JSON файла)
+
+        Returns:
+            Сколько пользователей восстановлено
+        """
+        rows = await self.persistence.load()
+        
+        restored = 0
+        for row in rows:
+            user_id = row['user_id']
+            
+            # Пользователя убрали из белого списка - не восстанавливаем
+            if user_id not in ALLOWED_USERS:
+                continue
+            
+            self.user_states[user_id] = {
+                'is_running': False,
+                'username': row.get('username', 'Unknown')
+            }
+            self.set_user_running(user_id, True)
+            restored += 1
+        
+        if restored:
+            logger.info(f"♻️ Восстановлено {restored} активных пользователей")
+        
+        return restored
     
-    def save_active_users(self):
-        """Сохраняет список активных пользователей в JSON файл"""
-        try:
-            active = [
-                {
-                    'user_id': uid,
-                    'username': info.get('username', 'Unknown'),
-                    'saved_at': datetime.now().isoformat()
-                }
-                for uid, info in self.user_states.items()
-                if info.get('is_running', False)
-            ]
-            with open(self.active_users_file, 'w', encoding='utf-8') as f:
-                json.dump(active, f, indent=2, ensure_ascii=False)
-            logger.info(f"💾 Сохранено {len(active)} активных пользователей")
-        except Exception as e:
-            logger.error(f"❌ Ошибка сохранения активных пользователей: {e}")
+    async def warm_up(self):
+        """
+        Прогрев после старта: расписание и турнирные таблицы лиг, где сегодня
+        может сработать режим с аналитикой (до начала первого окна)
+        """
+        await self.scheduler.update_daily_schedule()
+        
+        analytics_modes = [mode for mode in self.modes.modes if mode.needs_analytics]
+        end_of_today = self.scheduler.next_midnight()
+        
+        leagues = {
+            (fixture.league_id, fixture.season)
+            for fixture in self.store.by_kickoff(end=end_of_today)
+            if not fixture.status.is_finished
+            and fixture.league_id is not None and fixture.season is not None
+            and any(self.subscriptions.has_recipients(fixture.league_id, mode.key) for mode in analytics_modes)
+        }
+        
+        if leagues:
+            await self.analytics.prefetch_standings(leagues)
     
     def get_active_user_ids(self) -> list:
         """Возвращает список ID всех активных пользователей"""
-        return [
-            uid for uid, info in self.user_states.items()
-            if info.get('is_running', False)
-        ]
+        return self.subscriptions.active_user_ids()
+    
+    def set_user_running(self, user_id: int, is_running: bool):
+        """
+        Включает/выключает бота для пользователя (состояние + маска активных)
+        Сохранение - отложенное, пачкой в фоне (обработчик не ждёт диска/БД)
+        """
+        state = self.user_states[user_id]
+        state['is_running'] = is_running
+        self.subscriptions.set_active(user_id, is_running)
+        self.persistence.record(user_id, state.get('username', 'Unknown'), is_running)
     
     async def start_global_loop(self):
         """Запускает глобальный цикл проверки матчей (если ещё не запущен)"""
         if self.global_loop_running:
             logger.info("ℹ️ Глобальный цикл уже запущен")
+            # Будим цикл: новый пользователь - проверяем сразу, а не после сна
+            self.timers.nudge('новый активный пользователь')
             return
         
         self.global_loop_running = True
+        
+        # Цикл ещё не успел завершиться после остановки - он продолжит работу
+        if self.supervisor.is_running('live_poller'):
+            self.timers.nudge('перезапуск цикла')
+            return
+        
         logger.info("🚀 Запуск глобального цикла проверки матчей")
         
-        self.application.create_task(self.global_matches_check_loop())
+        self.supervisor.start('live_poller')
     
     async def stop_global_loop(self):
         """Останавливает глобальный цикл"""
         self.global_loop_running = False
+        self.timers.nudge('остановка цикла')
         logger.info("⏹ Глобальный цикл остановлен")
     
     async def global_matches_check_loop(self):
         """ГЛАВНЫЙ ЦИКЛ с умным расписанием - НЕ делает запросов когда матчей нет!"""
         logger.info("🔄 Глобальный цикл проверки матчей запущен")
         
-        # Загружаем расписание при старте
+        # Загружаем расписание при старте (из кэша - запрашиваются только недостающие даты).
+        # Плановые обновления делает отдельный сервис schedule_refresher
         await self.scheduler.update_daily_schedule()
         
-        # Запускаем автообновление расписания в 00:00
-        self.application.create_task(self.scheduler.schedule_daily_update())
-        
         iteration = 0
         
         while self.global_loop_running:
-            # Проверяем есть ли активные пользователи
-            active_users = self.get_active_user_ids()
-            
-            if not active_users:
+            # Проверяем есть ли активные пользователи (маска - O(1))
+            if not self.subscriptions.has_active():
                 logger.info("⚠️ Нет активных пользователей. Останавливаю глобальный цикл.")
                 self.global_loop_running = False
                 break
@@ -205,14 +302,16 @@ class FootballBot:
                         )
                         
                         # СПИМ до начала следующего матча (БЕЗ ЗАПРОСОВ!)
-                        await asyncio.sleep(sleep_seconds)
+                        # Сон прерывается таймерами и внешними толчками (/start, новое расписание)
+                        woke = await self.timers.sleep(sleep_seconds)
                         
-                        logger.info(f"⏰ ПРОСНУЛИСЬ! Начинаем проверку матчей...")
+                        reasons = ', '.join(wakeup.reason for wakeup in woke) or 'по времени'
+                        logger.info(f"⏰ ПРОСНУЛИСЬ ({reasons})! Начинаем проверку матчей...")
                         continue
                     else:
-                        # Нет матчей вообще - короткий сон
-                        logger.info("💤 Нет запланированных матчей. Сон 5 минут...")
-                        await asyncio.sleep(300)
+                        # Нет окон проверки - ждём ближайший таймер или толчок
+                        logger.info("💤 Нет запланированных матчей. Ждём таймер или новое расписание...")
+                        await self.timers.sleep()
                         continue
                 
                 # Если дошли сюда - ЕСТЬ матчи для проверки прямо СЕЙЧАС
@@ -220,7 +319,7 @@ class FootballBot:
                 
                 active_count = self.scheduler.get_active_matches_count()
                 logger.info(
-                    f"[Итерация {iteration}] ⚽ Проверка матчей для {len(active_users)} пользователей. "
+                    f"[Итерация {iteration}] ⚽ Проверка матчей для {self.subscriptions.active_count()} пользователей. "
                     f"Активных матчей: {active_count}"
                 )
                 
@@ -228,44 +327,57 @@ class FootballBot:
                 matches = await self.api.get_live_matches()
                 
                 # Проверка квоты
-                if matches and isinstance(matches, list) and len(matches) > 0:
-                    if matches[0].get('quota_exceeded'):
-                        for user_id in active_users:
-                            try:
-                                await self.application.bot.send_message(
-                                    chat_id=user_id,
-                                    text=MESSAGES['quota_exceeded']
-                                )
-                                self.user_states[user_id]['is_running'] = False
-                            except Exception as e:
-                                logger.error(f"❌ Ошибка уведомления {user_id}: {e}")
-                        
-                        self.save_active_users()
-                        logger.warning(f"⚠️ Квота исчерпана. Бот остановлен для всех.")
-                        self.global_loop_running = False
-                        break
+                if is_quota_exceeded(matches):
+                    await self.handle_quota_exceeded()
+                    break
+                
+                active_fixture_ids = {fixture.id for fixture in matches}
+                
+                # Матчи, пропавшие из live, - узнаём итоговый статус, чтобы закрыть их окна
+                vanished_ids = self.scheduler.vanished_from_live(active_fixture_ids)
+                if vanished_ids:
+                    final_fixtures = await self.api.get_fixtures_batch(vanished_ids)
+                    for fixture in final_fixtures:
+                        self.store.upsert(fixture)
+                    self.scheduler.update_fixtures(final_fixtures)
+                    self.scheduler.resolve_vanished(vanished_ids, final_fixtures)
+                
+                # Вливаем live снимок в общее хранилище; окна по статусам изменённых и идущих матчей
+                changed_fixtures = self.store.merge_live(matches)
+                self.scheduler.update_fixtures(changed_fixtures)
+                self.scheduler.update_fixtures(self.store.live())
                 
                 # Очистка кэша
                 if matches:
-                    active_fixture_ids = [
-                        self.api.format_match_info(match).get('fixture_id')
-                        for match in matches
-                        if isinstance(match, dict) and self.api.format_match_info(match).get('fixture_id')
-                    ]
                     self.api.clean_cache(active_fixture_ids)
+                    self.forget_finished_fixtures(active_fixture_ids)
                 
-                # Обрабатываем каждый матч для ВСЕХ пользователей
-                for match in matches:
-                    if not self.global_loop_running:
-                        break
-                    
-                    await self.process_match_for_all_users(match, active_users)
+                # Индекс дублей: завершённые матчи удаляются после периода ожидания
+                self.dedupe.retain_live(active_fixture_ids)
+                self.dedupe.prune()
                 
-                # Короткий интервал во время матчей
-                wait_time = CHECK_INTERVAL_ACTIVE
+                # События запрашиваем только там, где изменился счёт или статус
+                # (пачками по 20 матчей за запрос)
+                candidate_ids = self.api.diff_live_snapshot(matches)
+                
+                # ...и только матчам, которые ещё могут дать уведомление
+                refresh_ids = self.eligibility.filter(candidate_ids, self.store)
+                for fixture_id in candidate_ids - refresh_ids:
+                    self.skip_pruned_fixture(fixture_id)
+                
+                fresh_events = await self.api.get_events_batch(refresh_ids, force=True)
+                
+                # Обрабатываем матчи ПАРАЛЛЕЛЬНО для ВСЕХ пользователей
+                await self.process_matches_concurrently(matches, fresh_events)
+                
+                if not self.global_loop_running:
+                    break
+                
+                # Интервал по близости матчей к окнам режимов (замедляемся если квота на исходе)
+                wait_time = self.api.quota.adjust_interval(self.next_poll_interval())
                 logger.info(f"[Итерация {iteration}] ✅ Следующая проверка через {wait_time}с")
                 
-                await asyncio.sleep(wait_time)
+                await self.sleep_until_next_poll(wait_time)
                 
             except Exception as e:
                 logger.error(f"❌ Ошибка в глобальном цикле: {e}")
@@ -275,146 +387,320 @@ class FootballBot:
         
         logger.info("⏹ Глобальный цикл проверки завершён")
 
-        async def process_match_for_all_users(self, match: Dict, active_users: list):
-            """Обрабатывает один матч для ВСЕХ активных пользователей"""
-            try:
-                match_info = self.api.format_match_info(match)
-                fixture_id = match_info.get('fixture_id')
-
-                if not fixture_id:
+    async def schedule_refresh_loop(self):
+        """
+        Сервис планового обновления расписания (SCHEDULE_REFRESH_HOURS, МСК)
+        Работает в фоне - live опросы не ждут запросов расписания
+        """
+        while True:
+            refresh_at = self.scheduler.next_refresh_time()
+            sleep_seconds = max(0.0, refresh_at.timestamp() - time.time())
+            
+            logger.info(
+                f"⏰ Следующее обновление расписания через {sleep_seconds / 3600:.1f}ч "
+                f"({refresh_at.strftime('%H:%M')} МСК)"
+            )
+            await asyncio.sleep(sleep_seconds)
+            
+            # Перезапрашиваем сегодня и завтра, будим цикл если окна изменились
+            if await self.scheduler.update_daily_schedule(refresh=True):
+                self.timers.nudge('обновлено расписание')
+    
+    async def cache_janitor_loop(self):
+        """Сервис уборки: кэши событий, индекс дублей, старые таблицы, записи outbox"""
+        while True:
+            await asyncio.sleep(JANITOR_INTERVAL_MINUTES * 60)
+            await self.clean_caches()
+    
+    async def clean_caches(self):
+        """Чистит то, что глобальный цикл не чистит сам (или не чистит, пока остановлен)"""
+        if not self.supervisor.is_running('live_poller'):
+            live_ids = {fixture.id for fixture in self.store.live()}
+            self.api.clean_cache(live_ids)
+            self.forget_finished_fixtures(live_ids)
+        
+        self.dedupe.prune()
+        
+        stale_tables = self.analytics.prune_caches()
+        if stale_tables:
+            logger.info(f"🧹 Удалено {stale_tables} турнирных таблиц прошлых дней")
+        
+        await self.outbox.purge_expired()
+    
+    async def sleep_until_next_poll(self, seconds: float):
+        """
+        Пауза между live опросами
+        Прерывается раньше только толчком или подходом матча к окну режима -
+        начала/концы окон других матчей во время опросов ничего не меняют
+        """
+        deadline = time.time() + seconds
+        
+        while self.global_loop_running:
+            woke = await self.timers.sleep(max(0.0, deadline - time.time()))
+            
+            if any(wakeup.key == NUDGE or (isinstance(wakeup.key, tuple) and wakeup.key[1] == 'approach')
+                   for wakeup in woke):
+                return
+            
+            if time.time() >= deadline:
+                return
+    
+    def next_poll_interval(self) -> int:
+        """Секунды до следующего live опроса (5с у окон режимов, 30-60с вдали от них)"""
+        now = datetime.now(pytz.utc)
+        upcoming = (
+            fixture for fixture in self.store.by_kickoff(now, now + timedelta(minutes=POLL_KICKOFF_LOOKAHEAD_MINUTES))
+            if fixture.status.short == 'NS'
+        )
+        # Пропавший матч с неизвестным итогом не держит частый опрос
+        live = (fixture for fixture in self.store.live() if not self.scheduler.is_abandoned(fixture.id))
+        return self.poll_planner.next_interval(live, upcoming)
+    
+    async def handle_quota_exceeded(self):
+        """Квота исчерпана: уведомляет пользователей и останавливает глобальный цикл (один раз)"""
+        if not self.global_loop_running:
+            return
+        
+        self.global_loop_running = False
+        
+        for user_id in self.get_active_user_ids():
+            self.set_user_running(user_id, False)
+            await self.dispatcher.enqueue(user_id, MESSAGES['quota_exceeded'])
+        
+        logger.warning(f"⚠️ Квота исчерпана. Бот остановлен для всех.")
+    
+    async def process_matches_concurrently(self, matches: list, fresh_events: Dict[int, list]):
+        """
+        Обрабатывает все live матчи параллельно
+        
+        - не больше MAX_CONCURRENT_MATCHES матчей одновременно
+        - на всю итерацию MATCH_PROCESSING_DEADLINE секунд, зависшие матчи отменяются
+          (необработанные голы подхватит следующая итерация - они не помечены отправленными)
+        - ошибка одного матча не влияет на остальные
+        """
+        if not matches:
+            return
+        
+        async def run(match: Fixture):
+            async with self.match_semaphore:
+                if not self.global_loop_running:
                     return
+                await self.process_match_for_all_users(match, fresh_events)
+        
+        tasks = [asyncio.create_task(run(match)) for match in matches]
+        done, pending = await asyncio.wait(tasks, timeout=MATCH_PROCESSING_DEADLINE)
+        
+        if pending:
+            logger.warning(
+                f"⏱ {len(pending)} из {len(tasks)} матчей не успели обработаться "
+                f"за {MATCH_PROCESSING_DEADLINE}с - отменяем"
+            )
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        
+        for task in done:
+            if not task.cancelled() and task.exception():
+                logger.error(f"❌ Ошибка обработки матча: {task.exception()}")
+    
+    def evaluate_event_mode(self, match: Fixture, event: GoalEvent) -> Optional[NotificationMode]:
+        """
+        Определяет режим уведомления для гола (с запоминанием)
+        
+        Returns:
+            Режим или None если гол не подходит ни под один режим
+        """
+        key = (match.id, event.fingerprint)
+        
+        if key in self.event_modes:
+            return self.event_modes[key]
+        
+        # Проверяются только режимы, в окно которых попадает минута гола
+        mode = self.modes.match(match, event)
+        
+        self.event_modes[key] = mode
+        return mode
+    
+    async def render_alert(self, match: Fixture, event: GoalEvent, mode: NotificationMode) -> str:
+        """
+        Готовит текст уведомления (аналитика + рендеринг) ОДИН раз
+        на (матч, отпечаток события, режим) - результат запоминается
+        """
+        key = (match.id, event.fingerprint, mode.key)
+        
+        if key in self.rendered_alerts:
+            return self.rendered_alerts[key]
+        
+        analytics_result = None
+        
+        # Аналитика - только для режимов, которым она нужна ("70 минута")
+        if mode.needs_analytics:
+            logger.info(f"🔍 Запускаем аналитику для матча {match.id}")
+            analytics_result = await self.analytics.analyze_match_70min(match, match.id)
+        
+        if analytics_result:
+            # Уведомление С аналитикой
+            text = self.notification_manager.create_goal_notification_with_analytics(
+                match, event, mode.name, analytics_result
+            )
+        else:
+            # Обычное уведомление (другие режимы или аналитика не сработала)
+            text = self.notification_manager.create_goal_notification(match, event, mode.name)
+        
+        self.rendered_alerts[key] = text
+        return text
+    
+    def forget_finished_fixtures(self, active_fixture_ids: Set[int]):
+        """Удаляет трекеры, запомненные режимы и тексты уведомлений для матчей вне live"""
+        for fixture_id in [fixture_id for fixture_id in self.trackers if fixture_id not in active_fixture_ids]:
+            del self.trackers[fixture_id]
+        
+        for memo in (self.event_modes, self.rendered_alerts):
+            for key in [key for key in memo if key[0] not in active_fixture_ids]:
+                del memo[key]
+    
+    def skip_pruned_fixture(self, fixture_id: int):
+        """
+        Матч отсеян: события не запрашиваем, а его голы помечаем пропущенными -
+        иначе после следующей смены счёта они пришли бы как новые и проверялись
+        бы по уже другому счёту
+        """
+        self.api.events_pending.pop(fixture_id, None)
+        
+        fixture = self.store.get(fixture_id)
+        if fixture is None or fixture.status.elapsed is None:
+            return
+        
+        tracker = self.trackers.get(fixture_id)
+        if tracker is None:
+            tracker = self.trackers[fixture_id] = MatchTracker(fixture_id)
+        
+        tracker.skip_goals(fixture.score.total, fixture.status.elapsed)
+    
+    def forget_event(self, fixture_id: int, fingerprint: int):
+        """Удаляет запомненный режим и тексты отменённого гола"""
+        for memo in (self.event_modes, self.rendered_alerts):
+            for key in [key for key in memo if key[0] == fixture_id and key[1] == fingerprint]:
+                del memo[key]
+    
+    async def process_match_for_all_users(self, match: Fixture, fresh_events: Dict[int, list]):
+        """
+        Обрабатывает один матч для всех активных пользователей
+        (получатели - только подписанные на лигу матча и режим)
+        """
+        try:
+            fixture_id = match.id
 
-                # ОДИН запрос событий на всех пользователей!
-                events = await self.api.get_match_events(fixture_id)
+            # События уже получены пачкой (счёт/статус изменился) или берутся из кэша
+            if fixture_id in fresh_events:
+                events = fresh_events[fixture_id]
+            else:
+                events = self.api.get_cached_events(fixture_id)
 
-                # Проверка квоты
-                if events and isinstance(events, list) and len(events) > 0:
-                    if events[0].get('quota_exceeded'):
-                        for user_id in active_users:
-                            try:
-                                await self.application.bot.send_message(
-                                    chat_id=user_id,
-                                    text=MESSAGES['quota_exceeded']
-                                )
-                                self.user_states[user_id]['is_running'] = False
-                            except Exception as e:
-                                logger.error(f"❌ Ошибка уведомления {user_id}: {e}")
-
-                        self.save_active_users()
-                        self.global_loop_running = False
-                        return
-
-                # Обрабатываем события для каждого пользователя
-                for event in events:
-                    # Проверяем что это гол
-                    if not self.notification_manager.is_goal_event(event):
+            # Проверка квоты
+            if is_quota_exceeded(events):
+                await self.handle_quota_exceeded()
+                return
+
+            tracker = self.trackers.get(fixture_id)
+            if tracker is None:
+                tracker = self.trackers[fixture_id] = MatchTracker(fixture_id)
+            
+            # В обработку идут только голы, появившиеся с прошлого опроса
+            changes = tracker.diff(events)
+            
+            if not changes:
+                return
+            
+            for event in changes.cancelled:
+                logger.info(
+                    f"🚫 Гол отменён (VAR/правка API): {match.home.name} vs {match.away.name}, "
+                    f"мин {event.minute}, {event.player}"
+                )
+                self.forget_event(fixture_id, event.fingerprint)
+            
+            for event in changes.corrected:
+                logger.info(f"✏️ Гол исправлен API: матч {fixture_id}, мин {event.minute}, {event.player}")
+            
+            for event in changes.new:
+                # Режим определяется ОДИН раз на событие, а не на каждого пользователя
+                mode = self.evaluate_event_mode(match, event)
+
+                if mode:
+                    recipients = self.subscriptions.recipients(match.league_id, mode.key)
+                    pending_users = self.dedupe.pending_users(fixture_id, event.fingerprint, recipients)
+
+                    if pending_users:
+                        # Аналитика и текст - ОДИН раз на событие, дальше рассылка
+                        notification_text = await self.render_alert(match, event, mode)
+                        await self.deliver_alert(match, event, pending_users, notification_text, mode.name)
+                
+                # Пользовательские правила: только правила с подходящими минутой и лигой
+                for rule in self.rules.match(match, event):
+                    if not self.subscriptions.is_active(rule.user_id):
+                        continue
+                    
+                    if not self.dedupe.pending_users(fixture_id, event.fingerprint, (rule.user_id,)):
                         continue
+                    
+                    notification_text = self.notification_manager.create_goal_notification(
+                        match, event, f"📐 Правило #{rule.id}: {rule.describe()}"
+                    )
+                    await self.deliver_alert(match, event, [rule.user_id], notification_text, f"правило #{rule.id}")
+            
+            # Голы обработаны - следующий опрос начнёт с этого места
+            tracker.commit(events)
 
-                    minute = event.get('time', {}).get('elapsed', 0)
-                    player_name = event.get('player', {}).get('name', '')
-
-                    # ИСПРАВЛЕНИЕ: Объявляем переменные ДО цикла по пользователям
-                    team_name = event.get('team', {}).get('name', '')
-                    event_type = event.get('type', '')
-                    detail = event.get('detail', '')
-                    event_timestamp = event.get('time', {}).get('elapsed', 0)
-                    event_extra = event.get('time', {}).get('extra', 0)
-                    assist_player = event.get('assist', {}).get('name', 'no_assist')
-                    comments = event.get('comments', '')
-
-                    # Проверяем для КАЖДОГО пользователя
-                    for user_id in active_users:
-                        # Создаём МАКСИМАЛЬНО уникальный ключ для предотвращения дублей
-                        event_key = (
-                            user_id,
-                            fixture_id,
-                            minute,
-                            event_timestamp,
-                            event_extra,
-                            player_name,
-                            team_name,
-                            event_type,
-                            detail,
-                            assist_player,
-                            comments[:20] if comments else ''
-                        )
+        except Exception as e:
+            logger.error(f"❌ Ошибка обработки матча: {e}")
+            import traceback
+            logger.error(traceback.format_exc())
 
-                        # Уже отправляли этому пользователю?
-                        if event_key in self.sent_notifications:
-                            continue
-
-                        # Определяем нужно ли уведомление
-                        should_notify = False
-                        mode_name = ""
-
-                        # Режим "70 минута" - только первый гол на 69-70 минуте
-                        if self.notification_manager.should_notify_70_minute_mode(minute, match_info, event):
-                            should_notify = True
-                            mode_name = MODE_70_MINUTE['name']
-
-                        # Режим "Пенальти 2-10 мин" - пенальти на 2-10 минуте
-                        elif self.notification_manager.should_notify_penalty_early_mode(minute, event):
-                            should_notify = True
-                            mode_name = MODE_PENALTY_EARLY['name']
-
-                        # Отправляем уведомление
-                        if should_notify:
-                            try:
-                                # НОВОЕ: Для режима "70 минута" делаем аналитику
-                                if mode_name == MODE_70_MINUTE['name']:
-                                    logger.info(f"🔍 Запускаем аналитику для матча {fixture_id}")
-
-                                    analytics_result = await self.analytics.analyze_match_70min(
-                                        match,  # Передаем весь объект матча
-                                        fixture_id
-                                    )
-
-                                    if analytics_result:
-                                        # Уведомление С аналитикой
-                                        notification_text = self.notification_manager.create_goal_notification_with_analytics(
-                                            match_info,
-                                            event,
-                                            mode_name,
-                                            analytics_result
-                                        )
-                                    else:
-                                        # Обычное уведомление (если аналитика не сработала)
-                                        notification_text = self.notification_manager.create_goal_notification(
-                                            match_info,
-                                            event,
-                                            mode_name
-                                        )
-                                else:
-                                    # Для других режимов - обычное уведомление
-                                    notification_text = self.notification_manager.create_goal_notification(
-                                        match_info,
-                                        event,
-                                        mode_name
-                                    )
-
-                                await self.application.bot.send_message(
-                                    chat_id=user_id,
-                                    text=notification_text,
-                                    parse_mode='Markdown',
-                                    disable_web_page_preview=True
-                                )
-
-                                self.sent_notifications.add(event_key)
-
-                                logger.info(
-                                    f"⚽ Уведомление → {user_id}: "
-                                    f"{match_info.get('home_team', '?')} vs {match_info.get('away_team', '?')}, "
-                                    f"мин {minute}, режим: {mode_name}"
-                                )
-                            except Exception as e:
-                                logger.error(f"❌ Ошибка отправки уведомления {user_id}: {e}")
-                                import traceback
-                                logger.error(traceback.format_exc())
+    async def deliver_alert(self, match: Fixture, event: GoalEvent, user_ids: list,
+                            text: str, reason: str):
+        """Фиксирует уведомление в outbox и ставит его в очередь получателям"""
+        # Сначала фиксируем в outbox (пачкой), потом отправляем
+        await self.outbox.add(match.id, event.fingerprint, user_ids, text)
 
-            except Exception as e:
-                logger.error(f"❌ Ошибка обработки матча: {e}")
-                import traceback
-                logger.error(traceback.format_exc())
+        for user_id in user_ids:
+            # Только ставим в очередь - отправляет диспетчер.
+            # Отправленным помечаем после постановки: если очередь полна и обработку
+            # отменили по таймауту, оставшиеся получат гол на следующей итерации
+            await self.enqueue_alert(user_id, match.id, event.fingerprint, text)
+            self.dedupe.mark_sent(match.id, event.fingerprint, (user_id,))
+
+        logger.info(
+            f"⚽ Уведомление в очередь → {len(user_ids)} польз.: "
+            f"{match.home.name} vs {match.away.name}, "
+            f"мин {event.minute}, режим: {reason}"
+        )
+
+    async def enqueue_alert(self, user_id: int, fixture_id: int, fingerprint: int, text: str):
+        """Ставит уведомление о голе в очередь; после доставки помечает его в outbox"""
+        await self.dispatcher.enqueue(
+            user_id,
+            text,
+            parse_mode='Markdown',
+            disable_web_page_preview=True,
+            on_delivered=lambda message: self.outbox.mark_delivered(user_id, fixture_id, fingerprint)
+        )
+
+    async def recover_outbox(self):
+        """
+        Восстанавливает состояние после перезапуска:
+        уже записанные уведомления не отправляются повторно,
+        недоставленные свежие - отправляются
+        """
+        recent, to_replay = await self.outbox.recover()
+
+        for row in recent:
+            self.dedupe.mark_sent(row['fixture_id'], row['fingerprint'], (row['user_id'],))
+
+        for row in to_replay:
+            await self.enqueue_alert(row['user_id'], row['fixture_id'], row['fingerprint'], row['text'])
+
+        if to_replay:
+            logger.info(f"📦 Повторно поставлено в очередь {len(to_replay)} уведомлений")
 
     @private_access_required
     async def start_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -433,10 +719,8 @@ class FootballBot:
             return
         
         # Активируем пользователя
-        self.user_states[user_id]['is_running'] = True
         self.user_states[user_id]['username'] = user.first_name
-        
-        self.save_active_users()
+        self.set_user_running(user_id, True)
         
         # Отправляем приветственное сообщение
         welcome_message = MESSAGES['welcome'].format(name=user.first_name)
@@ -456,34 +740,189 @@ class FootballBot:
             await update.message.reply_text(MESSAGES['not_running'])
             return
         
-        self.user_states[user_id]['is_running'] = False
-        self.save_active_users()
+        self.set_user_running(user_id, False)
         
         await update.message.reply_text(MESSAGES['stopped'])
         logger.info(f"⛔ Бот остановлен для {user_id}")
         
         # Останавливаем глобальный цикл если нет активных пользователей
-        active_users = self.get_active_user_ids()
-        if not active_users:
+        if not self.subscriptions.has_active():
             await self.stop_global_loop()
     
+    @private_access_required
+    async def status_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /status - состояние фоновых сервисов (только админ)"""
+        if update.effective_user.id != ADMIN_ID:
+            await update.message.reply_text("🚫 Команда доступна только администратору")
+            return
+        
+        counters = metrics.snapshot()
+        lines = [
+            "🛠 Сервисы:",
+            self.supervisor.report(),
+            "",
+            f"👥 Активных пользователей: {self.subscriptions.active_count()}",
+            f"⚽ Матчей в хранилище: {len(self.store)} (live: {self.store.count_live()})",
+            f"⏰ Таймеров пробуждения: {len(self.timers)}",
+            f"📮 Отправлено: {self.dispatcher.sent_count}, в очереди: {self.dispatcher.queue.qsize()}, "
+            f"не доставлено: {len(self.dispatcher.dead_letters)}",
+            f"📊 Квота API: {self.api.quota.used_today}/{self.api.quota.daily_limit}",
+        ]
+        
+        if counters:
+            lines.append("")
+            lines.append("📈 Счётчики:")
+            lines.extend(f"  {name}: {value}" for name, value in sorted(counters.items()))
+        
+        await update.message.reply_text('\n'.join(lines))
+    
+    @private_access_required
+    async def rule_add_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /rule_add - добавляет правило уведомлений"""
+        user_id = update.effective_user.id
+        spec = ' '.join(context.args or [])
+        
+        if not spec:
+            await update.message.reply_text(RULE_HELP_MESSAGE, parse_mode='Markdown')
+            return
+        
+        try:
+            rule = await self.rules.add(user_id, spec)
+        except ValueError as e:
+            await update.message.reply_text(f"❌ {e}")
+            await update.message.reply_text(RULE_HELP_MESSAGE, parse_mode='Markdown')
+            return
+        
+        await update.message.reply_text(f"✅ Правило #{rule.id} добавлено: {rule.describe()}")
+    
+    @private_access_required
+    async def rules_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /rules - показывает правила пользователя"""
+        user_rules = self.rules.for_user(update.effective_user.id)
+        
+        if not user_rules:
+            await update.message.reply_text(f"📐 Правил пока нет.\n\n{RULE_HELP_MESSAGE}", parse_mode='Markdown')
+            return
+        
+        lines = [f"#{rule.id}: {rule.describe()}" for rule in user_rules]
+        await update.message.reply_text(
+            "📐 Твои правила:\n\n" + '\n'.join(lines) + "\n\nУдалить: /rule\\_del <номер>",
+            parse_mode='Markdown'
+        )
+    
+    @private_access_required
+    async def rule_del_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /rule_del - удаляет правило"""
+        try:
+            rule_id = int((context.args or [''])[0].lstrip('#'))
+        except ValueError:
+            await update.message.reply_text("⚠️ Укажи номер правила: /rule_del 3")
+            return
+        
+        if await self.rules.delete(update.effective_user.id, rule_id):
+            await update.message.reply_text(f"🗑 Правило #{rule_id} удалено")
+        else:
+            await update.message.reply_text(f"⚠️ Правило #{rule_id} не найдено")
+    
+    @private_access_required
+    async def leagues_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        Обработчик команды /leagues - подписка на лиги
+        
+        /leagues             - текущая подписка и лиги сегодняшних матчей
+        /leagues 39 140      - только эти лиги
+        /leagues +39 / -39   - добавить / убрать лигу
+        /leagues all         - все лиги
+        """
+        user_id = update.effective_user.id
+        args = context.args or []
+        
+        if args:
+            leagues = self.subscriptions.leagues_of(user_id)
+            
+            if args == ['all']:
+                leagues = None
+            else:
+                try:
+                    if all(arg[0] in '+-' for arg in args):
+                        # Изменение текущей подписки
+                        leagues = set(leagues) if leagues is not None else set()
+                        for arg in args:
+                            if arg[0] == '+':
+                                leagues.add(int(arg[1:]))
+                            else:
+                                leagues.discard(int(arg[1:]))
+                    else:
+                        leagues = {int(arg) for arg in args}
+                except ValueError:
+                    await update.message.reply_text("⚠️ Нужны ID лиг: /leagues 39 140, /leagues +39, /leagues all")
+                    return
+                
+                if not leagues:
+                    leagues = None
+            
+            await self.subscriptions.set_leagues(user_id, leagues)
+        
+        leagues = self.subscriptions.leagues_of(user_id)
+        
+        if leagues is None:
+            message = "🔔 Подписка: все лиги\n"
+        else:
+            message = f"🔔 Подписка: лиги {', '.join(str(league_id) for league_id in sorted(leagues))}\n"
+        
+        # Лиги сегодняшних матчей - подсказка с ID
+        today_leagues = {}
+        for fixture in self.store.all():
+            if fixture.league_id is not None:
+                today_leagues[fixture.league_id] = f"{fixture.league_name} ({fixture.league_country})"
+        
+        if today_leagues:
+            message += "\n📅 Лиги сегодня:\n"
+            for league_id in sorted(today_leagues)[:40]:
+                mark = '✅' if leagues is None or league_id in leagues else '▫️'
+                message += f"{mark} {league_id} - {today_leagues[league_id]}\n"
+        
+        message += "\nИзменить: /leagues 39 140, /leagues +39, /leagues -39, /leagues all"
+        await update.message.reply_text(message)
+    
+    @private_access_required
+    async def modes_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Обработчик команды /modes - включение/выключение режимов (/modes <ключ>)"""
+        user_id = update.effective_user.id
+        args = context.args or []
+        
+        if args:
+            modes = set(self.subscriptions.modes_of(user_id))
+            
+            for key in args:
+                if self.modes.get(key) is None:
+                    await update.message.reply_text(f"⚠️ Нет режима «{key}»")
+                    return
+                modes ^= {key}
+            
+            await self.subscriptions.set_modes(user_id, modes)
+        
+        enabled = self.subscriptions.modes_of(user_id)
+        lines = [
+            f"{'✅' if mode.key in enabled else '❌'} {mode.name} - {mode.key}"
+            for mode in self.modes.modes
+        ]
+        await update.message.reply_text(
+            "🎛 Режимы:\n\n" + '\n'.join(lines) + "\n\nВключить/выключить: /modes <ключ>"
+        )
+    
     @private_access_required
     async def games_command(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Обработчик команды /games - показывает матчи на сегодня"""
         try:
-            import pytz
-            
-            if not self.scheduler or not self.scheduler.today_fixtures:
+            if not len(self.store):
                 await update.message.reply_text("⚠️ Расписание матчей ещё не загружено. Попробуйте позже.")
                 return
             
-            fixtures = self.scheduler.today_fixtures
-            
-            # Фильтруем только активные (не завершённые)
-            active_fixtures = [
-                f for f in fixtures
-                if f.get('fixture', {}).get('status', {}).get('short') not in ['FT', 'AET', 'PEN', 'CANC', 'ABD', 'AWD', 'WO']
-            ]
+            # Фильтруем только активные (не завершённые), по времени начала - до конца сегодняшнего дня
+            # (в хранилище и завтрашнее расписание). Хранилище обновляется каждым live опросом
+            end_of_today = self.scheduler.next_midnight() - timedelta(seconds=1)
+            active_fixtures = [f for f in self.store.by_kickoff(end=end_of_today) if not f.status.is_finished]
             
             total_count = len(active_fixtures)
             
@@ -509,36 +948,18 @@ class FootballBot:
             
             for idx, fixture in enumerate(display_fixtures, 1):
                 try:
-                    home = fixture.get('teams', {}).get('home', {}).get('name', '?')
-                    away = fixture.get('teams', {}).get('away', {}).get('name', '?')
-                    league = fixture.get('league', {}).get('name', '?')
-                    league_country = fixture.get('league', {}).get('country', '')
-                    
                     # Переводим
-                    home_ru = translate_team(home)
-                    away_ru = translate_team(away)
-                    league_ru = translate_league(league, league_country)
+                    home_ru = translate_team(fixture.home.name)
+                    away_ru = translate_team(fixture.away.name)
+                    league_ru = translate_league(fixture.league_name, fixture.league_country)
                     
-                    # Время матча
-                    fixture_date_str = fixture.get('fixture', {}).get('date')
-                    
-                    if fixture_date_str:
-                        try:
-                            utc_time = datetime.fromisoformat(fixture_date_str.replace('Z', '+00:00'))
-                            moscow_tz = pytz.timezone('Europe/Moscow')
-                            moscow_time = utc_time.astimezone(moscow_tz)
-                            time_str = moscow_time.strftime('%H:%M')
-                        except:
-                            time_str = "TBD"
-                    else:
-                        time_str = "TBD"
+                    # Время матча (по Москве, посчитано при разборе ответа API)
+                    time_str = fixture.kickoff_time_str
                     
                     # Статус
-                    status = fixture.get('fixture', {}).get('status', {}).get('short', 'NS')
-                    
-                    if status in ['1H', '2H', 'HT', 'ET', 'BT', 'P', 'LIVE']:
+                    if fixture.status.is_live:
                         status_emoji = "🔴"
-                        elapsed = fixture.get('fixture', {}).get('status', {}).get('elapsed', '')
+                        elapsed = fixture.status.elapsed
                         if elapsed:
                             time_str = f"{elapsed}'"
                     else:
@@ -562,6 +983,43 @@ class FootballBot:
             logger.error(traceback.format_exc())
             await update.message.reply_text("❌ Ошибка при получении списка матчей")
     
+    async def post_init(self, application: Application):
+        """Запускается после инициализации application (внутри event loop)"""
+        await self.db.connect()
+        await self.rules.load()
+        await self.subscriptions.load()
+        await self.outbox.open()
+        self.supervisor.start('outbox_flusher')
+        self.supervisor.start('persistence')
+        self.supervisor.start('dispatcher')
+        self.supervisor.start('schedule_refresher')
+        self.supervisor.start('cache_janitor')
+        await self.recover_outbox()
+        
+        # Пользователи, которые были активны до перезапуска, - сразу под наблюдением
+        if await self.restore_active_users():
+            await self.start_global_loop()
+            self.supervisor.start('warm_up')
+    
+    async def post_stop(self, application: Application):
+        """
+        Запускается после остановки application, но до bot.shutdown() -
+        отправка в Telegram ещё работает, поэтому очередь уведомлений досылаем здесь
+        """
+        for name in ('live_poller', 'warm_up', 'schedule_refresher', 'cache_janitor'):
+            await self.supervisor.stop(name)
+        
+        # Диспетчер досылает очередь, затем снимается и его сервис
+        await self.dispatcher.stop()
+        await self.supervisor.stop('dispatcher')
+    
+    async def post_shutdown(self, application: Application):
+        """Запускается при остановке application (бот уже закрыт - только хранилища)"""
+        await self.supervisor.stop_all()
+        await self.persistence.close()
+        await self.outbox.close()
+        await self.db.close()
+    
     async def cleanup(self):
         """Очистка ресурсов"""
         await self.api.close_session()
@@ -569,22 +1027,52 @@ class FootballBot:
     
     def start(self):
         """Запуск бота"""
-        application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+        application = (
+            Application.builder()
+            .token(TELEGRAM_BOT_TOKEN)
+            .post_init(self.post_init)
+            .post_stop(self.post_stop)
+            .post_shutdown(self.post_shutdown)
+            .build()
+        )
         
         # Сохраняем ссылку на application
         self.application = application
+        self.dispatcher = NotificationDispatcher(application.bot)
         
         # Инициализируем планировщик
         from scheduler import MatchScheduler
-        self.scheduler = MatchScheduler(self.api)
+        self.scheduler = MatchScheduler(
+            self.api, self.store,
+            timers=self.timers,
+            approach_offsets=self.poll_planner.approach_offsets
+        )
+        
+        # Фоновые сервисы (запускаются в post_init и по /start)
+        self.supervisor.register('live_poller', self.global_matches_check_loop)
+        self.supervisor.register('schedule_refresher', self.schedule_refresh_loop)
+        self.supervisor.register('outbox_flusher', self.outbox.run)
+        self.supervisor.register('persistence', self.persistence.run)
+        self.supervisor.register('dispatcher', self.dispatcher.run)
+        self.supervisor.register('cache_janitor', self.cache_janitor_loop)
+        self.supervisor.register('warm_up', self.warm_up, restart=False)
         
         application.add_handler(CommandHandler("start", self.start_command))
         application.add_handler(CommandHandler("stop", self.stop_command))
         application.add_handler(CommandHandler("games", self.games_command))
+        application.add_handler(CommandHandler("status", self.status_command))
+        application.add_handler(CommandHandler("rule_add", self.rule_add_command))
+        application.add_handler(CommandHandler("rules", self.rules_command))
+        application.add_handler(CommandHandler("rule_del", self.rule_del_command))
+        application.add_handler(CommandHandler("leagues", self.leagues_command))
+        application.add_handler(CommandHandler("modes", self.modes_command))
         application.add_error_handler(error_handler)
         
         logger.info(f"🤖 Бот запущен!")
-        logger.info(f"⚡ Интервал проверки: {CHECK_INTERVAL_ACTIVE}с (активные) / {CHECK_INTERVAL_IDLE}с (неактивные)")
+        logger.info(
+            f"⚡ Интервал проверки: {POLL_INTERVAL_FAST}-{POLL_INTERVAL_SLOW_MAX}с (активные, по окнам режимов) / "
+            f"{CHECK_INTERVAL_IDLE}с (неактивные)"
+        )
         application.run_polling(
             allowed_updates=Update.ALL_TYPES,
             drop_pending_updates=True
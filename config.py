@@ -21,6 +21,75 @@ CHECK_INTERVAL = 15                # Базовый интервал 15 секу
 CHECK_INTERVAL_ACTIVE = 15         # 15 секунд когда есть live матчи
 CHECK_INTERVAL_IDLE = 300          # 5 минут когда матчей нет (экономия)
 
+# Адаптивный опрос live матчей (по окнам режимов и правил)
+POLL_INTERVAL_FAST = 5             # Матч в окне режима или вот-вот в него войдёт
+POLL_INTERVAL_SLOW_MIN = 30        # Все матчи далеко от окон (перерыв, «пустые» минуты)
+POLL_INTERVAL_SLOW_MAX = 60
+POLL_FAST_LEAD_MINUTES = 2         # За сколько игровых минут до окна переходим на быстрый опрос
+POLL_ACTIVE_LEAD_MINUTES = 5       # За сколько минут до окна опрашиваем раз в CHECK_INTERVAL_ACTIVE
+POLL_KICKOFF_LOOKAHEAD_MINUTES = 10  # Учитываем матчи, которые начнутся в ближайшие N минут
+
+# Скользящее расписание (даты по Москве): вчера, сегодня, завтра
+SCHEDULE_DAYS_BEFORE = 1           # Вчерашние матчи, которые идут после полуночи
+SCHEDULE_DAYS_AFTER = 1            # Завтрашние матчи (ночные игры Южной Америки)
+SCHEDULE_REFRESH_HOURS = (0, 6, 12)  # Часы (МСК) фонового обновления - вне пика матчей
+SCHEDULE_STALE_HOURS = 6           # Расписание на дату старше N часов перезапрашивается при старте цикла
+
+# Насколько раньше текущей минуты мог быть забит гол, о котором API сообщил только сейчас
+ELIGIBILITY_LOOKBACK_MINUTES = 10
+
+# Параллельная обработка live матчей
+MAX_CONCURRENT_MATCHES = 10        # Сколько матчей обрабатываем одновременно
+MATCH_PROCESSING_DEADLINE = 12     # Секунд на обработку всех матчей за итерацию
+
+# Сколько минут после изменения счёта дозапрашиваем события, пока в них не появится гол
+# (API публикует событие гола через 30с - 2мин после счёта)
+EVENTS_CATCHUP_MINUTES = 5
+
+# Сколько минут помним отправленные уведомления после окончания матча
+DEDUPE_GRACE_MINUTES = 30
+
+# Отправка уведомлений в Telegram
+TELEGRAM_GLOBAL_RATE = 30          # Сообщений в секунду на бота
+TELEGRAM_PER_CHAT_RATE = 1         # Сообщений в секунду в один чат
+NOTIFY_WORKERS = 4                 # Воркеров отправки
+NOTIFY_QUEUE_SIZE = 1000           # Максимум сообщений в очереди
+NOTIFY_MAX_ATTEMPTS = 5            # Попыток доставки одного сообщения
+DEAD_LETTER_LIMIT = 500            # Сколько недоставленных сообщений помним
+
+# Outbox уведомлений (переживает перезапуск бота)
+OUTBOX_SQLITE_FILE = 'outbox.sqlite3'  # Локальный outbox когда нет DATABASE_URL
+OUTBOX_FLUSH_INTERVAL = 0.05       # Секунд копим записи перед групповой записью
+OUTBOX_RETENTION_HOURS = 6         # Сколько часов храним записи (защита от повторов)
+OUTBOX_REPLAY_MINUTES = 15         # Недоставленные записи младше этого отправляются повторно
+
+# Пользовательские правила уведомлений
+RULES_FILE = 'user_rules.json'     # Хранилище правил когда нет DATABASE_URL
+MAX_RULES_PER_USER = 20
+
+# Подписки пользователей на лиги и режимы (когда нет DATABASE_URL)
+SUBSCRIPTIONS_FILE = 'user_subscriptions.json'
+
+# Сохранение активных пользователей (write-behind)
+ACTIVE_USERS_FILE = 'active_users.json'  # Хранилище когда нет DATABASE_URL
+PERSIST_DEBOUNCE_SECONDS = 2       # Пишем через N секунд после последнего изменения
+PERSIST_MAX_DELAY_SECONDS = 10     # ...но не позже N секунд после первого несохранённого
+
+# Фоновые сервисы (супервизор)
+SUPERVISOR_BACKOFF_INITIAL = 1     # Первая задержка перезапуска упавшего сервиса, сек
+SUPERVISOR_BACKOFF_MAX = 300       # Максимальная задержка перезапуска, сек
+JANITOR_INTERVAL_MINUTES = 30      # Как часто чистим кэши и устаревшие записи
+
+# Лимиты API-Football (уточняются по заголовкам каждого ответа)
+API_DAILY_LIMIT = 75000            # Запросов в сутки (сброс в 00:00 UTC)
+API_MINUTE_LIMIT = 450             # Запросов в минуту
+API_QUOTA_LEDGER_FILE = 'api_quota.json'
+
+# Пороги расхода суточной квоты (доля от лимита)
+QUOTA_WARN_RATIO = 0.70            # Предупреждение в лог
+QUOTA_SLOWDOWN_RATIO = 0.80        # Интервал опроса x2
+QUOTA_CRITICAL_RATIO = 0.90        # Интервал опроса x4
+
 # Настройки режимов
 MODE_70_MINUTE = {
     'name': '🎯 Режим "70 минута"',
@@ -234,6 +303,10 @@ LEAGUES_TO_TRACK = [
     286,  # Premier League
 ]
 
+# Сколько лиг передаём в одном запросе live=39-140-78-...
+# (весь список укладывается в один запрос; делим только если он разрастётся)
+LIVE_LEAGUES_PER_REQUEST = 100
+
 # Белый список разрешённых пользователей (Telegram ID)
 ALLOWED_USERS = [
     662347602,    #admin
@@ -251,6 +324,21 @@ ACCESS_DENIED_MESSAGE = """
 Для получения доступа свяжитесь с администратором и отправьте ему этот ID.
 """
 
+# Подсказка по правилам (/rule_add)
+RULE_HELP_MESSAGE = """
+📐 **Свои правила уведомлений**
+
+`/rule_add min=80-85 score=first league=136`
+`/rule_add min=0-15 goal=own`
+
+• `min` - окно минут (обязательно)
+• `score` - any, first (первый гол), draw (сравняли), lead (забившие впереди)
+• `goal` - any, normal (с игры), penalty, own (автогол)
+• `league` - ID лиг через запятую (по умолчанию все)
+
+Список: /rules
+"""
+
 # Текстовые сообщения
 MESSAGES = {
     'welcome': '''👋 Привет, {name}!
@@ -4,7 +4,7 @@
 import os
 import logging
 import asyncpg
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -56,6 +56,36 @@ class Database:
                 )
             ''')
 
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS notification_outbox (
+                    user_id BIGINT NOT NULL,
+                    fixture_id BIGINT NOT NULL,
+                    fingerprint BIGINT NOT NULL,
+                    text TEXT NOT NULL,
+                    created_at TIMESTAMP NOT NULL DEFAULT (NOW() AT TIME ZONE 'UTC'),
+                    delivered_at TIMESTAMP,
+                    PRIMARY KEY (user_id, fixture_id, fingerprint)
+                )
+            ''')
+
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS user_rules (
+                    rule_id SERIAL PRIMARY KEY,
+                    user_id BIGINT NOT NULL,
+                    spec TEXT NOT NULL,
+                    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+                )
+            ''')
+
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS user_subscriptions (
+                    user_id BIGINT PRIMARY KEY,
+                    leagues BIGINT[],
+                    modes TEXT[] NOT NULL,
+                    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+                )
+            ''')
+
             logger.info("✅ Таблицы созданы/проверены")
 
     async def save_user(self, user_id: int, username: str, is_running: bool = True):
@@ -84,6 +114,24 @@ class Database:
         except Exception as e:
             logger.error(f"❌ Ошибка сохранения пользователя {user_id}: {e}")
 
+    async def save_users(self, rows: List[Tuple[int, str, bool]]):
+        """
+        Сохраняет пачку пользователей ОДНИМ запросом (executemany upsert)
+
+        Args:
+            rows: Список (user_id, username, is_running)
+        """
+        async with self.pool.acquire() as conn:
+            await conn.executemany('''
+                INSERT INTO active_users (user_id, username, is_running, updated_at)
+                VALUES ($1, $2, $3, NOW())
+                ON CONFLICT (user_id)
+                DO UPDATE SET
+                    username = EXCLUDED.username,
+                    is_running = EXCLUDED.is_running,
+                    updated_at = NOW()
+            ''', rows)
+
     async def get_active_users(self) -> List[Dict]:
         """
         Получает список активных пользователей
@@ -169,6 +217,182 @@ class Database:
             logger.error(f"❌ Ошибка получения пользователя {user_id}: {e}")
             return None
 
+    async def add_rule(self, user_id: int, spec: str) -> Optional[int]:
+        """
+        Сохраняет правило пользователя
+
+        Args:
+            user_id: Telegram ID пользователя
+            spec: Текст правила (см. rules.py)
+
+        Returns:
+            ID правила или None при ошибке
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                rule_id = await conn.fetchval('''
+                    INSERT INTO user_rules (user_id, spec)
+                    VALUES ($1, $2)
+                    RETURNING rule_id
+                ''', user_id, spec)
+
+            logger.info(f"💾 Правило #{rule_id} пользователя {user_id} сохранено в БД")
+            return rule_id
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка сохранения правила пользователя {user_id}: {e}")
+            return None
+
+    async def get_rules(self) -> List[Dict]:
+        """
+        Получает правила всех пользователей
+
+        Returns:
+            Список словарей (rule_id, user_id, spec)
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch('''
+                    SELECT rule_id, user_id, spec
+                    FROM user_rules
+                    ORDER BY rule_id
+                ''')
+
+                rules = [dict(row) for row in rows]
+
+                logger.info(f"📂 Загружено {len(rules)} правил из БД")
+                return rules
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки правил: {e}")
+            return []
+
+    async def delete_rule(self, user_id: int, rule_id: int) -> bool:
+        """
+        Удаляет правило пользователя
+
+        Returns:
+            True если правило было удалено
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                result = await conn.execute('''
+                    DELETE FROM user_rules
+                    WHERE rule_id = $1 AND user_id = $2
+                ''', rule_id, user_id)
+
+            return result.endswith(' 1')
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка удаления правила #{rule_id}: {e}")
+            return False
+
+    async def save_subscription(self, user_id: int, leagues: Optional[List[int]], modes: List[str]):
+        """
+        Сохраняет подписки пользователя
+
+        Args:
+            user_id: Telegram ID пользователя
+            leagues: ID лиг (None - все лиги)
+            modes: Включённые режимы
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                await conn.execute('''
+                    INSERT INTO user_subscriptions (user_id, leagues, modes, updated_at)
+                    VALUES ($1, $2, $3, NOW())
+                    ON CONFLICT (user_id)
+                    DO UPDATE SET
+                        leagues = $2,
+                        modes = $3,
+                        updated_at = NOW()
+                ''', user_id, leagues, modes)
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка сохранения подписок пользователя {user_id}: {e}")
+
+    async def get_subscriptions(self) -> List[Dict]:
+        """
+        Получает подписки всех пользователей
+
+        Returns:
+            Список словарей (user_id, leagues, modes)
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch('''
+                    SELECT user_id, leagues, modes
+                    FROM user_subscriptions
+                ''')
+
+                return [
+                    {
+                        'user_id': row['user_id'],
+                        'leagues': list(row['leagues']) if row['leagues'] is not None else None,
+                        'modes': list(row['modes'])
+                    }
+                    for row in rows
+                ]
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки подписок: {e}")
+            return []
+
+    async def insert_outbox(self, rows: List[Tuple[int, int, int, str]]):
+        """
+        Записывает пачку уведомлений в outbox ОДНИМ запросом
+
+        Args:
+            rows: Список (user_id, fixture_id, fingerprint, text)
+        """
+        async with self.pool.acquire() as conn:
+            await conn.executemany('''
+                INSERT INTO notification_outbox (user_id, fixture_id, fingerprint, text)
+                VALUES ($1, $2, $3, $4)
+                ON CONFLICT (user_id, fixture_id, fingerprint) DO NOTHING
+            ''', rows)
+
+    async def mark_outbox_delivered(self, keys: List[Tuple[int, int, int]]):
+        """
+        Помечает пачку уведомлений доставленными
+
+        Args:
+            keys: Список (user_id, fixture_id, fingerprint)
+        """
+        async with self.pool.acquire() as conn:
+            await conn.executemany('''
+                UPDATE notification_outbox
+                SET delivered_at = NOW() AT TIME ZONE 'UTC'
+                WHERE user_id = $1 AND fixture_id = $2 AND fingerprint = $3
+            ''', keys)
+
+    async def get_outbox(self, since: datetime) -> List[Dict]:
+        """
+        Получает уведомления outbox, созданные после указанного момента
+
+        Args:
+            since: Момент времени (UTC)
+
+        Returns:
+            Список словарей с данными уведомлений
+        """
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT user_id, fixture_id, fingerprint, text, created_at, delivered_at IS NOT NULL AS delivered
+                FROM notification_outbox
+                WHERE created_at >= $1
+                ORDER BY created_at
+            ''', since)
+
+            return [dict(row) for row in rows]
+
+    async def purge_outbox(self, before: datetime):
+        """Удаляет из outbox уведомления старше указанного момента (UTC)"""
+        async with self.pool.acquire() as conn:
+            await conn.execute('''
+                DELETE FROM notification_outbox WHERE created_at < $1
+            ''', before)
+
     async def close(self):
         """Закрывает подключение к базе данных"""
         if self.pool:
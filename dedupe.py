@@ -0,0 +1,94 @@
+"""
+Индекс уже отправленных уведомлений
+Память ограничена числом live матчей, а не временем работы бота
+"""
+import logging
+import time
+from typing import Dict, Iterable, List, Set
+
+from config import DEDUPE_GRACE_MINUTES
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationDedupe:
+    """
+    fixture_id -> отпечаток гола (64 бита) -> множество ID уведомлённых пользователей
+
+    Когда матч пропадает из live (FT и т.п.), его записи живут ещё
+    DEDUPE_GRACE_MINUTES минут (на случай запоздавших правок API) и удаляются
+    """
+
+    def __init__(self, grace_seconds: float = DEDUPE_GRACE_MINUTES * 60):
+        self.grace_seconds = grace_seconds
+
+        self._sent: Dict[int, Dict[int, Set[int]]] = {}
+
+        # Матчи вне live: fixture_id -> момент удаления (time.monotonic)
+        self._expires_at: Dict[int, float] = {}
+
+    def __len__(self) -> int:
+        """Количество отслеживаемых матчей"""
+        return len(self._sent)
+
+    def is_sent(self, fixture_id: int, fingerprint: int, user_id: int) -> bool:
+        users = self._sent.get(fixture_id, {}).get(fingerprint)
+        return users is not None and user_id in users
+
+    def pending_users(self, fixture_id: int, fingerprint: int, user_ids: Iterable[int]) -> List[int]:
+        """
+        Оставляет пользователей, которым это событие ещё не отправляли
+
+        Args:
+            fixture_id: ID матча
+            fingerprint: Отпечаток гола
+            user_ids: Кандидаты на уведомление
+
+        Returns:
+            Список ID пользователей без уведомления
+        """
+        users = self._sent.get(fixture_id, {}).get(fingerprint)
+
+        if not users:
+            return list(user_ids)
+
+        return [user_id for user_id in user_ids if user_id not in users]
+
+    def mark_sent(self, fixture_id: int, fingerprint: int, user_ids: Iterable[int]):
+        """Запоминает что пользователи получили уведомление о событии"""
+        self._sent.setdefault(fixture_id, {}).setdefault(fingerprint, set()).update(user_ids)
+
+    def retain_live(self, live_fixture_ids: Set[int]):
+        """
+        Ставит на удаление матчи, которые пропали из live,
+        и снимает с удаления вернувшиеся (сбой API)
+
+        Args:
+            live_fixture_ids: ID матчей из последнего live опроса
+        """
+        deadline = time.monotonic() + self.grace_seconds
+
+        for fixture_id in self._sent:
+            if fixture_id in live_fixture_ids:
+                self._expires_at.pop(fixture_id, None)
+            elif fixture_id not in self._expires_at:
+                self._expires_at[fixture_id] = deadline
+
+    def prune(self) -> int:
+        """
+        Удаляет записи матчей, у которых истёк период ожидания
+
+        Returns:
+            Сколько матчей удалено
+        """
+        now = time.monotonic()
+        expired = [fixture_id for fixture_id, deadline in self._expires_at.items() if deadline <= now]
+
+        for fixture_id in expired:
+            del self._expires_at[fixture_id]
+            self._sent.pop(fixture_id, None)
+
+        if expired:
+            logger.info(f"🧹 Индекс дублей: удалено {len(expired)} завершённых матчей, осталось {len(self._sent)}")
+
+        return len(expired)
@@ -0,0 +1,272 @@
+"""
+Диспетчер исходящих уведомлений Telegram
+Очередь + пул воркеров с соблюдением лимитов Telegram (≈30 сообщений/с всего, 1/с в чат)
+"""
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Callable, Deque, Dict, List, Optional
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from config import (
+    TELEGRAM_GLOBAL_RATE,
+    TELEGRAM_PER_CHAT_RATE,
+    NOTIFY_WORKERS,
+    NOTIFY_QUEUE_SIZE,
+    NOTIFY_MAX_ATTEMPTS,
+    DEAD_LETTER_LIMIT
+)
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class OutgoingMessage:
+    """Сообщение в очереди на отправку"""
+
+    __slots__ = ('chat_id', 'text', 'parse_mode', 'disable_web_page_preview', 'attempts', 'on_delivered')
+
+    def __init__(self, chat_id: int, text: str, parse_mode: Optional[str] = None,
+                 disable_web_page_preview: Optional[bool] = None,
+                 on_delivered: Optional[Callable[['OutgoingMessage'], None]] = None):
+        self.chat_id = chat_id
+        self.text = text
+        self.parse_mode = parse_mode
+        self.disable_web_page_preview = disable_web_page_preview
+        self.attempts = 0
+        self.on_delivered = on_delivered
+
+
+class NotificationDispatcher:
+    """
+    Отправляет сообщения из очереди пулом воркеров
+
+    - глобальное ведро токенов (лимит бота) и ведро на каждый чат
+    - RetryAfter: пауза для всех воркеров + повтор сообщения
+    - чат исчерпал свой лимит: сообщение откладывается, воркер берёт следующее
+    - BadRequest с разметкой: один повтор простым текстом
+    - сетевые ошибки: повтор с экспоненциальной задержкой
+    - неустранимые ошибки и исчерпанные попытки: список «мёртвых» сообщений
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=NOTIFY_QUEUE_SIZE)
+        self.workers: List[asyncio.Task] = []
+
+        self.global_bucket = TokenBucket(TELEGRAM_GLOBAL_RATE, TELEGRAM_GLOBAL_RATE)
+        self.chat_buckets: Dict[int, TokenBucket] = {}
+
+        # Telegram попросил подождать (RetryAfter) - до этого момента никто не отправляет
+        self.paused_until = 0.0
+
+        # Сообщения, которые так и не удалось доставить
+        self.dead_letters: Deque[Dict] = deque(maxlen=DEAD_LETTER_LIMIT)
+
+        # Отложенные сообщения (лимит чата / повтор), ещё не вернувшиеся в очередь
+        self.deferred = 0
+
+        self.sent_count = 0
+        self.retry_count = 0
+
+    @property
+    def is_running(self) -> bool:
+        return any(not worker.done() for worker in self.workers)
+
+    def start(self):
+        """Запускает пул воркеров (повторный вызов ничего не делает)"""
+        if self.is_running:
+            return
+
+        self.workers = [
+            asyncio.create_task(self._worker(n), name=f'notify-worker-{n}')
+            for n in range(NOTIFY_WORKERS)
+        ]
+        logger.info(f"📮 Диспетчер уведомлений запущен ({NOTIFY_WORKERS} воркеров)")
+
+    async def run(self):
+        """
+        Сервис для супервизора: запускает воркеров и ждёт их
+        Упавший воркер - исключение (супервизор перезапустит пул), stop() - нормальное завершение
+        """
+        self.start()
+        workers = list(self.workers)
+
+        try:
+            done, _ = await asyncio.wait(workers, return_when=asyncio.FIRST_EXCEPTION)
+        except asyncio.CancelledError:
+            for worker in workers:
+                worker.cancel()
+            self.workers = []
+            raise
+
+        for worker in done:
+            if not worker.cancelled() and worker.exception() is not None:
+                for other in workers:
+                    other.cancel()
+                self.workers = []
+                raise worker.exception()
+
+    async def stop(self, drain_timeout: float = 5):
+        """
+        Останавливает воркеров, дав им дослать очередь
+
+        Args:
+            drain_timeout: Сколько секунд ждать опустошения очереди
+        """
+        if not self.workers:
+            return
+
+        try:
+            await asyncio.wait_for(self._drain(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(
+                f"⚠️ Осталось неотправленных сообщений: {self.queue.qsize() + self.deferred}"
+            )
+
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+        logger.info(
+            f"📮 Диспетчер остановлен: отправлено {self.sent_count}, "
+            f"повторов {self.retry_count}, не доставлено {len(self.dead_letters)}"
+        )
+
+    async def enqueue(self, chat_id: int, text: str, parse_mode: Optional[str] = None,
+                      disable_web_page_preview: Optional[bool] = None,
+                      on_delivered: Optional[Callable[[OutgoingMessage], None]] = None):
+        """
+        Ставит сообщение в очередь (ждёт только если очередь переполнена)
+
+        Args:
+            chat_id: ID чата
+            text: Текст сообщения
+            parse_mode: Режим разметки
+            disable_web_page_preview: Отключить превью ссылок
+            on_delivered: Вызывается после успешной доставки
+        """
+        await self.queue.put(OutgoingMessage(
+            chat_id, text, parse_mode, disable_web_page_preview, on_delivered
+        ))
+
+    async def _drain(self):
+        """Ждёт, пока опустеет очередь и вернутся все отложенные сообщения"""
+        while True:
+            await self.queue.join()
+
+            if not self.deferred:
+                return
+
+            await asyncio.sleep(0.1)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self.chat_buckets.get(chat_id)
+
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(1, TELEGRAM_PER_CHAT_RATE)
+
+        return bucket
+
+    def _dead_letter(self, message: OutgoingMessage, reason: str):
+        """Кладёт сообщение в список недоставленных"""
+        self.dead_letters.append({
+            'chat_id': message.chat_id,
+            'text': message.text,
+            'attempts': message.attempts,
+            'reason': reason,
+            'failed_at': datetime.now().isoformat()
+        })
+        logger.error(f"💀 Сообщение для {message.chat_id} не доставлено ({message.attempts} попыток): {reason}")
+
+    def _requeue(self, message: OutgoingMessage):
+        self.deferred -= 1
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self._dead_letter(message, 'очередь переполнена при повторе')
+
+    def _retry_later(self, message: OutgoingMessage, delay: float, reason: str):
+        """Планирует повтор без блокировки воркера"""
+        if message.attempts >= NOTIFY_MAX_ATTEMPTS:
+            self._dead_letter(message, reason)
+            return
+
+        self.retry_count += 1
+        logger.warning(f"🔁 Повтор для {message.chat_id} через {delay:.1f}с ({reason})")
+        self._defer(message, delay)
+
+    def _defer(self, message: OutgoingMessage, delay: float):
+        """Возвращает сообщение в очередь через delay секунд"""
+        self.deferred += 1
+        asyncio.get_running_loop().call_later(delay, self._requeue, message)
+
+    async def _worker(self, number: int):
+        while True:
+            message = await self.queue.get()
+            try:
+                await self._deliver(message)
+            except Exception as e:
+                logger.error(f"❌ Воркер {number}: ошибка доставки: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, message: OutgoingMessage):
+        """Отправляет одно сообщение с учётом лимитов"""
+        loop = asyncio.get_running_loop()
+
+        pause = self.paused_until - loop.time()
+        if pause > 0:
+            await asyncio.sleep(pause)
+
+        # Чат исчерпал свой лимит - откладываем, чтобы не держать воркер (и чаты за ним)
+        chat_bucket = self._chat_bucket(message.chat_id)
+        if not chat_bucket.try_acquire():
+            self._defer(message, chat_bucket.time_until_available())
+            return
+
+        await self.global_bucket.acquire()
+
+        message.attempts += 1
+
+        try:
+            await self.bot.send_message(
+                chat_id=message.chat_id,
+                text=message.text,
+                parse_mode=message.parse_mode,
+                disable_web_page_preview=message.disable_web_page_preview
+            )
+        except RetryAfter as e:
+            retry_after = float(e.retry_after)
+            self.paused_until = max(self.paused_until, loop.time() + retry_after)
+            self._retry_later(message, retry_after, f'RetryAfter {retry_after}с')
+            return
+        except BadRequest as e:
+            # Чаще всего Markdown сломан символами _ или * в именах - пробуем простым текстом
+            if message.parse_mode:
+                logger.warning(f"⚠️ Сообщение для {message.chat_id} отклонено ({e}), повтор без разметки")
+                message.parse_mode = None
+                self._defer(message, 0)
+                return
+
+            self._dead_letter(message, str(e))
+            return
+        except Forbidden as e:
+            # Пользователь заблокировал бота - повтор не поможет
+            self._dead_letter(message, str(e))
+            return
+        except NetworkError as e:
+            self._retry_later(message, min(60, 2 ** message.attempts), str(e))
+            return
+
+        self.sent_count += 1
+
+        if message.on_delivered:
+            try:
+                message.on_delivered(message)
+            except Exception as e:
+                logger.error(f"❌ Ошибка обработчика доставки: {e}")
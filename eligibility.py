@@ -0,0 +1,127 @@
+"""
+Отсев матчей перед запросом событий
+События нужны только матчам, которые по счёту и минуте из live данных
+ещё могут подойти хотя бы под один включённый режим или правило
+"""
+import logging
+from typing import Iterable, Optional, Set
+
+from config import ELIGIBILITY_LOOKBACK_MINUTES
+from fixture_store import FixtureStore
+from metrics import metrics
+from models import Fixture
+from modes import MAX_MINUTE, any_score, first_goal_of_match, level_score, scorer_leads
+
+logger = logging.getLogger(__name__)
+
+
+# Условие по счёту -> проверка без события (команда забившего ещё неизвестна)
+SCORE_PLAUSIBLE = {
+    any_score: lambda fixture: True,
+    first_goal_of_match: lambda fixture: fixture.score.total == 1,
+    level_score: lambda fixture: fixture.score.total > 0 and fixture.score.home == fixture.score.away,
+    scorer_leads: lambda fixture: fixture.score.home != fixture.score.away,
+}
+
+
+def score_plausible(predicate, fixture: Fixture) -> bool:
+    """Может ли счёт матча удовлетворить условию (неизвестные условия - может)"""
+    check = SCORE_PLAUSIBLE.get(predicate)
+    return check(fixture) if check else True
+
+
+class EligibilityFilter:
+    """
+    Решает, стоит ли запрашивать события матча
+
+    Гол, из-за которого изменился счёт, забит не позже текущей минуты и не раньше
+    чем ELIGIBILITY_LOOKBACK_MINUTES минут назад (запаздывание API). Матч нужен,
+    если в этом диапазоне есть окно режима/правила, условие по счёту выполнимо
+    и есть получатели (подписчики лиги и режима / активный владелец правила)
+    """
+
+    def __init__(self, modes, rules, subscriptions,
+                 lookback_minutes: int = ELIGIBILITY_LOOKBACK_MINUTES):
+        self.modes = modes
+        self.rules = rules
+        self.subscriptions = subscriptions
+        self.lookback_minutes = lookback_minutes
+
+    def _minute_range(self, fixture: Fixture) -> Optional[range]:
+        elapsed = fixture.status.elapsed
+
+        if elapsed is None:
+            return None
+
+        end = min(elapsed + 1, MAX_MINUTE)
+        start = max(0, elapsed - self.lookback_minutes)
+
+        return range(start, end + 1)
+
+    def _mode_eligible(self, fixture: Fixture, minutes: range) -> bool:
+        seen = set()
+
+        for minute in minutes:
+            for mode in self.modes.candidates(minute):
+                if mode.key in seen:
+                    continue
+                seen.add(mode.key)
+
+                if (score_plausible(mode.score_predicate, fixture)
+                        and self.subscriptions.has_recipients(fixture.league_id, mode.key)):
+                    return True
+
+        return False
+
+    def _rule_eligible(self, fixture: Fixture, minutes: range) -> bool:
+        for minute in minutes:
+            for rule in self.rules.candidates(minute, fixture.league_id):
+                if (self.subscriptions.is_active(rule.user_id)
+                        and score_plausible(rule.score_predicate, fixture)):
+                    return True
+
+        return False
+
+    def is_eligible(self, fixture: Fixture) -> bool:
+        """Может ли матч сейчас дать уведомление"""
+        minutes = self._minute_range(fixture)
+
+        # Минута неизвестна - не рискуем, запрашиваем
+        if minutes is None:
+            return True
+
+        return self._mode_eligible(fixture, minutes) or self._rule_eligible(fixture, minutes)
+
+    def filter(self, fixture_ids: Iterable[int], store: FixtureStore) -> Set[int]:
+        """
+        Оставляет матчи, для которых стоит запрашивать события
+
+        Args:
+            fixture_ids: Кандидаты (изменился счёт/статус)
+            store: Хранилище с актуальным live снимком
+
+        Returns:
+            ID матчей для запроса событий
+        """
+        kept = set()
+        pruned = 0
+
+        for fixture_id in fixture_ids:
+            fixture = store.get(fixture_id)
+
+            if fixture is None or self.is_eligible(fixture):
+                kept.add(fixture_id)
+            else:
+                pruned += 1
+
+        metrics.increment('events_candidates', len(kept) + pruned)
+        metrics.increment('events_kept', len(kept))
+        metrics.increment('events_pruned', pruned)
+
+        if pruned:
+            logger.info(
+                f"✂️ События не нужны {pruned} из {len(kept) + pruned} матчей "
+                f"(ни один режим или правило уже не сработает)"
+            )
+
+        return kept
@@ -0,0 +1,206 @@
+"""
+Единое хранилище матчей в памяти
+Расписание на день и live данные сливаются в одну запись на матч
+"""
+import bisect
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+from models import Fixture, LIVE_STATUSES
+
+logger = logging.getLogger(__name__)
+
+
+def _kickoff_minute(fixture: Fixture) -> Optional[int]:
+    """Минута начала матча (в минутах от эпохи UTC)"""
+    if not fixture.kickoff_utc:
+        return None
+    return int(fixture.kickoff_utc.timestamp() // 60)
+
+
+class FixtureStore:
+    """
+    Хранилище матчей по ID со вторичными индексами:
+    по статусу, по лиге и по минуте начала
+
+    Планировщик, глобальный цикл и /games читают отсюда -
+    без копирования списков и без дополнительных запросов к API
+    """
+
+    def __init__(self):
+        self.fixtures: Dict[int, Fixture] = {}
+
+        # Вторичные индексы: значение -> множество ID матчей
+        self._by_status: Dict[str, Set[int]] = {}
+        self._by_league: Dict[int, Set[int]] = {}
+        self._by_kickoff: Dict[int, Set[int]] = {}
+
+        # Отсортированные минуты начала (для обхода по времени)
+        self._kickoff_minutes: List[int] = []
+
+        self.last_live_update: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self.fixtures)
+
+    def __contains__(self, fixture_id: int) -> bool:
+        return fixture_id in self.fixtures
+
+    def get(self, fixture_id: int) -> Optional[Fixture]:
+        return self.fixtures.get(fixture_id)
+
+    def all(self) -> Iterable[Fixture]:
+        """Все матчи (представление словаря, без копии)"""
+        return self.fixtures.values()
+
+    def _index(self, fixture: Fixture):
+        """Добавляет матч во вторичные индексы"""
+        self._by_status.setdefault(fixture.status.short, set()).add(fixture.id)
+
+        if fixture.league_id is not None:
+            self._by_league.setdefault(fixture.league_id, set()).add(fixture.id)
+
+        minute = _kickoff_minute(fixture)
+        if minute is not None:
+            ids = self._by_kickoff.get(minute)
+            if ids is None:
+                ids = self._by_kickoff[minute] = set()
+                bisect.insort(self._kickoff_minutes, minute)
+            ids.add(fixture.id)
+
+    @staticmethod
+    def _discard(index: Dict, key, fixture_id: int) -> bool:
+        """Убирает ID из индекса; True если ключ опустел и удалён"""
+        ids = index.get(key)
+        if ids is None:
+            return False
+
+        ids.discard(fixture_id)
+        if not ids:
+            del index[key]
+            return True
+
+        return False
+
+    def _unindex(self, fixture: Fixture):
+        """Убирает матч из вторичных индексов"""
+        self._discard(self._by_status, fixture.status.short, fixture.id)
+        self._discard(self._by_league, fixture.league_id, fixture.id)
+
+        minute = _kickoff_minute(fixture)
+        if minute is not None and self._discard(self._by_kickoff, minute, fixture.id):
+            pos = bisect.bisect_left(self._kickoff_minutes, minute)
+            if pos < len(self._kickoff_minutes) and self._kickoff_minutes[pos] == minute:
+                del self._kickoff_minutes[pos]
+
+    def upsert(self, fixture: Fixture) -> Optional[Fixture]:
+        """
+        Добавляет или заменяет запись матча
+
+        Returns:
+            Предыдущая запись (или None если матч новый)
+        """
+        previous = self.fixtures.get(fixture.id)
+
+        if previous is not None:
+            self._unindex(previous)
+
+        self.fixtures[fixture.id] = fixture
+        self._index(fixture)
+
+        return previous
+
+    def remove(self, fixture_id: int) -> Optional[Fixture]:
+        """Удаляет матч из хранилища"""
+        fixture = self.fixtures.pop(fixture_id, None)
+
+        if fixture is not None:
+            self._unindex(fixture)
+
+        return fixture
+
+    def load_schedule(self, fixtures: List[Fixture]):
+        """
+        Загружает расписание на день
+        Матчи, которых нет в новом расписании, удаляются (кроме идущих прямо сейчас)
+
+        Args:
+            fixtures: Матчи из расписания
+        """
+        new_ids = {fixture.id for fixture in fixtures}
+
+        for fixture_id in [fid for fid, f in self.fixtures.items() if fid not in new_ids and not f.status.is_live]:
+            self.remove(fixture_id)
+
+        for fixture in fixtures:
+            self.upsert(fixture)
+
+        logger.info(f"🗂 В хранилище {len(self.fixtures)} матчей")
+
+    def merge_live(self, fixtures: List[Fixture]) -> List[Fixture]:
+        """
+        Вливает свежий live снимок в хранилище (точечно, по ID)
+
+        Args:
+            fixtures: Live матчи от API
+
+        Returns:
+            Матчи, у которых изменился статус, счёт или время начала
+        """
+        changed = []
+
+        for fixture in fixtures:
+            previous = self.upsert(fixture)
+
+            if (previous is None
+                    or previous.status.short != fixture.status.short
+                    or previous.score.as_tuple() != fixture.score.as_tuple()
+                    or previous.kickoff_utc != fixture.kickoff_utc):
+                changed.append(fixture)
+
+        self.last_live_update = datetime.now()
+
+        return changed
+
+    def with_status(self, *statuses: str) -> Iterator[Fixture]:
+        """Матчи с указанными статусами"""
+        for status in statuses:
+            for fixture_id in self._by_status.get(status, ()):
+                yield self.fixtures[fixture_id]
+
+    def live(self) -> Iterator[Fixture]:
+        """Матчи, которые идут прямо сейчас"""
+        return self.with_status(*LIVE_STATUSES)
+
+    def count_with_status(self, *statuses: str) -> int:
+        return sum(len(self._by_status.get(status, ())) for status in statuses)
+
+    def count_live(self) -> int:
+        return self.count_with_status(*LIVE_STATUSES)
+
+    def by_league(self, league_id: int) -> Iterator[Fixture]:
+        """Матчи лиги"""
+        for fixture_id in self._by_league.get(league_id, ()):
+            yield self.fixtures[fixture_id]
+
+    def by_kickoff(self, start: Optional[datetime] = None,
+                   end: Optional[datetime] = None) -> Iterator[Fixture]:
+        """
+        Матчи в порядке времени начала (опционально в диапазоне [start, end])
+
+        Args:
+            start: Начало диапазона (aware datetime)
+            end: Конец диапазона (aware datetime)
+        """
+        lo = 0
+        hi = len(self._kickoff_minutes)
+
+        if start is not None:
+            lo = bisect.bisect_left(self._kickoff_minutes, int(start.timestamp() // 60))
+        if end is not None:
+            hi = bisect.bisect_right(self._kickoff_minutes, int(end.timestamp() // 60))
+
+        for minute in self._kickoff_minutes[lo:hi]:
+            for fixture_id in self._by_kickoff[minute]:
+                yield self.fixtures[fixture_id]
@@ -3,14 +3,31 @@
 Получает данные о матчах и событиях
 """
 import aiohttp
+import asyncio
 import logging
 import time
-from typing import List, Dict, Optional
-from config import FOOTBALL_API_BASE_URL, FOOTBALL_API_KEY, LEAGUES_TO_TRACK
+from typing import List, Dict, Optional, Set, Tuple
+from config import (
+    FOOTBALL_API_BASE_URL,
+    FOOTBALL_API_KEY,
+    LEAGUES_TO_TRACK,
+    LIVE_LEAGUES_PER_REQUEST,
+    EVENTS_CATCHUP_MINUTES
+)
+from models import Fixture, GoalEvent, MOSCOW_TZ, parse_fixtures, parse_goal_events
+from quota import QuotaGovernor
 
 logger = logging.getLogger(__name__)
 
 
+def is_quota_exceeded(result) -> bool:
+    """
+    Проверяет вернул ли метод API маркер исчерпанной квоты
+    ([{'quota_exceeded': True}] для списков)
+    """
+    return bool(result) and isinstance(result[0], dict) and result[0].get('quota_exceeded', False)
+
+
 class FootballAPI:
     """Класс для работы с API-Football"""
 
@@ -21,22 +38,43 @@ class FootballAPI:
         }
         self.session: Optional[aiohttp.ClientSession] = None
 
+        # Отслеживаемые лиги (множество - быстрая проверка, без дублей из конфига)
+        self.tracked_leagues = frozenset(LEAGUES_TO_TRACK)
+
+        # Фильтры live=39-140-78-... для запроса только наших лиг на стороне API
+        league_ids = sorted(self.tracked_leagues)
+        self.live_league_filters = [
+            '-'.join(str(league_id) for league_id in league_ids[i:i + LIVE_LEAGUES_PER_REQUEST])
+            for i in range(0, len(league_ids), LIVE_LEAGUES_PER_REQUEST)
+        ]
+
+        # Контроль расхода квоты (по заголовкам ответов)
+        self.quota = QuotaGovernor()
+
+        # Запросы в полёте: (endpoint, params) -> задача (single-flight)
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+
         # Кэш событий матчей
         self.events_cache: Dict[int, Dict] = {}
         self.cache_duration = 15  # Кэш на 15 секунд (для Pro тарифа с 75k запросами)
+        self.events_batch_size = 20  # Максимум ID в одном запросе fixtures?ids=
+
+        # Снимок live матчей с прошлого опроса: fixture_id -> (голы хозяев, голы гостей, статус)
+        self.live_snapshot: Dict[int, Tuple[int, int, str]] = {}
 
-        # Сохраняем ВСЕ матчи из последнего запроса (для переиспользования)
-        self.all_fixtures_today = []
-        self.last_fixtures_update = None
+        # Матчи, где счёт изменился, а события ещё не догнали счёт: fixture_id -> крайний срок дозапроса
+        # (по времени, а не по числу опросов - при 5с опросе API публикует гол позже 4 опросов)
+        self.events_pending: Dict[int, float] = {}
+        self.events_catchup_seconds = EVENTS_CATCHUP_MINUTES * 60
 
     async def init_session(self):
         """Инициализация сессии для запросов"""
         if self.session is None:
             self.session = aiohttp.ClientSession(headers=self.headers)
 
-    async def get_fixtures_by_date(self, date: str) -> List[Dict]:
+    async def get_fixtures_by_date(self, date: str) -> List[Fixture]:
         """
-        Получает ВСЕ матчи на указанную дату
+        Получает ВСЕ матчи на указанную дату (дата по Москве)
         ОДИН запрос на весь день!
 
         Args:
@@ -45,11 +83,10 @@ class FootballAPI:
         Returns:
             Список всех матчей на эту дату
         """
-        all_fixtures = []
-
         # Один запрос для всех лиг на эту дату
         params = {
-            'date': date
+            'date': date,
+            'timezone': MOSCOW_TZ.zone
         }
 
         data = await self._make_request('fixtures', params)
@@ -61,29 +98,98 @@ class FootballAPI:
         if not data or not data.get('response'):
             return []
 
-        # Фильтруем по нашим лигам
-        all_matches = data['response']
-
+        # Фильтруем по нашим лигам и разбираем в записи
         filtered_fixtures = [
-            match for match in all_matches
-            if match.get('league', {}).get('id') in LEAGUES_TO_TRACK
+            fixture for fixture in parse_fixtures(data['response'])
+            if fixture.league_id in self.tracked_leagues
         ]
 
         logger.info(f"📅 Получено {len(filtered_fixtures)} матчей на {date}")
 
         return filtered_fixtures
 
+    async def get_fixtures_batch(self, fixture_ids) -> List[Fixture]:
+        """
+        Получает актуальные данные матчей по ID (fixtures?ids=, до 20 за запрос)
+        Нужен для матчей, пропавших из live: узнать итоговый статус
+
+        Args:
+            fixture_ids: ID матчей
+
+        Returns:
+            Список матчей (без тех, что не удалось получить)
+        """
+        fixture_ids = list(dict.fromkeys(fixture_ids))
+
+        if not fixture_ids:
+            return []
+
+        chunks = [
+            fixture_ids[i:i + self.events_batch_size]
+            for i in range(0, len(fixture_ids), self.events_batch_size)
+        ]
+
+        responses = await asyncio.gather(*(
+            self._make_request('fixtures', {'ids': '-'.join(str(fixture_id) for fixture_id in chunk)})
+            for chunk in chunks
+        ))
+
+        fixtures = []
+        for data in responses:
+            if not data or 'quota_exceeded' in data:
+                continue
+            fixtures.extend(parse_fixtures(data.get('response') or []))
+
+        return fixtures
+
     async def close_session(self):
         """Закрытие сессии"""
         if self.session:
             await self.session.close()
             self.session = None
 
+        await self.quota.close()
+
+    @staticmethod
+    def _request_key(endpoint: str, params: Optional[dict]) -> Tuple:
+        """Ключ запроса для объединения одинаковых вызовов"""
+        if not params:
+            return (endpoint, ())
+        return (endpoint, tuple(sorted((k, str(v)) for k, v in params.items())))
+
     async def _make_request(self, endpoint: str, params: dict = None) -> Optional[Dict]:
         """
         ПУБЛИЧНЫЙ метод для выполнения запросов к API
         (используется аналитикой)
 
+        Одинаковые одновременные запросы (endpoint + params) объединяются:
+        к API уходит ОДИН запрос, все вызывающие получают один и тот же JSON.
+        Результат общий - его нельзя изменять на месте!
+
+        Args:
+            endpoint: Конечная точка API
+            params: Параметры запроса
+
+        Returns:
+            JSON ответ или None
+        """
+        key = self._request_key(endpoint, params)
+
+        task = self._inflight.get(key)
+        if task is not None:
+            logger.info(f"🔗 Присоединяемся к запросу {endpoint} {params} (уже выполняется)")
+        else:
+            task = asyncio.ensure_future(self._fetch(endpoint, params))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # shield: отмена одного ожидающего не отменяет запрос для остальных
+        return await asyncio.shield(task)
+
+    async def _fetch(self, endpoint: str, params: dict = None) -> Optional[Dict]:
+        """
+        Выполняет один HTTP запрос к API (без объединения)
+
         Args:
             endpoint: Конечная точка API
             params: Параметры запроса
@@ -96,8 +202,14 @@ class FootballAPI:
 
         url = f"{self.base_url}/{endpoint}"
 
+        # Резервируем запрос в квоте ДО обращения к API
+        if not await self.quota.acquire():
+            return {'quota_exceeded': True}
+
         try:
             async with self.session.get(url, headers=self.headers, params=params) as response:
+                self.quota.update_from_headers(response.headers)
+
                 if response.status == 200:
                     data = await response.json()
 
@@ -105,6 +217,7 @@ class FootballAPI:
                     if 'errors' in data and data['errors']:
                         if 'requests limit' in str(data['errors']).lower():
                             logger.error(f"⚠️ Квота API исчерпана!")
+                            self.quota.mark_exhausted()
                             return {'quota_exceeded': True}
 
                     return data
@@ -116,77 +229,50 @@ class FootballAPI:
             logger.error(f"❌ Request error: {e}")
             return None
 
-    async def get_live_matches(self) -> List[Dict]:
+    async def get_live_matches(self) -> List[Fixture]:
         """
         Получает список текущих (живых) матчей
-        ОПТИМИЗИРОВАНО: Один запрос вместо 10!
-        БОНУС: Сохраняет ВСЕ матчи на день для переиспользования!
+        ОПТИМИЗИРОВАНО: Один запрос вместо 10, и только по нашим лигам!
 
         Returns:
             Список LIVE матчей
         """
-        from datetime import datetime
-
-        # Один запрос для ВСЕХ live матчей (включая предстоящие!)
-        params = {
-            'live': 'all'
-        }
-
-        data = await self._make_request('fixtures', params)
-
-        if data and 'quota_exceeded' in data:
+        # Фильтр по лигам на стороне API: live=39-140-78-...
+        # (весь мир нам не нужен - меньше трафика и JSON для разбора)
+        responses = await asyncio.gather(*(
+            self._make_request('fixtures', {'live': league_filter})
+            for league_filter in self.live_league_filters
+        ))
+
+        if any(data and 'quota_exceeded' in data for data in responses):
             return [{'quota_exceeded': True}]
 
-        if not data or not data.get('response'):
-            return []
+        # Объединяем ответы (без дублей по ID матча) и разбираем в записи
+        merged = {}
+        for data in responses:
+            for fixture in parse_fixtures((data or {}).get('response') or []):
+                merged[fixture.id] = fixture
 
-        # СОХРАНЯЕМ ВСЕ матчи (live + предстоящие на день)
-        all_matches = data['response']
+        if not merged:
+            return []
 
-        # Фильтруем по нашим лигам
+        # Фильтруем по нашим лигам (страховка - API уже отфильтровал)
         filtered_all = [
-            match for match in all_matches
-            if match.get('league', {}).get('id') in LEAGUES_TO_TRACK
+            fixture for fixture in merged.values()
+            if fixture.league_id in self.tracked_leagues
         ]
 
-        # НОВОЕ: Сохраняем ВСЕ матчи на день для переиспользования
-        # Это позволяет показывать расписание в /start БЕЗ дополнительных запросов!
-        self.all_fixtures_today = filtered_all
-        self.last_fixtures_update = datetime.now()
-
         # Фильтруем только LIVE для возврата
         # Статусы live матчей: 1H, 2H, HT, ET, BT, P, LIVE
-        live_matches = [
-            match for match in filtered_all
-            if match.get('fixture', {}).get('status', {}).get('short') in ['1H', '2H', 'HT', 'ET', 'BT', 'P', 'LIVE']
-        ]
+        live_matches = [fixture for fixture in filtered_all if fixture.status.is_live]
 
         logger.info(
-            f"⚽ Найдено {len(live_matches)} live матчей и {len(filtered_all)} всего на день "
-            f"(из них {len(filtered_all) - len(live_matches)} предстоящих)"
+            f"⚽ Найдено {len(live_matches)} live матчей "
+            f"(в ответе {len(filtered_all)} матчей наших лиг)"
         )
 
         return live_matches
 
-    def get_all_fixtures_today(self) -> List[Dict]:
-        """
-        Возвращает ВСЕ матчи на день из последнего запроса
-        БЕЗ дополнительных запросов к API!
-
-        Данные обновляются автоматически каждые 30 секунд 
-        глобальным циклом проверки.
-
-        Returns:
-            Список всех матчей на день (live + предстоящие)
-        """
-        if not self.all_fixtures_today:
-            logger.warning("⚠️ Нет данных о матчах. Возможно глобальный цикл ещё не запущен.")
-            return []
-
-        logger.info(f"💾 Возвращаем {len(self.all_fixtures_today)} матчей из кэша (БЕЗ запроса к API)")
-
-        return self.all_fixtures_today
-
     # Метод для получения статистики
     async def get_match_statistics(self, fixture_id: int) -> Optional[Dict]:
         """
@@ -206,47 +292,179 @@ class FootballAPI:
 
         return data
 
-    async def get_match_events(self, fixture_id: int) -> List[Dict]:
+    def diff_live_snapshot(self, matches: List[Fixture]) -> Set[int]:
+        """
+        Сравнивает live матчи с прошлым снимком и запоминает новый снимок
+
+        События нужны только матчам, где:
+        - изменился счёт (гол или отмена гола)
+        - сменился статус (страховочное обновление: 1H -> HT, HT -> 2H, ...)
+        - матч впервые попал в live уже с голами
+        - счёт изменился раньше, но события API ещё не догнали счёт
+
+        Args:
+            matches: Список live матчей от API
+
+        Returns:
+            ID матчей, для которых нужно запросить события
+        """
+        new_snapshot = {}
+        to_refresh = set()
+
+        for fixture in matches:
+            fixture_id = fixture.id
+            state = (fixture.score.home, fixture.score.away, fixture.status.short)
+            new_snapshot[fixture_id] = state
+
+            previous = self.live_snapshot.get(fixture_id)
+
+            if previous is None:
+                if state[0] or state[1]:
+                    to_refresh.add(fixture_id)
+            elif previous[:2] != state[:2]:
+                logger.info(f"⚽ Счёт изменился в матче {fixture_id}: {previous[0]}:{previous[1]} → {state[0]}:{state[1]}")
+                to_refresh.add(fixture_id)
+                self.events_pending[fixture_id] = time.monotonic() + self.events_catchup_seconds
+            elif previous[2] != state[2]:
+                logger.info(f"🔄 Статус матча {fixture_id}: {previous[2]} → {state[2]}")
+                to_refresh.add(fixture_id)
+
+        # Матчи, где события отстают от счёта - перезапрашиваем
+        for fixture_id in list(self.events_pending):
+            if fixture_id in new_snapshot:
+                to_refresh.add(fixture_id)
+            else:
+                del self.events_pending[fixture_id]
+
+        self.live_snapshot = new_snapshot
+
+        logger.info(f"📸 События нужны для {len(to_refresh)} из {len(new_snapshot)} live матчей")
+
+        return to_refresh
+
+    def _update_events_pending(self, fixture_id: int, events: List[GoalEvent]):
+        """
+        Снимает матч с дозапроса, когда голов в событиях столько же, сколько в счёте
+        (API часто публикует счёт раньше, чем событие гола)
+        """
+        if fixture_id not in self.events_pending:
+            return
+
+        state = self.live_snapshot.get(fixture_id)
+        goals_in_events = sum(1 for event in events if not event.is_missed_penalty)
+
+        if state is None or goals_in_events >= state[0] + state[1]:
+            del self.events_pending[fixture_id]
+            return
+
+        if time.monotonic() >= self.events_pending[fixture_id]:
+            logger.warning(f"⚠️ События матча {fixture_id} так и не догнали счёт - прекращаем дозапрос")
+            del self.events_pending[fixture_id]
+
+    def get_cached_events(self, fixture_id: int) -> List[GoalEvent]:
+        """
+        Возвращает последние известные события матча БЕЗ запроса к API
+
+        Args:
+            fixture_id: ID матча
+
+        Returns:
+            Список голов (пустой если событий ещё не запрашивали)
+        """
+        cached = self.events_cache.get(fixture_id)
+        return cached['events'] if cached else []
+
+    async def get_match_events(self, fixture_id: int, force: bool = False) -> List[GoalEvent]:
         """
         Получает события конкретного матча с кэшированием
-        ОПТИМИЗИРОВАНО: Кэш на 30 секунд!
+        Тонкая обёртка над get_events_batch
 
         Args:
             fixture_id: ID матча
+            force: Игнорировать кэш (счёт изменился - кэш точно устарел)
 
         Returns:
-            Список событий матча
+            Список голов матча
         """
-        # Проверяем кэш
-        if fixture_id in self.events_cache:
-            cached = self.events_cache[fixture_id]
-            cache_age = time.time() - cached['timestamp']
+        events_by_fixture = await self.get_events_batch([fixture_id], force=force)
+        return events_by_fixture.get(fixture_id, [])
 
-            # Если кэш свежий (< 30 секунд) - используем его
-            if cache_age < self.cache_duration:
-                logger.info(f"💾 Используем кэш для матча {fixture_id} (возраст: {int(cache_age)}с)")
-                return cached['events']
+    async def get_events_batch(self, fixture_ids, force: bool = False) -> Dict[int, List[GoalEvent]]:
+        """
+        Получает события сразу нескольких матчей
+        ОПТИМИЗИРОВАНО: fixtures?ids=a-b-c возвращает матчи ВМЕСТЕ с событиями,
+        до 20 матчей за ОДИН запрос. Пачки запрашиваются параллельно.
 
-        # Если кэша нет или устарел - делаем запрос
-        params = {'fixture': fixture_id}
-        data = await self._make_request('fixtures/events', params)
+        Args:
+            fixture_ids: ID матчей
+            force: Игнорировать кэш
 
-        if data and 'quota_exceeded' in data:
-            return [{'quota_exceeded': True}]
+        В кэш попадают только голы (остальные события боту не нужны)
 
-        events = []
-        if data and data.get('response'):
-            events = data['response']
+        Returns:
+            Словарь fixture_id -> список голов
+            (при исчерпании квоты: [{'quota_exceeded': True}])
+        """
+        result: Dict[int, list] = {}
+        to_fetch = []
 
-        # Сохраняем в кэш
-        self.events_cache[fixture_id] = {
-            'events': events,
-            'timestamp': time.time()
-        }
+        for fixture_id in dict.fromkeys(fixture_ids):
+            cached = self.events_cache.get(fixture_id)
+
+            # Если кэш свежий - используем его
+            if not force and cached:
+                cache_age = time.time() - cached['timestamp']
+                if cache_age < self.cache_duration:
+                    logger.info(f"💾 Используем кэш для матча {fixture_id} (возраст: {int(cache_age)}с)")
+                    result[fixture_id] = cached['events']
+                    continue
 
-        logger.info(f"🔄 Обновлён кэш для матча {fixture_id} ({len(events)} событий)")
+            to_fetch.append(fixture_id)
+
+        if not to_fetch:
+            return result
+
+        chunks = [
+            to_fetch[i:i + self.events_batch_size]
+            for i in range(0, len(to_fetch), self.events_batch_size)
+        ]
 
-        return events
+        responses = await asyncio.gather(*(
+            self._make_request('fixtures', {'ids': '-'.join(str(fixture_id) for fixture_id in chunk)})
+            for chunk in chunks
+        ))
+
+        for chunk, data in zip(chunks, responses):
+            if data and 'quota_exceeded' in data:
+                for fixture_id in chunk:
+                    result[fixture_id] = [{'quota_exceeded': True}]
+                continue
+
+            for match in (data or {}).get('response') or []:
+                fixture_id = match.get('fixture', {}).get('id')
+                if fixture_id not in chunk:
+                    continue
+
+                events = parse_goal_events(match.get('events') or [])
+
+                # Сохраняем в кэш
+                self.events_cache[fixture_id] = {
+                    'events': events,
+                    'timestamp': time.time()
+                }
+                self._update_events_pending(fixture_id, events)
+                result[fixture_id] = events
+
+            # Матчи без ответа (ошибка запроса) - оставляем последние известные события
+            for fixture_id in chunk:
+                if fixture_id not in result:
+                    result[fixture_id] = self.get_cached_events(fixture_id)
+
+        logger.info(
+            f"🔄 Обновлены события {len(to_fetch)} матчей за {len(chunks)} запрос(а)"
+        )
+
+        return result
 
     def clean_cache(self, active_fixture_ids: List[int]):
         """
@@ -266,35 +484,3 @@ class FootballAPI:
 
         if to_remove:
             logger.info(f"🧹 Очищен кэш для {len(to_remove)} завершённых матчей")
-
-    def format_match_info(self, match: Dict) -> Dict:
-        """
-        Форматирует информацию о матче в удобный вид
-
-        Args:
-            match: Данные о матче от API
-
-        Returns:
-            Отформатированная информация о матче
-        """
-        try:
-            fixture = match.get('fixture', {})
-            league = match.get('league', {})
-            teams = match.get('teams', {})
-            goals = match.get('goals', {})
-
-            return {
-                'fixture_id': fixture.get('id'),
-                'league_name': league.get('name'),
-                'league_country': league.get('country'),
-                'home_team': teams.get('home', {}).get('name'),
-                'away_team': teams.get('away', {}).get('name'),
-                'home_goals': goals.get('home', 0),
-                'away_goals': goals.get('away', 0),
-                'status': fixture.get('status', {}).get('short'),
-                'elapsed': fixture.get('status', {}).get('elapsed'),
-            }
-        except Exception as e:
-            logger.error(f"❌ Ошибка при форматировании матча: {e}")
-            return {}
-
@@ -0,0 +1,141 @@
+"""
+Инкрементальное отслеживание голов матча
+На каждом опросе в обработку уходят только НОВЫЕ голы, а не весь список событий
+"""
+import logging
+from typing import Dict, List, Optional
+
+from models import GoalEvent
+
+logger = logging.getLogger(__name__)
+
+
+class TrackerDiff:
+    """Изменения голов матча с прошлой обработки"""
+
+    __slots__ = ('new', 'cancelled', 'corrected')
+
+    def __init__(self, new: List[GoalEvent], cancelled: List[GoalEvent],
+                 corrected: List[GoalEvent]):
+        self.new = new
+        self.cancelled = cancelled
+        self.corrected = corrected
+
+    def __bool__(self) -> bool:
+        return bool(self.new or self.cancelled or self.corrected)
+
+
+# Ничего не изменилось (общий экземпляр, чтобы не создавать объект на каждый опрос)
+NO_CHANGES = TrackerDiff([], [], [])
+
+
+class MatchTracker:
+    """
+    Состояние одного матча: какие голы уже обработаны
+
+    Обычный случай - API дописывает голы в конец списка: сверяем отпечаток
+    последнего обработанного гола и берём только хвост (O(новых голов)).
+    Если список изменился не только в конце (VAR отменил гол, API поправил
+    игрока или минуту) - полное сравнение по отпечаткам:
+    - гол пропал и на его месте (команда, минута) нет другого - отменён
+    - гол пропал, но на том же месте появился другой - это правка, а не новый гол
+    """
+
+    def __init__(self, fixture_id: int):
+        self.fixture_id = fixture_id
+
+        # Обработанные голы: отпечаток -> событие
+        self.goals: Dict[int, GoalEvent] = {}
+
+        # Сколько голов обработано и отпечаток последнего из них
+        self.processed_count = 0
+        self.last_fingerprint: Optional[int] = None
+
+        # Последний обработанный список (из кэша событий приходит тот же объект)
+        self._last_events: Optional[List[GoalEvent]] = None
+
+        # Голы, пропущенные без запроса событий (матч был отсеян): первые N голов
+        # не позже минуты M - при следующем запросе событий они не считаются новыми
+        self.skipped_goals = 0
+        self.skipped_until_minute = -1
+
+    def skip_goals(self, goals: int, minute: int):
+        """
+        Отмечает голы, которые уже не должны дать уведомление
+        (матч отсеян фильтром - события не запрашивались, а позже счёт уже другой)
+
+        Args:
+            goals: Сколько голов в счёте на момент отсева
+            minute: Минута матча на момент отсева
+        """
+        self.skipped_goals = max(self.skipped_goals, goals)
+        self.skipped_until_minute = max(self.skipped_until_minute, minute)
+
+    def _drop_skipped(self, events: List[GoalEvent], new: List[GoalEvent]) -> List[GoalEvent]:
+        """
+        Убирает из новых голы, пропущенные при отсеве: входят в первые skipped_goals
+        забитых и не позже skipped_until_minute (гол после отмены VAR не спутаем со старым)
+        """
+        scored = [event for event in events if not event.is_missed_penalty]
+        stale = {
+            event.fingerprint for event in scored[:self.skipped_goals]
+            if event.minute <= self.skipped_until_minute
+        }
+        return [event for event in new if event.fingerprint not in stale]
+
+    def diff(self, events: List[GoalEvent]) -> TrackerDiff:
+        """
+        Сравнивает голы с последними обработанными (состояние не меняет)
+
+        Args:
+            events: Текущий список голов матча
+
+        Returns:
+            TrackerDiff с новыми, отменёнными и исправленными голами
+        """
+        if events is self._last_events:
+            return NO_CHANGES
+
+        count = self.processed_count
+
+        # Быстрый путь: голы только дописаны в конец
+        if len(events) >= count and (count == 0 or events[count - 1].fingerprint == self.last_fingerprint):
+            new = [event for event in events[count:] if event.fingerprint not in self.goals]
+            if new and self.skipped_goals:
+                new = self._drop_skipped(events, new)
+            return TrackerDiff(new, [], []) if new else NO_CHANGES
+
+        # Список изменился в середине - сравниваем по отпечаткам
+        current = {event.fingerprint for event in events}
+        removed = {
+            (event.team_id, event.minute): event
+            for fingerprint, event in self.goals.items()
+            if fingerprint not in current
+        }
+
+        new = []
+        corrected = []
+
+        for event in events:
+            if event.fingerprint in self.goals:
+                continue
+
+            if removed.pop((event.team_id, event.minute), None) is not None:
+                corrected.append(event)
+            else:
+                new.append(event)
+
+        if new and self.skipped_goals:
+            new = self._drop_skipped(events, new)
+
+        return TrackerDiff(new, list(removed.values()), corrected)
+
+    def commit(self, events: List[GoalEvent]):
+        """
+        Запоминает список голов как обработанный
+        (вызывается ПОСЛЕ обработки - при отмене по таймауту голы придут снова)
+        """
+        self.goals = {event.fingerprint: event for event in events}
+        self.processed_count = len(events)
+        self.last_fingerprint = events[-1].fingerprint if events else None
+        self._last_events = events
@@ -0,0 +1,32 @@
+"""
+Счётчики работы бота
+Простые именованные счётчики в памяти (для логов и /status)
+"""
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+class Metrics:
+    """Именованные счётчики"""
+
+    def __init__(self):
+        self.counters: Dict[str, int] = {}
+
+    def increment(self, name: str, value: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def get(self, name: str) -> int:
+        return self.counters.get(name, 0)
+
+    def snapshot(self) -> Dict[str, int]:
+        """Копия всех счётчиков"""
+        return dict(self.counters)
+
+    def reset(self):
+        self.counters.clear()
+
+
+# Общие счётчики процесса
+metrics = Metrics()
@@ -0,0 +1,244 @@
+"""
+Компактные записи матчей и событий
+Ответы API разбираются ОДИН раз при получении, дальше весь код работает с этими объектами
+"""
+import hashlib
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pytz
+
+logger = logging.getLogger(__name__)
+
+# Таймзона Москвы
+MOSCOW_TZ = pytz.timezone('Europe/Moscow')
+
+# Статусы live матчей
+LIVE_STATUSES = frozenset(['1H', '2H', 'HT', 'ET', 'BT', 'P', 'LIVE'])
+
+# Статусы завершённых (или несостоявшихся) матчей
+FINISHED_STATUSES = frozenset(['FT', 'AET', 'PEN', 'CANC', 'ABD', 'AWD', 'WO'])
+
+
+class TeamRef:
+    """Команда: ID и название"""
+
+    __slots__ = ('id', 'name')
+
+    def __init__(self, team_id: Optional[int], name: str):
+        self.id = team_id
+        self.name = name
+
+    @classmethod
+    def from_api(cls, team: Optional[Dict]) -> 'TeamRef':
+        team = team or {}
+        return cls(team.get('id'), team.get('name') or '?')
+
+
+class Score:
+    """Текущий счёт матча"""
+
+    __slots__ = ('home', 'away')
+
+    def __init__(self, home: int, away: int):
+        self.home = home
+        self.away = away
+
+    @property
+    def total(self) -> int:
+        return self.home + self.away
+
+    def as_tuple(self):
+        return (self.home, self.away)
+
+
+class Status:
+    """Статус матча и прошедшее время"""
+
+    __slots__ = ('short', 'elapsed')
+
+    def __init__(self, short: str, elapsed: Optional[int]):
+        self.short = short
+        self.elapsed = elapsed
+
+    @property
+    def is_live(self) -> bool:
+        return self.short in LIVE_STATUSES
+
+    @property
+    def is_finished(self) -> bool:
+        return self.short in FINISHED_STATUSES
+
+
+class Fixture:
+    """Матч: всё, что нужно боту, без вложенных словарей API"""
+
+    __slots__ = (
+        'id', 'league_id', 'league_name', 'league_country', 'season',
+        'home', 'away', 'score', 'status', 'kickoff_utc', 'kickoff_msk'
+    )
+
+    def __init__(self, fixture_id: int, league_id: Optional[int], league_name: str,
+                 league_country: str, season: Optional[int], home: TeamRef, away: TeamRef,
+                 score: Score, status: Status, kickoff_utc: Optional[datetime]):
+        self.id = fixture_id
+        self.league_id = league_id
+        self.league_name = league_name
+        self.league_country = league_country
+        self.season = season
+        self.home = home
+        self.away = away
+        self.score = score
+        self.status = status
+        self.kickoff_utc = kickoff_utc
+        self.kickoff_msk = kickoff_utc.astimezone(MOSCOW_TZ) if kickoff_utc else None
+
+    @classmethod
+    def from_api(cls, match: Dict) -> Optional['Fixture']:
+        """
+        Разбирает матч из ответа API
+
+        Args:
+            match: Объект матча от API
+
+        Returns:
+            Fixture или None если у матча нет ID
+        """
+        fixture = match.get('fixture') or {}
+        fixture_id = fixture.get('id')
+
+        if not fixture_id:
+            return None
+
+        league = match.get('league') or {}
+        teams = match.get('teams') or {}
+        goals = match.get('goals') or {}
+        status = fixture.get('status') or {}
+
+        kickoff_utc = None
+        date_str = fixture.get('date')
+        if date_str:
+            try:
+                kickoff_utc = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+            except ValueError:
+                logger.warning(f"⚠️ Не удалось разобрать дату матча {fixture_id}: {date_str}")
+
+        return cls(
+            fixture_id=fixture_id,
+            league_id=league.get('id'),
+            league_name=league.get('name') or '?',
+            league_country=league.get('country') or '',
+            season=league.get('season'),
+            home=TeamRef.from_api(teams.get('home')),
+            away=TeamRef.from_api(teams.get('away')),
+            score=Score(goals.get('home') or 0, goals.get('away') or 0),
+            status=Status(status.get('short') or 'NS', status.get('elapsed')),
+            kickoff_utc=kickoff_utc
+        )
+
+    def team(self, side: str) -> TeamRef:
+        """Команда по стороне: 'home' или 'away'"""
+        return self.home if side == 'home' else self.away
+
+    @property
+    def kickoff_time_str(self) -> str:
+        """Время начала по Москве (ЧЧ:ММ)"""
+        return self.kickoff_msk.strftime('%H:%M') if self.kickoff_msk else 'TBD'
+
+
+class GoalEvent:
+    """Событие гола"""
+
+    __slots__ = (
+        'minute', 'extra', 'player', 'assist', 'team_id', 'team_name',
+        'type', 'detail', 'comments', 'fingerprint'
+    )
+
+    def __init__(self, minute: int, extra: Optional[int], player: str, assist: Optional[str],
+                 team_id: Optional[int], team_name: str, event_type: str, detail: str,
+                 comments: Optional[str]):
+        self.minute = minute
+        self.extra = extra
+        self.player = player
+        self.assist = assist
+        self.team_id = team_id
+        self.team_name = team_name
+        self.type = event_type
+        self.detail = detail
+        self.comments = comments
+        self.fingerprint = self.compute_fingerprint()
+
+    def compute_fingerprint(self) -> int:
+        """
+        64-битный отпечаток гола внутри матча
+        (минута, добавленное время, команда, игрок, тип гола)
+        """
+        key = f"{self.minute}|{self.extra or 0}|{self.team_id}|{self.player}|{self.detail}"
+        return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+    @classmethod
+    def from_api(cls, event: Dict) -> 'GoalEvent':
+        time_info = event.get('time') or {}
+        team = event.get('team') or {}
+
+        return cls(
+            minute=time_info.get('elapsed') or 0,
+            extra=time_info.get('extra'),
+            player=(event.get('player') or {}).get('name') or 'Неизвестный игрок',
+            assist=(event.get('assist') or {}).get('name'),
+            team_id=team.get('id'),
+            team_name=team.get('name') or '',
+            event_type=event.get('type') or '',
+            detail=event.get('detail') or '',
+            comments=event.get('comments')
+        )
+
+    @property
+    def is_penalty(self) -> bool:
+        return 'penalty' in self.detail.lower()
+
+    @property
+    def is_own_goal(self) -> bool:
+        return 'own' in self.detail.lower()
+
+    @property
+    def is_missed_penalty(self) -> bool:
+        return self.detail.lower() == 'missed penalty'
+
+
+def is_goal_payload(event: Dict) -> bool:
+    """
+    Проверяет является ли событие API голом
+
+    Args:
+        event: Событие из API
+
+    Returns:
+        True если это гол
+    """
+    event_type = (event.get('type') or '').lower()
+    detail = (event.get('detail') or '').lower()
+
+    # Типы событий которые считаются голами
+    goal_types = ('goal', 'normal goal')
+    goal_details = ('normal goal', 'penalty', 'own goal')
+
+    return event_type in goal_types or detail in goal_details
+
+
+def parse_fixtures(matches: List[Dict]) -> List[Fixture]:
+    """Разбирает список матчей API в записи Fixture"""
+    fixtures = []
+
+    for match in matches:
+        fixture = Fixture.from_api(match)
+        if fixture:
+            fixtures.append(fixture)
+
+    return fixtures
+
+
+def parse_goal_events(events: List[Dict]) -> List[GoalEvent]:
+    """Оставляет из событий API только голы и разбирает их в GoalEvent"""
+    return [GoalEvent.from_api(event) for event in events if is_goal_payload(event)]
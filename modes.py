@@ -0,0 +1,174 @@
+"""
+Реестр режимов уведомлений
+Каждый режим описывает окно минут, условие по счёту, условие по типу гола
+и нужна ли аналитика. При старте реестр компилируется в таблицу по минутам:
+гол проверяется только режимами, в окно которых попадает его минута
+"""
+import logging
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import MODE_70_MINUTE, MODE_PENALTY_EARLY
+from models import Fixture, GoalEvent
+
+logger = logging.getLogger(__name__)
+
+# Последняя минута таблицы (основное время + добавленное + овертайм)
+MAX_MINUTE = 130
+
+
+# ===== УСЛОВИЯ ПО СЧЁТУ =====
+
+def any_score(fixture: Fixture, event: GoalEvent) -> bool:
+    """Любой счёт"""
+    return True
+
+
+def first_goal_of_match(fixture: Fixture, event: GoalEvent) -> bool:
+    """Первый гол в матче: счёт после гола строго 1:0 или 0:1"""
+    return fixture.score.total == 1
+
+
+def level_score(fixture: Fixture, event: GoalEvent) -> bool:
+    """Гол сравнял счёт"""
+    return fixture.score.total > 0 and fixture.score.home == fixture.score.away
+
+
+def scorer_leads(fixture: Fixture, event: GoalEvent) -> bool:
+    """После гола забившая команда впереди"""
+    difference = fixture.score.home - fixture.score.away
+    return difference > 0 if event.team_id == fixture.home.id else difference < 0
+
+
+# ===== УСЛОВИЯ ПО ТИПУ ГОЛА =====
+
+def any_goal(event: GoalEvent) -> bool:
+    """Любой забитый гол"""
+    return not event.is_missed_penalty
+
+
+def penalty_goal(event: GoalEvent) -> bool:
+    """Гол с пенальти"""
+    return event.is_penalty and not event.is_missed_penalty
+
+
+def normal_goal(event: GoalEvent) -> bool:
+    """Гол с игры"""
+    return event.detail.lower() == 'normal goal'
+
+
+def own_goal(event: GoalEvent) -> bool:
+    """Автогол"""
+    return event.is_own_goal
+
+
+class NotificationMode:
+    """Описание режима уведомлений"""
+
+    __slots__ = ('key', 'name', 'min_minute', 'max_minute',
+                 'score_predicate', 'detail_predicate', 'needs_analytics')
+
+    def __init__(self, key: str, name: str, min_minute: int, max_minute: int,
+                 score_predicate: Callable[[Fixture, GoalEvent], bool] = any_score,
+                 detail_predicate: Callable[[GoalEvent], bool] = any_goal,
+                 needs_analytics: bool = False):
+        self.key = key
+        self.name = name
+        self.min_minute = min_minute
+        self.max_minute = max_minute
+        self.score_predicate = score_predicate
+        self.detail_predicate = detail_predicate
+        self.needs_analytics = needs_analytics
+
+    def matches(self, fixture: Fixture, event: GoalEvent) -> bool:
+        """Проверяет условия режима (окно минут уже проверено таблицей)"""
+        return self.detail_predicate(event) and self.score_predicate(fixture, event)
+
+
+class ModeRegistry:
+    """
+    Реестр режимов
+
+    Порядок регистрации = приоритет: гол получает первый подходящий режим
+    """
+
+    def __init__(self, modes: Iterable[NotificationMode] = ()):
+        self.modes: List[NotificationMode] = []
+        self._by_key: Dict[str, NotificationMode] = {}
+
+        # minute -> режимы, в окно которых попадает минута
+        self._by_minute: List[Tuple[NotificationMode, ...]] = []
+
+        for mode in modes:
+            self.register(mode)
+
+        self.compile()
+
+    def register(self, mode: NotificationMode):
+        """Добавляет режим (после регистрации нужно вызвать compile)"""
+        if mode.key in self._by_key:
+            raise ValueError(f"Режим '{mode.key}' уже зарегистрирован")
+
+        self.modes.append(mode)
+        self._by_key[mode.key] = mode
+
+    def compile(self):
+        """Строит таблицу минута -> режимы"""
+        self._by_minute = [
+            tuple(mode for mode in self.modes if mode.min_minute <= minute <= mode.max_minute)
+            for minute in range(MAX_MINUTE + 1)
+        ]
+
+        logger.info(f"🧩 Режимов уведомлений: {len(self.modes)}")
+
+    def get(self, key: str) -> Optional[NotificationMode]:
+        return self._by_key.get(key)
+
+    def candidates(self, minute: int) -> Tuple[NotificationMode, ...]:
+        """Режимы, в окно которых попадает минута"""
+        if 0 <= minute <= MAX_MINUTE:
+            return self._by_minute[minute]
+        return ()
+
+    def match(self, fixture: Fixture, event: GoalEvent) -> Optional[NotificationMode]:
+        """
+        Определяет режим уведомления для гола
+
+        Args:
+            fixture: Матч (счёт уже с учётом гола)
+            event: Событие гола
+
+        Returns:
+            Первый подходящий режим или None
+        """
+        for mode in self.candidates(event.minute):
+            if mode.matches(fixture, event):
+                logger.info(
+                    f"✅ {mode.name} СРАБОТАЛ: гол на {event.minute}' "
+                    f"(счет {fixture.score.home}:{fixture.score.away}, {event.detail})"
+                )
+                return mode
+
+        return None
+
+
+def build_default_registry() -> ModeRegistry:
+    """Встроенные режимы бота (настройки окон - в config.py)"""
+    return ModeRegistry([
+        # Первый гол матча на 69-70 минуте + аналитика
+        NotificationMode(
+            key='70_minute',
+            name=MODE_70_MINUTE['name'],
+            min_minute=MODE_70_MINUTE['min_minute'],
+            max_minute=MODE_70_MINUTE['max_minute'],
+            score_predicate=first_goal_of_match,
+            needs_analytics=True
+        ),
+        # Пенальти на 2-10 минуте
+        NotificationMode(
+            key='penalty_early',
+            name=MODE_PENALTY_EARLY['name'],
+            min_minute=MODE_PENALTY_EARLY['min_minute'],
+            max_minute=MODE_PENALTY_EARLY['max_minute'],
+            detail_predicate=penalty_goal
+        ),
+    ])
@@ -3,7 +3,7 @@
 """
 import logging
 from typing import Dict
-from config import MODE_70_MINUTE
+from models import Fixture, GoalEvent
 
 logger = logging.getLogger(__name__)
 
@@ -25,122 +25,14 @@ class NotificationManager:
     def __init__(self):
         pass
 
-    def is_goal_event(self, event: Dict) -> bool:
-        """
-        Проверяет является ли событие голом
-
-        Args:
-            event: Событие из API
-
-        Returns:
-            True если это гол
-        """
-        event_type = event.get('type', '').lower()
-        detail = event.get('detail', '').lower()
-
-        # Типы событий которые считаются голами
-        goal_types = ['goal', 'normal goal']
-        goal_details = ['normal goal', 'penalty', 'own goal']
-
-        return event_type in goal_types or detail in goal_details
-
-    def should_notify_70_minute_mode(self, minute: int, match_info: Dict, event: Dict) -> bool:
-        """
-        Проверяет подходит ли гол под режим "70 минута"
-
-        УСЛОВИЯ:
-        1. Гол забит на 69-й или 70-й минуте (69:00-70:59)
-        2. Это ПЕРВЫЙ гол в матче (счет после гола: 1:0 или 0:1)
-
-        Args:
-            minute: Минута гола
-            match_info: Информация о матче
-            event: Событие гола
-
-        Returns:
-            True если нужно уведомление
-        """
-        min_minute = MODE_70_MINUTE['min_minute']
-        max_minute = MODE_70_MINUTE['max_minute']
-
-        # УСЛОВИЕ 1: Проверяем что гол забит на 69-й или 70-й минуте
-        if not (min_minute <= minute <= max_minute):
-            logger.debug(f"❌ Режим '70 минута': Гол не на 69-70 минуте (минута: {minute})")
-            return False
-
-        # УСЛОВИЕ 2: Получаем текущий счет после гола
-        home_goals = match_info.get('home_goals', 0)
-        away_goals = match_info.get('away_goals', 0)
-
-        # Проверяем: это первый гол в матче?
-        # Счет должен быть СТРОГО 1:0 или 0:1
-        total_goals = home_goals + away_goals
-
-        if total_goals != 1:
-            logger.info(
-                f"❌ Режим '70 минута': НЕ первый гол на {minute}' "
-                f"(счет {home_goals}:{away_goals}, всего голов: {total_goals})"
-            )
-            return False
-
-        # ✅ ОБА УСЛОВИЯ ВЫПОЛНЕНЫ!
-        # Гол на 69-й или 70-й минуте И это первый гол в матче
-        logger.info(
-            f"✅ Режим '70 минута' СРАБОТАЛ: "
-            f"ПЕРВЫЙ гол на {minute}' минуте (счет {home_goals}:{away_goals})"
-        )
-        return True
-
-    def should_notify_penalty_early_mode(self, minute: int, event: Dict) -> bool:
-        """
-        Проверяет подходит ли гол под режим "Пенальти 2-10 мин"
-
-        УСЛОВИЯ:
-        1. Гол забит с пенальти (penalty)
-        2. Время гола: 2-10 минута
-
-        Args:
-            minute: Минута гола
-            event: Событие гола
-
-        Returns:
-            True если нужно уведомление
-        """
-        from config import MODE_PENALTY_EARLY
-
-        min_minute = MODE_PENALTY_EARLY['min_minute']
-        max_minute = MODE_PENALTY_EARLY['max_minute']
-
-        # УСЛОВИЕ 1: Проверяем что это пенальти
-        detail = event.get('detail', '').lower()
-
-        if 'penalty' not in detail:
-            logger.debug(f"❌ Режим 'Пенальти 2-10': Не пенальти (detail: {detail})")
-            return False
-
-        # УСЛОВИЕ 2: Проверяем минуту
-        if not (min_minute <= minute <= max_minute):
-            logger.info(
-                f"❌ Режим 'Пенальти 2-10': Пенальти не в нужное время "
-                f"(минута: {minute}, нужно {min_minute}-{max_minute})"
-            )
-            return False
-
-        # ✅ ОБА УСЛОВИЯ ВЫПОЛНЕНЫ!
-        logger.info(
-            f"✅ Режим 'Пенальти 2-10' СРАБОТАЛ: "
-            f"Пенальти на {minute}' минуте"
-        )
-        return True
-
     # Метод для форматирования аналитики
-    def create_goal_notification_with_analytics(self, match_info: Dict, event: Dict,
+    def create_goal_notification_with_analytics(self, fixture: Fixture, event: GoalEvent,
                                                 mode_name: str, analytics: Dict) -> str:
         """
         Создает уведомление о голе С АНАЛИТИКОЙ для режима "70 минута"
 
         Args:
-            match_info: Информация о матче
+            fixture: Матч
             event: Событие гола
             mode_name: Название режима
             analytics: Результаты анализа
@@ -158,12 +50,12 @@ class NotificationManager:
                 return name
 
         # Базовая информация
-        league = match_info.get('league', 'Неизвестная лига')
-        league_country = match_info.get('league_country', '')
-        home_team = match_info.get('home_team', '?')
-        away_team = match_info.get('away_team', '?')
-        home_goals = match_info.get('home_goals', 0)
-        away_goals = match_info.get('away_goals', 0)
+        league = fixture.league_name
+        league_country = fixture.league_country
+        home_team = fixture.home.name
+        away_team = fixture.away.name
+        home_goals = fixture.score.home
+        away_goals = fixture.score.away
 
         # Переводы
         league_ru = translate_league(league, league_country)
@@ -171,16 +63,14 @@ class NotificationManager:
         away_team_ru = translate_team(away_team)
 
         # Информация о голе
-        minute = event.get('time', {}).get('elapsed', '?')
-        player_name = event.get('player', {}).get('name', 'Неизвестный игрок')
-        team_name = event.get('team', {}).get('name', '?')
-        team_name_ru = translate_team(team_name)
-        detail = event.get('detail', '').lower()
+        minute = event.minute
+        player_name = event.player
+        team_name_ru = translate_team(event.team_name or '?')
 
         # Тип гола
-        if 'penalty' in detail:
+        if event.is_penalty:
             goal_type = '⚽️ (П)'
-        elif 'own' in detail:
+        elif event.is_own_goal:
             goal_type = '⚽️ (АГ)'
         else:
             goal_type = '⚽️'
@@ -259,12 +149,12 @@ class NotificationManager:
 
         return message
 
-    def create_goal_notification(self, match_info: Dict, event: Dict, mode_name: str) -> str:
+    def create_goal_notification(self, fixture: Fixture, event: GoalEvent, mode_name: str) -> str:
         """
         Создает текст уведомления о голе
 
         Args:
-            match_info: Информация о матче
+            fixture: Матч
             event: Событие гола
             mode_name: Название режима уведомления
 
@@ -272,13 +162,13 @@ class NotificationManager:
             Отформатированное сообщение
         """
         # Базовая информация
-        league = match_info.get('league_name', 'Неизвестная лига')
-        league_country = match_info.get('league_country', '')
-        home_team = match_info.get('home_team', '?')
-        away_team = match_info.get('away_team', '?')
-        home_goals = match_info.get('home_goals', 0)
-        away_goals = match_info.get('away_goals', 0)
-        minute = event.get('time', {}).get('elapsed', '?')
+        league = fixture.league_name
+        league_country = fixture.league_country
+        home_team = fixture.home.name
+        away_team = fixture.away.name
+        home_goals = fixture.score.home
+        away_goals = fixture.score.away
+        minute = event.minute
 
         # ПЕРЕВОДИМ НА РУССКИЙ
         league_ru = translate_league(league, league_country)
@@ -286,15 +176,13 @@ class NotificationManager:
         away_team_ru = translate_team(away_team)
 
         # Информация о голе
-        player_name = event.get('player', {}).get('name', 'Неизвестный игрок')
-        team_name = event.get('team', {}).get('name', '')
-        team_name_ru = translate_team(team_name)
-        detail = event.get('detail', 'Goal')
+        player_name = event.player
+        team_name_ru = translate_team(event.team_name)
 
         # Эмодзи в зависимости от типа гола
-        if 'penalty' in detail.lower():
+        if event.is_penalty:
             goal_emoji = '⚽️ (П)'
-        elif 'own' in detail.lower():
+        elif event.is_own_goal:
             goal_emoji = '⚽️ (АГ)'
         else:
             goal_emoji = '⚽️'
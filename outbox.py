@@ -0,0 +1,306 @@
+"""
+Надёжный outbox уведомлений
+Уведомление записывается ДО отправки и помечается доставленным ПОСЛЕ,
+поэтому перезапуск не приводит ни к повторной отправке, ни к потере уведомления
+"""
+import asyncio
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from config import (
+    OUTBOX_SQLITE_FILE,
+    OUTBOX_FLUSH_INTERVAL,
+    OUTBOX_RETENTION_HOURS,
+    OUTBOX_REPLAY_MINUTES
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _to_signed(fingerprint: int) -> int:
+    """64-битный отпечаток -> знаковый BIGINT для БД"""
+    return fingerprint - (1 << 64) if fingerprint >= (1 << 63) else fingerprint
+
+
+def _to_unsigned(fingerprint: int) -> int:
+    """Знаковый BIGINT из БД -> 64-битный отпечаток"""
+    return fingerprint + (1 << 64) if fingerprint < 0 else fingerprint
+
+
+class PostgresOutboxBackend:
+    """Outbox в PostgreSQL (через Database)"""
+
+    name = 'PostgreSQL'
+
+    def __init__(self, db):
+        self.db = db
+
+    async def open(self):
+        # Таблица создаётся в Database.create_tables
+        pass
+
+    async def insert(self, rows: List[Tuple[int, int, int, str]]):
+        await self.db.insert_outbox(rows)
+
+    async def mark_delivered(self, keys: List[Tuple[int, int, int]]):
+        await self.db.mark_outbox_delivered(keys)
+
+    async def load(self, since: datetime) -> List[Dict]:
+        return await self.db.get_outbox(since)
+
+    async def purge(self, before: datetime):
+        await self.db.purge_outbox(before)
+
+    async def close(self):
+        # Пулом подключений владеет Database
+        pass
+
+
+class SQLiteOutboxBackend:
+    """Локальный outbox в SQLite (когда нет DATABASE_URL)"""
+
+    name = 'SQLite'
+
+    def __init__(self, path: str = OUTBOX_SQLITE_FILE):
+        self.path = path
+        self.conn: Optional[sqlite3.Connection] = None
+
+    def _open(self):
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS notification_outbox (
+                user_id INTEGER NOT NULL,
+                fixture_id INTEGER NOT NULL,
+                fingerprint INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                delivered_at TIMESTAMP,
+                PRIMARY KEY (user_id, fixture_id, fingerprint)
+            )
+        ''')
+        self.conn.commit()
+
+    def _insert(self, rows):
+        with self.conn:
+            self.conn.executemany('''
+                INSERT OR IGNORE INTO notification_outbox (user_id, fixture_id, fingerprint, text)
+                VALUES (?, ?, ?, ?)
+            ''', rows)
+
+    def _mark_delivered(self, keys):
+        with self.conn:
+            self.conn.executemany('''
+                UPDATE notification_outbox
+                SET delivered_at = CURRENT_TIMESTAMP
+                WHERE user_id = ? AND fixture_id = ? AND fingerprint = ?
+            ''', keys)
+
+    def _load(self, since: datetime) -> List[Dict]:
+        cursor = self.conn.execute('''
+            SELECT user_id, fixture_id, fingerprint, text, created_at, delivered_at IS NOT NULL
+            FROM notification_outbox
+            WHERE created_at >= ?
+            ORDER BY created_at
+        ''', (since.strftime('%Y-%m-%d %H:%M:%S'),))
+
+        return [
+            {
+                'user_id': row[0],
+                'fixture_id': row[1],
+                'fingerprint': row[2],
+                'text': row[3],
+                'created_at': datetime.fromisoformat(row[4]),
+                'delivered': bool(row[5])
+            }
+            for row in cursor.fetchall()
+        ]
+
+    def _purge(self, before: datetime):
+        with self.conn:
+            self.conn.execute(
+                'DELETE FROM notification_outbox WHERE created_at < ?',
+                (before.strftime('%Y-%m-%d %H:%M:%S'),)
+            )
+
+    # Все операции SQLite выполняются в отдельном потоке - event loop не блокируется
+    async def open(self):
+        await asyncio.to_thread(self._open)
+
+    async def insert(self, rows):
+        await asyncio.to_thread(self._insert, rows)
+
+    async def mark_delivered(self, keys):
+        await asyncio.to_thread(self._mark_delivered, keys)
+
+    async def load(self, since: datetime) -> List[Dict]:
+        return await asyncio.to_thread(self._load, since)
+
+    async def purge(self, before: datetime):
+        await asyncio.to_thread(self._purge, before)
+
+    async def close(self):
+        if self.conn:
+            await asyncio.to_thread(self.conn.close)
+            self.conn = None
+
+
+class NotificationOutbox:
+    """
+    Outbox с групповой фиксацией:
+    записи копятся в буфере и сбрасываются в БД одной пачкой раз в OUTBOX_FLUSH_INTERVAL
+    """
+
+    def __init__(self, db=None):
+        self.db = db
+        self.backend = None
+
+        # Буферы до следующей групповой записи
+        self._pending_rows: List[Tuple[int, int, int, str]] = []
+        self._pending_waiters: List[asyncio.Future] = []
+        self._pending_delivered: List[Tuple[int, int, int]] = []
+
+        self._wakeup = asyncio.Event()
+
+    async def open(self):
+        """Выбирает хранилище (PostgreSQL или SQLite); фоновую запись ведёт сервис run()"""
+        if self.db is not None and self.db.pool is not None:
+            self.backend = PostgresOutboxBackend(self.db)
+        else:
+            self.backend = SQLiteOutboxBackend()
+
+        try:
+            await self.backend.open()
+        except Exception as e:
+            logger.error(f"❌ Ошибка открытия outbox ({self.backend.name}): {e}")
+
+        await self.purge_expired()
+
+        logger.info(f"📦 Outbox уведомлений: {self.backend.name}")
+
+    async def purge_expired(self):
+        """Удаляет записи старше OUTBOX_RETENTION_HOURS"""
+        if self.backend is None:
+            return
+
+        try:
+            await self.backend.purge(datetime.utcnow() - timedelta(hours=OUTBOX_RETENTION_HOURS))
+        except Exception as e:
+            logger.error(f"❌ Ошибка очистки outbox ({self.backend.name}): {e}")
+
+    async def add(self, fixture_id: int, fingerprint: int, user_ids: List[int], text: str):
+        """
+        Записывает уведомления в outbox и ждёт групповой фиксации
+
+        Args:
+            fixture_id: ID матча
+            fingerprint: Отпечаток гола
+            user_ids: Получатели
+            text: Текст уведомления
+        """
+        if self.backend is None or not user_ids:
+            return
+
+        signed = _to_signed(fingerprint)
+        self._pending_rows.extend((user_id, fixture_id, signed, text) for user_id in user_ids)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._pending_waiters.append(waiter)
+        self._wakeup.set()
+
+        await waiter
+
+    def mark_delivered(self, user_id: int, fixture_id: int, fingerprint: int):
+        """Помечает уведомление доставленным (запишется следующей пачкой, не блокирует)"""
+        if self.backend is None:
+            return
+
+        self._pending_delivered.append((user_id, fixture_id, _to_signed(fingerprint)))
+        self._wakeup.set()
+
+    async def recover(self) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Читает outbox после перезапуска
+
+        Returns:
+            (все недавние записи - для индекса дублей,
+             недоставленные свежие записи - для повторной отправки)
+        """
+        if self.backend is None:
+            return [], []
+
+        now = datetime.utcnow()
+
+        try:
+            rows = await self.backend.load(now - timedelta(hours=OUTBOX_RETENTION_HOURS))
+        except Exception as e:
+            logger.error(f"❌ Ошибка чтения outbox: {e}")
+            return [], []
+
+        for row in rows:
+            row['fingerprint'] = _to_unsigned(row['fingerprint'])
+
+        replay_since = now - timedelta(minutes=OUTBOX_REPLAY_MINUTES)
+        to_replay = [
+            row for row in rows
+            if not row['delivered'] and row['created_at'] >= replay_since
+        ]
+
+        logger.info(
+            f"📦 Outbox: {len(rows)} недавних уведомлений, "
+            f"{len(to_replay)} недоставленных будут отправлены повторно"
+        )
+
+        return rows, to_replay
+
+    async def _flush(self):
+        """Сбрасывает буферы в БД одной пачкой"""
+        rows, self._pending_rows = self._pending_rows, []
+        waiters, self._pending_waiters = self._pending_waiters, []
+        delivered, self._pending_delivered = self._pending_delivered, []
+
+        try:
+            if rows:
+                await self.backend.insert(rows)
+            if delivered:
+                await self.backend.mark_delivered(delivered)
+        except Exception as e:
+            # Не удалось записать - уведомления всё равно отправляем (лучше чем потерять)
+            logger.error(f"❌ Ошибка записи outbox ({len(rows)} новых, {len(delivered)} доставленных): {e}")
+        finally:
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(None)
+
+    def _release_waiters(self):
+        """Отпускает ждущих add() (уведомления отправятся и без записи в outbox)"""
+        waiters, self._pending_waiters = self._pending_waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def run(self):
+        """
+        Сервис для супервизора: групповая запись буферов
+        Если запись упала, ждущие add() отпускаются, а супервизор перезапускает сервис
+        """
+        try:
+            while True:
+                await self._wakeup.wait()
+
+                # Даём набраться пачке
+                await asyncio.sleep(OUTBOX_FLUSH_INTERVAL)
+
+                self._wakeup.clear()
+                await self._flush()
+        except Exception:
+            self._release_waiters()
+            raise
+
+    async def close(self):
+        """Дописывает буферы и закрывает хранилище (сервис run() уже остановлен)"""
+        if self.backend is not None:
+            await self._flush()
+            await self.backend.close()
@@ -0,0 +1,181 @@
+"""
+Отложенное сохранение состояния пользователей (write-behind)
+Обработчики команд только отмечают изменение в памяти, фоновый сервис
+сбрасывает накопленные изменения одной пачкой: в PostgreSQL (executemany upsert)
+или, без DATABASE_URL, атомарной перезаписью JSON файла вне event loop
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+from config import ACTIVE_USERS_FILE, PERSIST_DEBOUNCE_SECONDS, PERSIST_MAX_DELAY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def write_json_atomic(path: Path, data):
+    """Пишет JSON во временный файл и подменяет им старый (файл никогда не бывает недописанным)"""
+    tmp_path = path.with_name(path.name + '.tmp')
+
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+
+
+class UserStatePersistence:
+    """
+    Очередь изменений пользователей с задержкой записи
+
+    Запись происходит через PERSIST_DEBOUNCE_SECONDS после последнего изменения,
+    но не позже PERSIST_MAX_DELAY_SECONDS после первого несохранённого
+    (серия /start и /stop или остановка по квоте = одна запись)
+    """
+
+    def __init__(self, db=None, users_file: str = ACTIVE_USERS_FILE,
+                 debounce_seconds: float = PERSIST_DEBOUNCE_SECONDS,
+                 max_delay_seconds: float = PERSIST_MAX_DELAY_SECONDS):
+        self.db = db
+        self.users_file = Path(users_file)
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+
+        # Последнее известное состояние всех пользователей: user_id -> запись
+        self.users: Dict[int, Dict] = {}
+
+        # Несохранённые изменения
+        self._dirty: Dict[int, Dict] = {}
+        self._changed = asyncio.Event()
+
+        self.flush_count = 0
+
+    @property
+    def use_db(self) -> bool:
+        return self.db is not None and self.db.pool is not None
+
+    def record(self, user_id: int, username: str, is_running: bool):
+        """Отмечает изменение пользователя (без ожидания записи)"""
+        row = {
+            'user_id': user_id,
+            'username': username or 'Unknown',
+            'is_running': is_running,
+            'saved_at': datetime.now().isoformat()
+        }
+
+        self.users[user_id] = row
+        self._dirty[user_id] = row
+        self._changed.set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    # ===== ЗАГРУЗКА =====
+
+    async def load(self) -> List[Dict]:
+        """
+        Активные пользователи на момент остановки
+        (из БД, без DATABASE_URL - из JSON файла)
+        """
+        if self.use_db:
+            rows = await self.db.get_active_users()
+        else:
+            rows = await asyncio.to_thread(self._load_file)
+
+        for row in rows:
+            self.users[row['user_id']] = {
+                'user_id': row['user_id'],
+                'username': row.get('username', 'Unknown'),
+                'is_running': True,
+                'saved_at': row.get('saved_at')
+            }
+
+        return rows
+
+    def _load_file(self) -> List[Dict]:
+        if not self.users_file.exists():
+            return []
+
+        try:
+            with open(self.users_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            logger.info(f"📂 Загружено {len(data)} активных пользователей")
+            return data
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки активных пользователей: {e}")
+            return []
+
+    # ===== ЗАПИСЬ =====
+
+    async def flush(self) -> bool:
+        """
+        Сбрасывает накопленные изменения одной пачкой
+
+        Returns:
+            True если запись удалась (или писать было нечего)
+        """
+        if not self._dirty:
+            return True
+
+        batch = self._dirty
+        self._dirty = {}
+
+        try:
+            if self.use_db:
+                await self.db.save_users([
+                    (row['user_id'], row['username'], row['is_running'])
+                    for row in batch.values()
+                ])
+            else:
+                active = [
+                    {'user_id': row['user_id'], 'username': row['username'], 'saved_at': row['saved_at']}
+                    for row in self.users.values()
+                    if row['is_running']
+                ]
+                await asyncio.to_thread(write_json_atomic, self.users_file, active)
+        except Exception as e:
+            # Возвращаем в очередь то, что не перезаписано более новыми изменениями
+            for user_id, row in batch.items():
+                self._dirty.setdefault(user_id, row)
+            self._changed.set()
+            logger.error(f"❌ Ошибка сохранения пользователей ({len(batch)}): {e}")
+            return False
+
+        self.flush_count += 1
+        logger.info(f"💾 Сохранено изменений пользователей: {len(batch)} ({'БД' if self.use_db else 'файл'})")
+        return True
+
+    async def _wait_quiet(self):
+        """Ждёт паузы в изменениях (debounce), но не дольше max_delay_seconds"""
+        deadline = time.monotonic() + self.max_delay_seconds
+
+        while True:
+            self._changed.clear()
+            timeout = min(self.debounce_seconds, deadline - time.monotonic())
+
+            if timeout <= 0:
+                return
+
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return
+
+    async def run(self):
+        """Сервис для супервизора: ждёт изменений и сбрасывает их пачками"""
+        while True:
+            await self._changed.wait()
+            await self._wait_quiet()
+            await self.flush()
+
+    async def close(self):
+        """Дописывает несохранённые изменения (при остановке бота)"""
+        if self._dirty:
+            await self.flush()
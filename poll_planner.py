@@ -0,0 +1,191 @@
+"""
+Планировщик частоты опроса live матчей
+Часто опрашиваем только когда какой-то матч подходит к окну режима или правила,
+в остальное время (перерыв, «пустые» минуты) - редко
+"""
+import logging
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+import pytz
+
+from config import (
+    CHECK_INTERVAL_ACTIVE,
+    POLL_INTERVAL_FAST,
+    POLL_INTERVAL_SLOW_MIN,
+    POLL_INTERVAL_SLOW_MAX,
+    POLL_FAST_LEAD_MINUTES,
+    POLL_ACTIVE_LEAD_MINUTES,
+    POLL_KICKOFF_LOOKAHEAD_MINUTES
+)
+from models import Fixture
+from modes import MAX_MINUTE
+
+logger = logging.getLogger(__name__)
+
+# Перерывы: статус -> (минута, с которой продолжится игра, длительность перерыва в минутах)
+BREAKS = {
+    'HT': (46, 15),
+    'BT': (91, 5),
+}
+
+
+class PollPlanner:
+    """
+    Выбирает интервал до следующего live опроса
+
+    Горячие минуты (где может сработать уведомление) берутся из реестра режимов
+    (только режимы, включённые хотя бы у одного активного пользователя)
+    и из индекса пользовательских правил. Таблица «минута -> ближайшая
+    горячая минута» пересчитывается только когда меняются режимы или правила
+    """
+
+    def __init__(self, modes, rules=None, subscriptions=None):
+        self.modes = modes
+        self.rules = rules
+        self.subscriptions = subscriptions
+
+        # minute -> ближайшая горячая минута >= minute (или None)
+        self._next_hot: List[Optional[int]] = []
+        self._cache_key = None
+
+    def _active_mode_keys(self) -> frozenset:
+        if self.subscriptions is None:
+            return frozenset(mode.key for mode in self.modes.modes)
+
+        active_bits = self.subscriptions.active_bits
+        return frozenset(
+            key for key, mask in self.subscriptions.mode_bits.items()
+            if mask & active_bits
+        )
+
+    def _compile(self):
+        """Пересчитывает таблицу ближайших горячих минут (если режимы/правила изменились)"""
+        active_modes = self._active_mode_keys()
+        rules_version = self.rules.version if self.rules is not None else 0
+        cache_key = (active_modes, rules_version)
+
+        if cache_key == self._cache_key:
+            return
+
+        hot = [False] * (MAX_MINUTE + 1)
+
+        for mode in self.modes.modes:
+            if mode.key in active_modes:
+                for minute in range(mode.min_minute, min(mode.max_minute, MAX_MINUTE) + 1):
+                    hot[minute] = True
+
+        if self.rules is not None:
+            for minute in range(MAX_MINUTE + 1):
+                if not hot[minute] and self.rules.has_minute(minute):
+                    hot[minute] = True
+
+        next_hot: List[Optional[int]] = [None] * (MAX_MINUTE + 1)
+        upcoming = None
+        for minute in range(MAX_MINUTE, -1, -1):
+            if hot[minute]:
+                upcoming = minute
+            next_hot[minute] = upcoming
+
+        self._next_hot = next_hot
+        self._cache_key = cache_key
+
+    def approach_offsets(self) -> List[float]:
+        """
+        Через сколько минут после начала матча (по часам, с учётом перерыва)
+        матч подходит к каждому окну горячих минут - моменты для таймеров пробуждения
+        """
+        self._compile()
+
+        offsets = []
+        previous_hot = False
+
+        for minute in range(MAX_MINUTE + 1):
+            is_hot = self._next_hot[minute] == minute
+            if is_hot and not previous_hot:
+                # Игровая минута -> минута по часам (перерывы добавляют время)
+                clock_minute = max(0, minute - POLL_ACTIVE_LEAD_MINUTES)
+                for status, (resume_minute, break_minutes) in BREAKS.items():
+                    if clock_minute >= resume_minute:
+                        clock_minute += break_minutes
+                offsets.append(float(clock_minute))
+            previous_hot = is_hot
+
+        return offsets
+
+    def minutes_to_hot(self, fixture: Fixture, now: Optional[datetime] = None) -> Optional[float]:
+        """
+        Сколько игровых минут осталось матчу до ближайшей горячей минуты
+
+        Returns:
+            0 - матч уже в окне, None - горячих минут впереди нет
+        """
+        status = fixture.status.short
+
+        if status in BREAKS:
+            resume_minute, break_minutes = BREAKS[status]
+            upcoming = self._next_hot[resume_minute]
+            return None if upcoming is None else break_minutes + upcoming - resume_minute
+
+        if fixture.status.is_live:
+            elapsed = fixture.status.elapsed
+            if elapsed is None or status == 'P':
+                return None
+        elif fixture.kickoff_utc:
+            # Матч ещё не начался - считаем минуту от времени начала (может быть отрицательной)
+            now = now or datetime.now(pytz.utc)
+            elapsed = (now - fixture.kickoff_utc).total_seconds() / 60
+        else:
+            return None
+
+        minute = max(0, int(elapsed))
+        if minute > MAX_MINUTE:
+            return None
+
+        upcoming = self._next_hot[minute]
+        if upcoming is None:
+            return None
+
+        return max(0.0, upcoming - elapsed)
+
+    def next_interval(self, live: Iterable[Fixture], upcoming: Iterable[Fixture] = ()) -> int:
+        """
+        Интервал до следующего опроса по самому «горячему» матчу
+
+        Args:
+            live: Live матчи
+            upcoming: Матчи, которые скоро начнутся
+
+        Returns:
+            Секунды до следующего опроса
+        """
+        self._compile()
+
+        now = datetime.now(pytz.utc)
+        nearest = None
+
+        for fixture in live:
+            distance = self.minutes_to_hot(fixture, now)
+            if distance is not None and (nearest is None or distance < nearest):
+                nearest = distance
+
+        for fixture in upcoming:
+            if not fixture.kickoff_utc:
+                continue
+            if (fixture.kickoff_utc - now).total_seconds() > POLL_KICKOFF_LOOKAHEAD_MINUTES * 60:
+                continue
+            distance = self.minutes_to_hot(fixture, now)
+            if distance is not None and (nearest is None or distance < nearest):
+                nearest = distance
+
+        if nearest is None:
+            return POLL_INTERVAL_SLOW_MAX
+
+        if nearest <= POLL_FAST_LEAD_MINUTES:
+            return POLL_INTERVAL_FAST
+
+        if nearest <= POLL_ACTIVE_LEAD_MINUTES:
+            return CHECK_INTERVAL_ACTIVE
+
+        # Далеко от окон: опрос примерно раз в половину оставшегося времени, в пределах 30-60с
+        return int(min(POLL_INTERVAL_SLOW_MAX, max(POLL_INTERVAL_SLOW_MIN, nearest * 60 / 2)))
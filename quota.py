@@ -0,0 +1,277 @@
+"""
+Контроль расхода квоты API-Football
+Читает лимиты из заголовков каждого ответа и хранит журнал расхода на диске
+(запись журнала - в фоне, вне event loop)
+"""
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Mapping, Optional
+
+from config import (
+    API_DAILY_LIMIT,
+    API_MINUTE_LIMIT,
+    API_QUOTA_LEDGER_FILE,
+    QUOTA_WARN_RATIO,
+    QUOTA_SLOWDOWN_RATIO,
+    QUOTA_CRITICAL_RATIO
+)
+from persistence import write_json_atomic
+from rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Заголовки API-Football с лимитами
+DAILY_LIMIT_HEADER = 'x-ratelimit-requests-limit'
+DAILY_REMAINING_HEADER = 'x-ratelimit-requests-remaining'
+MINUTE_LIMIT_HEADER = 'X-RateLimit-Limit'
+MINUTE_REMAINING_HEADER = 'X-RateLimit-Remaining'
+
+
+def _header_int(headers: Mapping, name: str) -> Optional[int]:
+    """Достаёт целое значение заголовка (или None)"""
+    value = headers.get(name)
+
+    if value is None:
+        return None
+
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class QuotaGovernor:
+    """
+    Регулятор квоты: ведро токенов на каждое окно (сутки и минута)
+
+    Суточное ведро не пополняется само - оно сбрасывается в 00:00 UTC,
+    как и квота API-Football. Минутное ведро пополняется равномерно.
+    """
+
+    # Как часто сбрасываем журнал на диск
+    SAVE_EVERY_REQUESTS = 25
+    SAVE_EVERY_SECONDS = 60
+    # Сколько ждать перед записью, чтобы несколько изменений подряд ушли одной записью
+    SAVE_DEBOUNCE_SECONDS = 1
+
+    def __init__(self, ledger_file: str = API_QUOTA_LEDGER_FILE):
+        self.ledger_file = Path(ledger_file)
+
+        self.daily_bucket = TokenBucket(API_DAILY_LIMIT, 0)
+        self.minute_bucket = TokenBucket(API_MINUTE_LIMIT, API_MINUTE_LIMIT / 60)
+
+        self.ledger_date = self._utc_date()
+        self.used_today = 0
+
+        # Какой порог уже объявили в логе (чтобы не спамить)
+        self.announced_ratio = 0.0
+
+        self._unsaved_requests = 0
+        self._last_save = time.monotonic()
+
+        # Фоновая запись журнала и флаг «есть что записать»
+        self._save_task: Optional[asyncio.Task] = None
+        self._save_pending = False
+        self._save_lock = asyncio.Lock()
+
+        self.load_ledger()
+
+    @staticmethod
+    def _utc_date() -> str:
+        """Дата квоты (API сбрасывает лимит по UTC)"""
+        return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+    @property
+    def daily_limit(self) -> int:
+        return int(self.daily_bucket.capacity)
+
+    @property
+    def daily_remaining(self) -> int:
+        return int(self.daily_bucket.available())
+
+    @property
+    def used_ratio(self) -> float:
+        """Доля израсходованной суточной квоты"""
+        if self.daily_limit <= 0:
+            return 1.0
+        return self.used_today / self.daily_limit
+
+    def load_ledger(self):
+        """Загружает журнал расхода из файла (если он за сегодня)"""
+        if not self.ledger_file.exists():
+            return
+
+        try:
+            with open(self.ledger_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+
+            if data.get('date') != self.ledger_date:
+                logger.info("📒 Журнал квоты за прошлые сутки - начинаем с нуля")
+                return
+
+            limit = data.get('daily_limit') or API_DAILY_LIMIT
+            self.used_today = int(data.get('used', 0))
+            self.daily_bucket.sync(limit - self.used_today, capacity=limit)
+
+            logger.info(
+                f"📒 Журнал квоты загружен: израсходовано {self.used_today}/{self.daily_limit}"
+            )
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки журнала квоты: {e}")
+
+    async def save_ledger(self):
+        """Атомарно сохраняет журнал расхода в файл (запись в отдельном потоке)"""
+        async with self._save_lock:
+            data = {
+                'date': self.ledger_date,
+                'used': self.used_today,
+                'daily_limit': self.daily_limit,
+                'daily_remaining': self.daily_remaining,
+                'minute_limit': int(self.minute_bucket.capacity),
+                'saved_at': datetime.now().isoformat()
+            }
+
+            self._unsaved_requests = 0
+            self._last_save = time.monotonic()
+
+            try:
+                await asyncio.to_thread(write_json_atomic, self.ledger_file, data)
+            except Exception as e:
+                logger.error(f"❌ Ошибка сохранения журнала квоты: {e}")
+
+    def _request_save(self):
+        """Планирует фоновую запись журнала (без ожидания)"""
+        self._save_pending = True
+
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save_soon(), name='quota-ledger-save')
+
+    async def _save_soon(self):
+        """Пишет журнал после короткой паузы, пока появляются новые изменения"""
+        while self._save_pending:
+            await asyncio.sleep(self.SAVE_DEBOUNCE_SECONDS)
+            self._save_pending = False
+            await self.save_ledger()
+
+    def _maybe_save(self):
+        """Сбрасывает журнал на диск не чаще чем нужно"""
+        if (self._unsaved_requests >= self.SAVE_EVERY_REQUESTS
+                or time.monotonic() - self._last_save >= self.SAVE_EVERY_SECONDS):
+            self._request_save()
+
+    async def close(self):
+        """Дожидается фоновой записи и сохраняет журнал (при остановке бота)"""
+        # Не отменяем: прерванная запись продолжилась бы в потоке параллельно с финальной
+        if self._save_task is not None:
+            self._save_pending = False
+            await asyncio.gather(self._save_task, return_exceptions=True)
+            self._save_task = None
+
+        await self.save_ledger()
+
+    def _roll_day(self):
+        """Сбрасывает суточное окно после полуночи UTC"""
+        today = self._utc_date()
+
+        if today != self.ledger_date:
+            logger.info(f"🌅 Новые сутки квоты ({today}): вчера израсходовано {self.used_today}")
+            self.ledger_date = today
+            self.used_today = 0
+            self.announced_ratio = 0.0
+            self.daily_bucket.reset()
+            self._request_save()
+
+    async def acquire(self) -> bool:
+        """
+        Резервирует один запрос в обоих окнах
+        При исчерпании минутного окна ждёт, при исчерпании суточного - отказывает
+
+        Returns:
+            True если запрос можно делать
+        """
+        self._roll_day()
+
+        if not self.daily_bucket.try_acquire():
+            logger.error(f"⚠️ Суточная квота исчерпана ({self.used_today}/{self.daily_limit})")
+            return False
+
+        wait = self.minute_bucket.time_until_available()
+        if wait:
+            logger.warning(f"⏳ Минутный лимит API: ждём {wait:.1f}с")
+        await self.minute_bucket.acquire()
+
+        self.used_today += 1
+        self._unsaved_requests += 1
+        self._check_thresholds()
+        self._maybe_save()
+
+        return True
+
+    def update_from_headers(self, headers: Mapping):
+        """
+        Синхронизирует вёдра с фактическими остатками из заголовков ответа
+
+        Args:
+            headers: Заголовки ответа API
+        """
+        daily_limit = _header_int(headers, DAILY_LIMIT_HEADER)
+        daily_remaining = _header_int(headers, DAILY_REMAINING_HEADER)
+
+        if daily_remaining is not None:
+            self.daily_bucket.sync(daily_remaining, capacity=daily_limit)
+            self.used_today = max(0, self.daily_limit - daily_remaining)
+            self._check_thresholds()
+
+        minute_limit = _header_int(headers, MINUTE_LIMIT_HEADER)
+        minute_remaining = _header_int(headers, MINUTE_REMAINING_HEADER)
+
+        if minute_remaining is not None:
+            if minute_limit:
+                self.minute_bucket.refill_rate = minute_limit / 60
+            self.minute_bucket.sync(minute_remaining, capacity=minute_limit)
+
+    def mark_exhausted(self):
+        """API сообщил что квота исчерпана - верим ему"""
+        self.daily_bucket.sync(0)
+        self.used_today = self.daily_limit
+        self._request_save()
+
+    def _check_thresholds(self):
+        """Предупреждает в лог при переходе порогов расхода"""
+        ratio = self.used_ratio
+
+        for threshold in (QUOTA_CRITICAL_RATIO, QUOTA_SLOWDOWN_RATIO, QUOTA_WARN_RATIO):
+            if ratio >= threshold > self.announced_ratio:
+                self.announced_ratio = threshold
+                logger.warning(
+                    f"⚠️ Израсходовано {int(ratio * 100)}% суточной квоты "
+                    f"({self.used_today}/{self.daily_limit}). "
+                    f"Множитель интервала опроса: x{self.get_poll_multiplier()}"
+                )
+                break
+
+    def get_poll_multiplier(self) -> int:
+        """Во сколько раз замедлить опрос при текущем расходе квоты"""
+        ratio = self.used_ratio
+
+        if ratio >= QUOTA_CRITICAL_RATIO:
+            return 4
+        if ratio >= QUOTA_SLOWDOWN_RATIO:
+            return 2
+        return 1
+
+    def adjust_interval(self, interval: float) -> float:
+        """
+        Корректирует интервал опроса с учётом расхода квоты
+
+        Args:
+            interval: Базовый интервал в секундах
+
+        Returns:
+            Замедленный (при необходимости) интервал
+        """
+        return interval * self.get_poll_multiplier()
@@ -0,0 +1,98 @@
+"""
+Ограничители частоты запросов (token bucket)
+"""
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Классическое ведро токенов
+
+    Ёмкость ведра - максимальный «всплеск» запросов,
+    скорость пополнения - токенов в секунду (0 = ведро пополняется только через reset)
+    """
+
+    def __init__(self, capacity: float, refill_rate: float):
+        self.capacity = float(capacity)
+        self.refill_rate = float(refill_rate)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        """Доливает токены за прошедшее время"""
+        now = time.monotonic()
+
+        if self.refill_rate > 0:
+            elapsed = now - self.updated_at
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_rate)
+
+        self.updated_at = now
+
+    def available(self) -> float:
+        """Возвращает текущее количество токенов"""
+        self._refill()
+        return self.tokens
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """
+        Пытается забрать токены без ожидания
+
+        Returns:
+            True если токены получены
+        """
+        self._refill()
+
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+
+        return False
+
+    def time_until_available(self, tokens: float = 1) -> Optional[float]:
+        """
+        Секунды до появления нужного количества токенов
+
+        Returns:
+            Секунды ожидания или None если ведро само не пополняется
+        """
+        self._refill()
+
+        if self.tokens >= tokens:
+            return 0.0
+
+        if self.refill_rate <= 0:
+            return None
+
+        return (tokens - self.tokens) / self.refill_rate
+
+    async def acquire(self, tokens: float = 1):
+        """Ждёт появления токенов и забирает их"""
+        while not self.try_acquire(tokens):
+            wait = self.time_until_available(tokens)
+
+            if wait is None:
+                raise RuntimeError("Ведро токенов исчерпано и не пополняется")
+
+            await asyncio.sleep(wait)
+
+    def sync(self, remaining: float, capacity: Optional[float] = None):
+        """
+        Синхронизирует ведро с фактическим остатком (например, из заголовков API)
+
+        Args:
+            remaining: Фактический остаток токенов
+            capacity: Новая ёмкость (если известна)
+        """
+        self._refill()
+
+        if capacity:
+            self.capacity = float(capacity)
+
+        self.tokens = max(0.0, min(self.capacity, float(remaining)))
+
+    def reset(self):
+        """Полностью наполняет ведро"""
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
@@ -0,0 +1,355 @@
+"""
+Пользовательские правила уведомлений
+Правило задаётся строкой вида:
+
+    min=80-85 score=first league=136
+    min=0-15 goal=own
+
+- min     - окно минут (обязательно): 80-85 или одна минута 70
+- score   - счёт после гола: any, first (первый гол), draw (сравняли), lead (забившие впереди)
+- goal    - тип гола: any, normal (с игры), penalty, own (автогол)
+- league  - ID лиг через запятую (по умолчанию - все лиги)
+
+Подбор правил для гола индексирован: таблица по минуте + хэш по лиге,
+поэтому проверяются только правила с подходящими минутой и лигой
+"""
+import asyncio
+import json
+import logging
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional
+
+from config import RULES_FILE, MAX_RULES_PER_USER
+from models import Fixture, GoalEvent
+from modes import (
+    MAX_MINUTE,
+    any_score,
+    first_goal_of_match,
+    level_score,
+    scorer_leads,
+    any_goal,
+    normal_goal,
+    penalty_goal,
+    own_goal
+)
+from persistence import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+# Условия по счёту: значение в правиле -> (проверка, описание)
+SCORE_CONDITIONS = {
+    'any': (any_score, 'любой счёт'),
+    'first': (first_goal_of_match, 'первый гол'),
+    'draw': (level_score, 'сравняли счёт'),
+    'lead': (scorer_leads, 'забившие впереди'),
+}
+
+# Условия по типу гола: значение в правиле -> (проверка, описание)
+GOAL_CONDITIONS = {
+    'any': (any_goal, 'любой гол'),
+    'normal': (normal_goal, 'с игры'),
+    'penalty': (penalty_goal, 'пенальти'),
+    'own': (own_goal, 'автогол'),
+}
+
+# Ключ индекса для правил без фильтра по лигам
+ANY_LEAGUE = None
+
+
+class Rule:
+    """Правило пользователя"""
+
+    __slots__ = ('id', 'user_id', 'min_minute', 'max_minute', 'score', 'goal', 'leagues')
+
+    def __init__(self, rule_id: Optional[int], user_id: int, min_minute: int, max_minute: int,
+                 score: str = 'any', goal: str = 'any', leagues: FrozenSet[int] = frozenset()):
+        self.id = rule_id
+        self.user_id = user_id
+        self.min_minute = min_minute
+        self.max_minute = max_minute
+        self.score = score
+        self.goal = goal
+        self.leagues = leagues
+
+    @classmethod
+    def parse(cls, spec: str, user_id: int, rule_id: Optional[int] = None) -> 'Rule':
+        """
+        Разбирает текст правила
+
+        Args:
+            spec: Текст правила (min=80-85 score=first league=136)
+            user_id: Владелец правила
+            rule_id: ID правила (если уже сохранено)
+
+        Returns:
+            Rule
+
+        Raises:
+            ValueError: Ошибка в тексте правила (сообщение для пользователя)
+        """
+        fields = {}
+
+        for token in spec.split():
+            key, sep, value = token.partition('=')
+            key = key.lower()
+
+            if not sep or not value:
+                raise ValueError(f"Не понял «{token}» - нужно ключ=значение")
+            if key not in ('min', 'score', 'goal', 'league'):
+                raise ValueError(f"Неизвестный ключ «{key}»")
+            if key in fields:
+                raise ValueError(f"Ключ «{key}» указан дважды")
+
+            fields[key] = value.lower()
+
+        if 'min' not in fields:
+            raise ValueError("Укажи окно минут: min=80-85")
+
+        start, sep, end = fields['min'].partition('-')
+        try:
+            min_minute = int(start)
+            max_minute = int(end) if sep else min_minute
+        except ValueError:
+            raise ValueError(f"Неверное окно минут «{fields['min']}»")
+
+        if not (0 <= min_minute <= max_minute <= MAX_MINUTE):
+            raise ValueError(f"Окно минут должно быть в пределах 0-{MAX_MINUTE}")
+
+        score = fields.get('score', 'any')
+        if score not in SCORE_CONDITIONS:
+            raise ValueError(f"score может быть: {', '.join(SCORE_CONDITIONS)}")
+
+        goal = fields.get('goal', 'any')
+        if goal not in GOAL_CONDITIONS:
+            raise ValueError(f"goal может быть: {', '.join(GOAL_CONDITIONS)}")
+
+        leagues = frozenset()
+        if 'league' in fields:
+            try:
+                leagues = frozenset(int(league_id) for league_id in fields['league'].split(',') if league_id)
+            except ValueError:
+                raise ValueError(f"Неверный список лиг «{fields['league']}» - нужны ID через запятую")
+
+        return cls(rule_id, user_id, min_minute, max_minute, score, goal, leagues)
+
+    def to_spec(self) -> str:
+        """Каноничный текст правила (так оно хранится)"""
+        spec = f"min={self.min_minute}-{self.max_minute} score={self.score} goal={self.goal}"
+        if self.leagues:
+            spec += f" league={','.join(str(league_id) for league_id in sorted(self.leagues))}"
+        return spec
+
+    def describe(self) -> str:
+        """Описание правила для пользователя"""
+        parts = [
+            f"{self.min_minute}-{self.max_minute}'",
+            SCORE_CONDITIONS[self.score][1],
+            GOAL_CONDITIONS[self.goal][1]
+        ]
+        if self.leagues:
+            parts.append(f"лиги {', '.join(str(league_id) for league_id in sorted(self.leagues))}")
+        return ' · '.join(parts)
+
+    @property
+    def score_predicate(self):
+        return SCORE_CONDITIONS[self.score][0]
+
+    @property
+    def detail_predicate(self):
+        return GOAL_CONDITIONS[self.goal][0]
+
+    def matches(self, fixture: Fixture, event: GoalEvent) -> bool:
+        """Проверяет условия по счёту и типу гола (минута и лига уже проверены индексом)"""
+        return self.detail_predicate(event) and self.score_predicate(fixture, event)
+
+
+class RuleIndex:
+    """
+    Индекс правил: минута -> лига (или ANY_LEAGUE) -> правила
+
+    Подбор правил для гола - два поиска в словаре вместо перебора всех правил
+    """
+
+    def __init__(self):
+        self._by_minute: List[Dict[Optional[int], List[Rule]]] = [{} for _ in range(MAX_MINUTE + 1)]
+        self.rules: Dict[int, Rule] = {}
+
+        # Растёт при каждом изменении (по нему планировщик опроса видит что правила поменялись)
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def _keys(self, rule: Rule):
+        return rule.leagues or (ANY_LEAGUE,)
+
+    def has_minute(self, minute: int) -> bool:
+        """Есть ли правила, в окно которых попадает минута"""
+        return bool(self._by_minute[minute])
+
+    def add(self, rule: Rule):
+        self.rules[rule.id] = rule
+        self.version += 1
+
+        for minute in range(rule.min_minute, rule.max_minute + 1):
+            bucket = self._by_minute[minute]
+            for league_id in self._keys(rule):
+                bucket.setdefault(league_id, []).append(rule)
+
+    def remove(self, rule_id: int) -> Optional[Rule]:
+        rule = self.rules.pop(rule_id, None)
+
+        if rule is None:
+            return None
+
+        self.version += 1
+
+        for minute in range(rule.min_minute, rule.max_minute + 1):
+            bucket = self._by_minute[minute]
+            for league_id in self._keys(rule):
+                rules = bucket.get(league_id)
+                if rules:
+                    rules.remove(rule)
+                    if not rules:
+                        del bucket[league_id]
+
+        return rule
+
+    def match(self, fixture: Fixture, event: GoalEvent) -> List[Rule]:
+        """
+        Правила, под которые подходит гол
+
+        Args:
+            fixture: Матч (счёт уже с учётом гола)
+            event: Событие гола
+
+        Returns:
+            Подходящие правила
+        """
+        return [rule for rule in self.candidates(event.minute, fixture.league_id) if rule.matches(fixture, event)]
+
+    def candidates(self, minute: int, league_id: Optional[int]) -> List[Rule]:
+        """Правила, в окно которых попадает минута и под которые подходит лига"""
+        if not (0 <= minute <= MAX_MINUTE):
+            return []
+
+        bucket = self._by_minute[minute]
+
+        if not bucket:
+            return []
+
+        candidates = bucket.get(league_id, [])
+        if ANY_LEAGUE in bucket:
+            candidates = candidates + bucket[ANY_LEAGUE]
+
+        return candidates
+
+
+class RuleStore:
+    """
+    Хранилище правил: PostgreSQL (через Database) или JSON файл
+    В памяти правила держатся в RuleIndex
+    """
+
+    def __init__(self, db=None, rules_file: str = RULES_FILE):
+        self.db = db
+        self.rules_file = Path(rules_file)
+        self.index = RuleIndex()
+
+        # Записи файла по очереди (последняя запись - самое свежее состояние)
+        self._save_lock = asyncio.Lock()
+
+    @property
+    def use_db(self) -> bool:
+        return self.db is not None and self.db.pool is not None
+
+    async def load(self):
+        """Загружает правила всех пользователей"""
+        if self.use_db:
+            rows = await self.db.get_rules()
+        else:
+            rows = self._load_file()
+
+        for row in rows:
+            try:
+                self.index.add(Rule.parse(row['spec'], row['user_id'], row['rule_id']))
+            except ValueError as e:
+                logger.warning(f"⚠️ Пропущено правило #{row.get('rule_id')}: {e}")
+
+        logger.info(f"📐 Загружено {len(self.index)} пользовательских правил")
+
+    def _load_file(self) -> List[Dict]:
+        if not self.rules_file.exists():
+            return []
+
+        try:
+            with open(self.rules_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки правил: {e}")
+            return []
+
+    async def _save_file(self):
+        """Атомарная перезапись файла вне event loop (обработчик команды не ждёт диска)"""
+        async with self._save_lock:
+            data = [
+                {'rule_id': rule.id, 'user_id': rule.user_id, 'spec': rule.to_spec()}
+                for rule in self.index.rules.values()
+            ]
+            try:
+                await asyncio.to_thread(write_json_atomic, self.rules_file, data)
+            except Exception as e:
+                logger.error(f"❌ Ошибка сохранения правил: {e}")
+
+    def for_user(self, user_id: int) -> List[Rule]:
+        """Правила пользователя (по возрастанию ID)"""
+        return sorted(
+            (rule for rule in self.index.rules.values() if rule.user_id == user_id),
+            key=lambda rule: rule.id
+        )
+
+    async def add(self, user_id: int, spec: str) -> Rule:
+        """
+        Добавляет правило пользователя
+
+        Raises:
+            ValueError: Ошибка в тексте правила или превышен лимит правил
+        """
+        rule = Rule.parse(spec, user_id)
+
+        if len(self.for_user(user_id)) >= MAX_RULES_PER_USER:
+            raise ValueError(f"Не больше {MAX_RULES_PER_USER} правил на пользователя")
+
+        if self.use_db:
+            rule.id = await self.db.add_rule(user_id, rule.to_spec())
+            if rule.id is None:
+                raise ValueError("Не удалось сохранить правило, попробуй позже")
+            self.index.add(rule)
+        else:
+            rule.id = max(self.index.rules, default=0) + 1
+            self.index.add(rule)
+            await self._save_file()
+
+        logger.info(f"📐 Правило #{rule.id} пользователя {user_id}: {rule.to_spec()}")
+        return rule
+
+    async def delete(self, user_id: int, rule_id: int) -> bool:
+        """Удаляет правило пользователя; False если такого правила у него нет"""
+        rule = self.index.rules.get(rule_id)
+
+        if rule is None or rule.user_id != user_id:
+            return False
+
+        if self.use_db and not await self.db.delete_rule(user_id, rule_id):
+            return False
+
+        self.index.remove(rule_id)
+
+        if not self.use_db:
+            await self._save_file()
+
+        logger.info(f"🗑 Правило #{rule_id} пользователя {user_id} удалено")
+        return True
+
+    def match(self, fixture: Fixture, event: GoalEvent) -> List[Rule]:
+        return self.index.match(fixture, event)
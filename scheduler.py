@@ -2,24 +2,58 @@
 Планировщик матчей для оптимизации API запросов
 """
 import asyncio
+import bisect
 import logging
+import time
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
-import pytz
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from config import (
+    SCHEDULE_DAYS_BEFORE,
+    SCHEDULE_DAYS_AFTER,
+    SCHEDULE_REFRESH_HOURS,
+    SCHEDULE_STALE_HOURS
+)
+from fixture_store import FixtureStore
+from models import Fixture, MOSCOW_TZ, FINISHED_STATUSES
 
 logger = logging.getLogger(__name__)
 
+# Статусы, при которых окно матча закрывается (завершён, перенесён, отменён)
+CLOSED_STATUSES = FINISHED_STATUSES | {'PST'}
+
+# Дополнительное время и серия пенальти - окно продлевается
+EXTRA_TIME_STATUSES = frozenset(['ET', 'BT'])
+PENALTIES_STATUSES = frozenset(['P'])
+
 
 class MatchScheduler:
     """Класс для управления расписанием матчей и оптимизации запросов"""
 
-    def __init__(self, api):
+    def __init__(self, api, store: FixtureStore, timers=None,
+                 approach_offsets: Optional[Callable[[], List[float]]] = None):
         self.api = api
-        self.today_fixtures = []
+
+        # Таймеры пробуждения глобального цикла (timers.WakeupTimers)
+        self.timers = timers
+
+        # Минуты от начала матча, когда он подходит к окнам режимов (от планировщика опроса)
+        self.approach_offsets = approach_offsets
+
+        # Общее хранилище матчей (расписание + live данные)
+        self.store = store
         self.last_update_date = None
 
+        # Кэш расписания по датам (МСК): дата -> матчи и момент загрузки.
+        # Живёт в планировщике - переживает перезапуски глобального цикла
+        self._schedule_by_date: Dict[str, List[Fixture]] = {}
+        self._fetched_at: Dict[str, float] = {}
+
+        # Одновременные обновления (цикл, плановое, прогрев) не дублируют запросы
+        self._update_lock = asyncio.Lock()
+
         # Таймзона Москвы
-        self.moscow_tz = pytz.timezone('Europe/Moscow')
+        self.moscow_tz = MOSCOW_TZ
 
         # За сколько минут до матча начинаем проверки
         self.start_check_before_minutes = 5
@@ -27,37 +61,121 @@ class MatchScheduler:
         # Сколько минут после окончания продолжаем проверки
         self.continue_check_after_minutes = 15
 
+        # На сколько минут от текущего момента продлеваем окно в овертайме / серии пенальти
+        self.extra_time_extension_minutes = 45
+        self.penalties_extension_minutes = 20
+
+        # Матчи, пропавшие из live без итогового статуса: дозапрос с нарастающей паузой,
+        # после vanished_max_attempts попыток - сдаёмся, окно закрывается по расписанию
+        self.vanished_retry_seconds = 60
+        self.vanished_max_attempts = 5
+        self._vanished: Dict[int, Tuple[int, float]] = {}  # fixture_id -> (попыток, следующая попытка)
+        self._abandoned: Set[int] = set()
+
+        # Окна проверки по матчам: fixture_id -> (начало, конец) в секундах эпохи
+        self._fixture_windows: Dict[int, Tuple[float, float]] = {}
+
+        # Те же окна, отсортированные по началу: (начало, конец, fixture_id)
+        self._sorted_windows: List[Tuple[float, float, int]] = []
+
+        # Объединённые непересекающиеся окна: начала и концы по возрастанию
+        self._merged_starts: List[float] = []
+        self._merged_ends: List[float] = []
+        self._merged_dirty = False
+
+        # Ключи таймеров каждого матча
+        self._fixture_timers: Dict[int, List[Tuple]] = {}
+
     def get_current_date(self) -> str:
         """Возвращает текущую дату в Москве"""
         now_moscow = datetime.now(self.moscow_tz)
         return now_moscow.strftime('%Y-%m-%d')
 
-    async def update_daily_schedule(self) -> bool:
+    def schedule_dates(self) -> List[str]:
+        """Даты скользящего расписания по Москве: вчера, сегодня, завтра"""
+        today = datetime.now(self.moscow_tz).date()
+        return [
+            (today + timedelta(days=offset)).strftime('%Y-%m-%d')
+            for offset in range(-SCHEDULE_DAYS_BEFORE, SCHEDULE_DAYS_AFTER + 1)
+        ]
+
+    def _dates_to_fetch(self, dates: List[str], refresh: bool) -> List[str]:
+        """
+        Даты, которые нужно запросить: отсутствующие в кэше, а начиная
+        с сегодняшней - ещё и устаревшие (или все при плановом обновлении)
         """
-        Обновляет расписание матчей на день
-        Вызывается в 00:00 каждого дня
+        today = self.get_current_date()
+        now = time.time()
+
+        to_fetch = []
+        for date in dates:
+            if date not in self._schedule_by_date:
+                to_fetch.append(date)
+            elif date >= today and (refresh or now - self._fetched_at.get(date, 0) >= SCHEDULE_STALE_HOURS * 3600):
+                to_fetch.append(date)
+
+        return to_fetch
+
+    async def update_daily_schedule(self, refresh: bool = False) -> bool:
+        """
+        Обновляет скользящее расписание (вчера, сегодня, завтра по Москве)
+        Запрашиваются только недостающие и устаревшие даты, остальное берётся из кэша
+
+        Args:
+            refresh: Плановое обновление - перезапросить сегодня и завтра
 
         Returns:
-            True если обновление успешно
+            True если что-то запрашивалось и расписание обновлено
         """
+        async with self._update_lock:
+            return await self._update_schedule(refresh)
+
+    async def _update_schedule(self, refresh: bool) -> bool:
         try:
-            current_date = self.get_current_date()
+            dates = self.schedule_dates()
 
-            logger.info(f"📅 Обновление расписания матчей на {current_date}...")
+            # Даты, выпавшие из диапазона, забываем
+            for date in [d for d in self._schedule_by_date if d not in dates]:
+                del self._schedule_by_date[date]
+                self._fetched_at.pop(date, None)
 
-            # Запрашиваем матчи на сегодня (ОДИН запрос на весь день!)
-            fixtures = await self.api.get_fixtures_by_date(current_date)
+            to_fetch = self._dates_to_fetch(dates, refresh)
+            self.last_update_date = self.get_current_date()
 
-            if not fixtures:
-                logger.warning(f"⚠️ Не найдено матчей на {current_date}")
-                self.today_fixtures = []
-                self.last_update_date = current_date
+            if not to_fetch:
+                logger.info(f"📅 Расписание на {dates[0]} - {dates[-1]} актуально (из кэша)")
                 return False
 
-            self.today_fixtures = fixtures
-            self.last_update_date = current_date
-
-            logger.info(f"✅ Загружено {len(fixtures)} матчей на {current_date}")
+            logger.info(f"📅 Обновление расписания матчей на {', '.join(to_fetch)}...")
+
+            # ОДИН запрос на каждую дату, параллельно
+            results = await asyncio.gather(*(self.api.get_fixtures_by_date(date) for date in to_fetch))
+
+            fetched_ids = set()
+            for date, fixtures in zip(to_fetch, results):
+                if fixtures:
+                    self._schedule_by_date[date] = fixtures
+                    self._fetched_at[date] = time.time()
+                    fetched_ids.update(fixture.id for fixture in fixtures)
+                    logger.info(f"✅ Загружено {len(fixtures)} матчей на {date}")
+                else:
+                    # Пусто (или ошибка) - тоже кэшируем с отметкой времени, иначе день без матчей
+                    # запрашивался бы при каждом обновлении; прежние данные даты не затираем
+                    self._schedule_by_date.setdefault(date, [])
+                    self._fetched_at[date] = time.time()
+                    logger.warning(f"⚠️ Не найдено матчей на {date}")
+
+            # Сливаем даты в одно расписание. Матчи из кэша берём из хранилища -
+            # там статусы и счёт, обновлённые live опросами
+            merged = []
+            for date in dates:
+                for fixture in self._schedule_by_date.get(date, ()):
+                    if fixture.id not in fetched_ids:
+                        fixture = self.store.get(fixture.id) or fixture
+                    merged.append(fixture)
+
+            self.store.load_schedule(merged)
+            self.rebuild_windows()
 
             # Логируем расписание
             self.log_schedule()
@@ -70,36 +188,23 @@ class MatchScheduler:
 
     def log_schedule(self):
         """Выводит расписание матчей в лог"""
-        if not self.today_fixtures:
+        if not len(self.store):
             return
 
         logger.info("=" * 60)
-        logger.info(f"📋 РАСПИСАНИЕ НА {self.last_update_date}")
+        logger.info(f"📋 РАСПИСАНИЕ (сегодня {self.last_update_date})")
         logger.info("=" * 60)
 
-        # Группируем по времени начала
+        # Группируем по дню и времени начала
         by_time = {}
 
-        for fixture in self.today_fixtures:
-            fixture_date_str = fixture.get('fixture', {}).get('date')
-            if not fixture_date_str:
-                continue
-
-            try:
-                utc_time = datetime.fromisoformat(fixture_date_str.replace('Z', '+00:00'))
-                moscow_time = utc_time.astimezone(self.moscow_tz)
-                time_key = moscow_time.strftime('%H:%M')
-
-                if time_key not in by_time:
-                    by_time[time_key] = []
+        for fixture in self.store.by_kickoff():
+            time_key = fixture.kickoff_msk.strftime('%d.%m %H:%M') if fixture.kickoff_msk else 'TBD'
 
-                home = fixture.get('teams', {}).get('home', {}).get('name', '?')
-                away = fixture.get('teams', {}).get('away', {}).get('name', '?')
-                league = fixture.get('league', {}).get('name', '?')
+            if time_key not in by_time:
+                by_time[time_key] = []
 
-                by_time[time_key].append(f"{home} - {away} ({league})")
-            except:
-                continue
+            by_time[time_key].append(f"{fixture.home.name} - {fixture.away.name} ({fixture.league_name})")
 
         # Выводим по времени
         for time_key in sorted(by_time.keys()):
@@ -109,75 +214,275 @@ class MatchScheduler:
 
         logger.info("=" * 60)
 
-    def get_next_match_window(self) -> Optional[Tuple[datetime, datetime]]:
+    # ===== ОКНА ПРОВЕРКИ =====
+
+    def _window_for(self, fixture: Fixture, now: Optional[float] = None) -> Optional[Tuple[float, float]]:
         """
-        Находит следующее окно времени когда нужно проверять матчи
+        Окно проверки матча в секундах эпохи с учётом статуса
 
-        Returns:
-            (start_time, end_time) или None если матчей нет
+        - обычно: за N минут до начала ... 120 минут после начала + continue_check_after_minutes
+        - завершён / перенесён / отменён: окна нет
+        - овертайм / пенальти: окно продлевается от текущего момента
+        - матч идёт дольше расчётного: окно продлевается на continue_check_after_minutes
+
+        Продление идёт шагами: пока до прежнего конца окна остаётся не меньше половины
+        продления, окно не двигается (иначе каждый опрос переставлял бы таймеры матча)
         """
-        if not self.today_fixtures:
+        status = fixture.status.short
+
+        if not fixture.kickoff_utc or status in CLOSED_STATUSES:
             return None
 
-        now_moscow = datetime.now(self.moscow_tz)
+        now = time.time() if now is None else now
+        kickoff = fixture.kickoff_utc.timestamp()
 
-        # Ищем ближайший матч который ещё не закончился
-        upcoming_matches = []
+        start = kickoff - self.start_check_before_minutes * 60
+        end = kickoff + (120 + self.continue_check_after_minutes) * 60
 
-        for fixture in self.today_fixtures:
-            status = fixture.get('fixture', {}).get('status', {}).get('short', 'NS')
-            fixture_date_str = fixture.get('fixture', {}).get('date')
+        extension_minutes = None
+        if status in EXTRA_TIME_STATUSES:
+            extension_minutes = self.extra_time_extension_minutes
+        elif status in PENALTIES_STATUSES:
+            extension_minutes = self.penalties_extension_minutes
+        elif fixture.status.is_live and end < now + self.continue_check_after_minutes * 60:
+            # Затянувшийся матч (задержки, долгое добавленное время)
+            extension_minutes = 2 * self.continue_check_after_minutes
 
-            if not fixture_date_str:
-                continue
+        # Матч, итог которого так и не узнали, не продлеваем - окно по расписанию
+        if extension_minutes is not None and fixture.id not in self._abandoned:
+            previous = self._fixture_windows.get(fixture.id)
+
+            if previous is not None and previous[1] - now >= extension_minutes * 60 / 2:
+                end = max(end, previous[1])
+            else:
+                end = max(end, now + extension_minutes * 60)
+
+        return (start, end)
+
+    def _set_window(self, fixture_id: int, window: Optional[Tuple[float, float]]) -> bool:
+        """Ставит окно матча в отсортированный список; True если окно изменилось"""
+        previous = self._fixture_windows.get(fixture_id)
+
+        if previous == window:
+            return False
+
+        if previous is not None:
+            entry = (previous[0], previous[1], fixture_id)
+            pos = bisect.bisect_left(self._sorted_windows, entry)
+            if pos < len(self._sorted_windows) and self._sorted_windows[pos] == entry:
+                del self._sorted_windows[pos]
+            del self._fixture_windows[fixture_id]
+
+        if window is not None:
+            self._fixture_windows[fixture_id] = window
+            bisect.insort(self._sorted_windows, (window[0], window[1], fixture_id))
+
+        self._merged_dirty = True
+        self._schedule_timers(fixture_id, window)
+        return True
+
+    def _schedule_timers(self, fixture_id: int, window: Optional[Tuple[float, float]]):
+        """
+        Таймеры пробуждения матча: начало окна (за N минут до начала),
+        подход к окнам режимов и конец окна (финальный свисток)
+        """
+        if self.timers is None:
+            return
+
+        for key in self._fixture_timers.pop(fixture_id, ()):
+            self.timers.cancel(key)
+
+        if window is None:
+            return
+
+        now = time.time()
+        start, end = window
+        kickoff = start + self.start_check_before_minutes * 60
+
+        wakeups = [
+            ((fixture_id, 'window_start'), start, f'начало окна матча {fixture_id}'),
+            ((fixture_id, 'window_end'), end, f'конец окна матча {fixture_id}'),
+        ]
+
+        for offset in (self.approach_offsets() if self.approach_offsets else ()):
+            wakeups.append((
+                (fixture_id, 'approach', offset),
+                kickoff + offset * 60,
+                f'матч {fixture_id} подходит к {offset:.0f}-й минуте от начала'
+            ))
+
+        keys = []
+        for key, when, reason in wakeups:
+            if when > now:
+                self.timers.schedule(key, when, reason)
+                keys.append(key)
+
+        if keys:
+            self._fixture_timers[fixture_id] = keys
+
+    def rebuild_windows(self):
+        """Строит окна заново по всему хранилищу (после загрузки расписания)"""
+        for fixture_id in list(self._fixture_timers):
+            self._schedule_timers(fixture_id, None)
+
+        self._fixture_windows = {}
+        self._sorted_windows = []
+
+        for fixture in self.store.all():
+            window = self._window_for(fixture)
+            if window is not None:
+                self._fixture_windows[fixture.id] = window
+                self._sorted_windows.append((window[0], window[1], fixture.id))
+                self._schedule_timers(fixture.id, window)
+
+        self._sorted_windows.sort()
+        self._merge_windows()
+
+        logger.info(
+            f"🪟 Окон проверки: {len(self._merged_starts)} (из {len(self._sorted_windows)} матчей)"
+        )
+
+    def update_fixtures(self, fixtures: Iterable[Fixture]):
+        """
+        Обновляет окна матчей по свежим статусам
+        (вызывается после каждого live опроса с изменёнными и идущими матчами)
+
+        Args:
+            fixtures: Матчи со свежими данными
+        """
+        now = time.time()
+        changed = 0
+        closed = 0
+
+        for fixture in fixtures:
+            window = self._window_for(fixture, now)
+
+            if self._set_window(fixture.id, window):
+                changed += 1
+                if window is None:
+                    closed += 1
+                    logger.info(
+                        f"🏁 Окно закрыто: {fixture.home.name} - {fixture.away.name} ({fixture.status.short})"
+                    )
+
+        if changed:
+            logger.info(f"🪟 Обновлены окна проверки {changed} матчей (закрыто {closed})")
+
+    def vanished_from_live(self, live_ids: Iterable[int]) -> List[int]:
+        """
+        Матчи, которые в хранилище числятся идущими, но пропали из live
+        (скорее всего завершились - их итоговый статус нужно дозапросить)
+
+        Args:
+            live_ids: ID матчей из последнего live опроса
+        """
+        live_ids = set(live_ids)
+        now = time.time()
+
+        # Вернулись в live - попытки забываем
+        for fixture_id in [fid for fid in self._vanished if fid in live_ids]:
+            del self._vanished[fixture_id]
+        self._abandoned -= live_ids
 
-            try:
-                utc_time = datetime.fromisoformat(fixture_date_str.replace('Z', '+00:00'))
-                match_start = utc_time.astimezone(self.moscow_tz)
-
-                # Примерное время окончания (начало + 120 минут)
-                match_end = match_start + timedelta(minutes=120 + self.continue_check_after_minutes)
-
-                # Начинаем проверять за N минут до начала
-                check_start = match_start - timedelta(minutes=self.start_check_before_minutes)
-
-                # Если матч ещё не закончился
-                if now_moscow < match_end:
-                    upcoming_matches.append({
-                        'start': check_start,
-                        'end': match_end,
-                        'match_start': match_start,
-                        'status': status
-                    })
-            except:
+        due = []
+        for fixture in self.store.live():
+            if fixture.id in live_ids or fixture.id in self._abandoned:
                 continue
 
-        if not upcoming_matches:
-            return None
+            _, next_try = self._vanished.get(fixture.id, (0, 0.0))
+            if now >= next_try:
+                due.append(fixture.id)
+
+        return due
 
-        # Сортируем по времени начала
-        upcoming_matches.sort(key=lambda x: x['start'])
+    def is_abandoned(self, fixture_id: int) -> bool:
+        return fixture_id in self._abandoned
 
-        # Объединяем пересекающиеся окна
-        merged_windows = []
-        current_window = upcoming_matches[0]
+    def resolve_vanished(self, requested_ids: Iterable[int], fixtures: Iterable[Fixture]):
+        """
+        Учитывает ответ на дозапрос пропавших матчей
 
-        for match in upcoming_matches[1:]:
-            # Если матчи пересекаются - объединяем
-            if match['start'] <= current_window['end']:
-                current_window['end'] = max(current_window['end'], match['end'])
+        Матч с итоговым статусом снимается с дозапроса; не вернувшийся или всё ещё
+        «идущий» - следующая попытка через vanished_retry_seconds * 2^(попытка - 1),
+        после vanished_max_attempts попыток окно закрывается по расписанию
+
+        Args:
+            requested_ids: ID, которые запрашивали
+            fixtures: Что вернул API
+        """
+        resolved = {fixture.id for fixture in fixtures if not fixture.status.is_live}
+        now = time.time()
+
+        for fixture_id in requested_ids:
+            if fixture_id in resolved:
+                self._vanished.pop(fixture_id, None)
+                continue
+
+            attempts = self._vanished.get(fixture_id, (0, 0.0))[0] + 1
+
+            if attempts < self.vanished_max_attempts:
+                self._vanished[fixture_id] = (attempts, now + self.vanished_retry_seconds * 2 ** (attempts - 1))
+                continue
+
+            del self._vanished[fixture_id]
+            self._abandoned.add(fixture_id)
+            logger.warning(
+                f"⚠️ Матч {fixture_id} пропал из live, итог неизвестен после {attempts} попыток - "
+                f"окно закрывается по расписанию"
+            )
+
+            fixture = self.store.get(fixture_id)
+            if fixture is not None:
+                self._set_window(fixture_id, self._window_for(fixture))
+
+    def _merge_windows(self):
+        """Объединяет пересекающиеся окна (список уже отсортирован - один проход)"""
+        starts = []
+        ends = []
+
+        for start, end, _ in self._sorted_windows:
+            if ends and start <= ends[-1]:
+                if end > ends[-1]:
+                    ends[-1] = end
             else:
-                merged_windows.append(current_window)
-                current_window = match
+                starts.append(start)
+                ends.append(end)
 
-        merged_windows.append(current_window)
+        self._merged_starts = starts
+        self._merged_ends = ends
+        self._merged_dirty = False
 
-        # Возвращаем ближайшее окно
-        for window in merged_windows:
-            if now_moscow < window['end']:
-                return (window['start'], window['end'])
+    def _next_window_bounds(self, now: Optional[float] = None) -> Optional[Tuple[float, float]]:
+        """Ближайшее незакончившееся окно в секундах эпохи - поиск bisect, O(log n)"""
+        if self._merged_dirty:
+            self._merge_windows()
 
-        return None
+        now = time.time() if now is None else now
+
+        # Концы объединённых окон возрастают - первое окно, которое ещё не закончилось
+        pos = bisect.bisect_right(self._merged_ends, now)
+
+        if pos >= len(self._merged_ends):
+            return None
+
+        return self._merged_starts[pos], self._merged_ends[pos]
+
+    def get_next_match_window(self) -> Optional[Tuple[datetime, datetime]]:
+        """
+        Находит следующее окно времени когда нужно проверять матчи
+
+        Returns:
+            (start_time, end_time) или None если матчей нет
+        """
+        bounds = self._next_window_bounds()
+
+        if bounds is None:
+            return None
+
+        return (
+            datetime.fromtimestamp(bounds[0], self.moscow_tz),
+            datetime.fromtimestamp(bounds[1], self.moscow_tz)
+        )
 
     def should_check_now(self) -> bool:
         """
@@ -186,16 +491,14 @@ class MatchScheduler:
         Returns:
             True если мы внутри окна проверки матчей
         """
-        window = self.get_next_match_window()
+        now = time.time()
+        bounds = self._next_window_bounds(now)
 
-        if not window:
+        if not bounds:
             return False
 
-        start_time, end_time = window
-        now_moscow = datetime.now(self.moscow_tz)
-
         # Проверяем находимся ли мы внутри окна
-        return start_time <= now_moscow <= end_time
+        return bounds[0] <= now <= bounds[1]
 
     def get_time_until_next_check(self) -> Optional[int]:
         """
@@ -204,28 +507,22 @@ class MatchScheduler:
         Returns:
             Секунды до следующей проверки или None если проверок больше нет
         """
-        window = self.get_next_match_window()
+        now = time.time()
+        bounds = self._next_window_bounds(now)
 
-        if not window:
+        if not bounds:
             # Нет матчей - спим до полуночи
-            now_moscow = datetime.now(self.moscow_tz)
-            tomorrow = now_moscow + timedelta(days=1)
-            next_midnight = tomorrow.replace(hour=0, minute=0, second=0, microsecond=0)
+            return int(self.next_midnight().timestamp() - now)
 
-            seconds = (next_midnight - now_moscow).total_seconds()
-            return int(seconds)
-
-        start_time, end_time = window
-        now_moscow = datetime.now(self.moscow_tz)
+        start, end = bounds
 
         # Если мы внутри окна - не спим
-        if start_time <= now_moscow <= end_time:
+        if start <= now <= end:
             return 0
 
         # Если окно ещё не началось - спим до его начала
-        if now_moscow < start_time:
-            seconds = (start_time - now_moscow).total_seconds()
-            return int(seconds)
+        if now < start:
+            return int(start - now)
 
         # Если окно закончилось - ищем следующее
         # (этот случай не должен происходить, но на всякий случай)
@@ -233,38 +530,26 @@ class MatchScheduler:
 
     def get_active_matches_count(self) -> int:
         """Возвращает количество активных матчей прямо сейчас"""
-        count = 0
-
-        for fixture in self.today_fixtures:
-            status = fixture.get('fixture', {}).get('status', {}).get('short', 'NS')
-            if status in ['1H', '2H', 'HT', 'ET', 'BT', 'P', 'LIVE']:
-                count += 1
-
-        return count
-
-    async def schedule_daily_update(self):
-        """
-        Запускает автоматическое обновление расписания каждый день в 00:00
-        """
-        while True:
-            try:
-                now_moscow = datetime.now(self.moscow_tz)
+        return self.store.count_live()
 
-                # Вычисляем время до следующей полуночи
-                tomorrow = now_moscow + timedelta(days=1)
-                next_midnight = tomorrow.replace(hour=0, minute=0, second=0, microsecond=0)
-
-                seconds_until_midnight = (next_midnight - now_moscow).total_seconds()
-
-                hours = seconds_until_midnight / 3600
-                logger.info(f"⏰ Следующее обновление расписания через {hours:.1f}ч ({next_midnight.strftime('%H:%M')} МСК)")
-
-                # Ждём до полуночи
-                await asyncio.sleep(seconds_until_midnight)
-
-                # Обновляем расписание
-                await self.update_daily_schedule()
+    def next_midnight(self) -> datetime:
+        """Следующая полночь по Москве"""
+        now_moscow = datetime.now(self.moscow_tz)
+        tomorrow = now_moscow + timedelta(days=1)
+        return tomorrow.replace(hour=0, minute=0, second=0, microsecond=0)
 
-            except Exception as e:
-                logger.error(f"❌ Ошибка в планировщике: {e}")
-                await asyncio.sleep(3600)  # Повтор через час при ошибке
\ No newline at end of file
+    def next_refresh_time(self) -> datetime:
+        """Ближайший час планового обновления расписания (SCHEDULE_REFRESH_HOURS, МСК)"""
+        now_moscow = datetime.now(self.moscow_tz)
+        hours = sorted(SCHEDULE_REFRESH_HOURS)
+        day = now_moscow.date()
+
+        upcoming = [hour for hour in hours if hour > now_moscow.hour]
+        if upcoming:
+            hour = upcoming[0]
+        else:
+            # Сегодня обновлений больше нет - первое завтрашнее
+            hour = hours[0]
+            day += timedelta(days=1)
+
+        return self.moscow_tz.localize(datetime(day.year, day.month, day.day, hour))
@@ -0,0 +1,230 @@
+"""
+Подписки пользователей на лиги и режимы
+В памяти - обратные индексы на битовых масках: пользователь = номер бита,
+лига/режим -> маска подписанных пользователей, плюс маска активных пользователей.
+Получатели уведомления - пересечение масок, без перебора всех пользователей
+"""
+import asyncio
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from config import SUBSCRIPTIONS_FILE
+from persistence import write_json_atomic
+
+logger = logging.getLogger(__name__)
+
+
+def iter_bits(mask: int):
+    """Номера установленных битов маски (по возрастанию)"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class Subscriptions:
+    """
+    Индекс подписок
+
+    - league_bits: лига -> маска пользователей, подписанных на неё
+    - all_leagues_bits: пользователи без фильтра по лигам (получают все лиги)
+    - mode_bits: режим -> маска пользователей, у которых режим включён
+    - active_bits: пользователи, у которых бот запущен (/start)
+    """
+
+    def __init__(self, mode_keys: Iterable[str], db=None, subscriptions_file: str = SUBSCRIPTIONS_FILE):
+        self.mode_keys = list(mode_keys)
+        self.db = db
+        self.subscriptions_file = Path(subscriptions_file)
+
+        # Номер бита пользователя и обратно
+        self._bit_of: Dict[int, int] = {}
+        self._user_of: List[int] = []
+
+        # Подписки пользователя: лиги (None - все лиги) и включённые режимы
+        self.user_leagues: Dict[int, Optional[Set[int]]] = {}
+        self.user_modes: Dict[int, Set[str]] = {}
+
+        # Обратные индексы
+        self.league_bits: Dict[int, int] = {}
+        self.all_leagues_bits = 0
+        self.mode_bits: Dict[str, int] = {key: 0 for key in self.mode_keys}
+        self.active_bits = 0
+
+        # Записи файла по очереди (последняя запись - самое свежее состояние)
+        self._save_lock = asyncio.Lock()
+
+    @property
+    def use_db(self) -> bool:
+        return self.db is not None and self.db.pool is not None
+
+    def _bit(self, user_id: int) -> int:
+        """Бит пользователя (новый пользователь - подписан на все лиги и режимы)"""
+        bit = self._bit_of.get(user_id)
+
+        if bit is None:
+            bit = self._bit_of[user_id] = len(self._user_of)
+            self._user_of.append(user_id)
+            self._apply(user_id, None, set(self.mode_keys))
+
+        return bit
+
+    def _users(self, mask: int) -> List[int]:
+        return [self._user_of[bit] for bit in iter_bits(mask)]
+
+    def _apply(self, user_id: int, leagues: Optional[Set[int]], modes: Set[str]):
+        """Переписывает подписки пользователя в индексах"""
+        flag = 1 << self._bit_of[user_id]
+
+        # Убираем старые подписки
+        old_leagues = self.user_leagues.get(user_id)
+        if old_leagues is None:
+            self.all_leagues_bits &= ~flag
+        else:
+            for league_id in old_leagues:
+                self.league_bits[league_id] &= ~flag
+                if not self.league_bits[league_id]:
+                    del self.league_bits[league_id]
+
+        for key in self.mode_bits:
+            self.mode_bits[key] &= ~flag
+
+        # Ставим новые
+        if leagues is None:
+            self.all_leagues_bits |= flag
+        else:
+            for league_id in leagues:
+                self.league_bits[league_id] = self.league_bits.get(league_id, 0) | flag
+
+        for key in modes:
+            if key in self.mode_bits:
+                self.mode_bits[key] |= flag
+
+        self.user_leagues[user_id] = leagues
+        self.user_modes[user_id] = {key for key in modes if key in self.mode_bits}
+
+    # ===== АКТИВНЫЕ ПОЛЬЗОВАТЕЛИ =====
+
+    def set_active(self, user_id: int, active: bool):
+        flag = 1 << self._bit(user_id)
+
+        if active:
+            self.active_bits |= flag
+        else:
+            self.active_bits &= ~flag
+
+    def is_active(self, user_id: int) -> bool:
+        bit = self._bit_of.get(user_id)
+        return bit is not None and bool(self.active_bits >> bit & 1)
+
+    def has_active(self) -> bool:
+        return self.active_bits != 0
+
+    def active_count(self) -> int:
+        return bin(self.active_bits).count('1')
+
+    def active_user_ids(self) -> List[int]:
+        return self._users(self.active_bits)
+
+    # ===== ПОЛУЧАТЕЛИ =====
+
+    def recipients(self, league_id: Optional[int], mode_key: str) -> List[int]:
+        """
+        Активные пользователи, подписанные на лигу и режим
+
+        Args:
+            league_id: ID лиги матча
+            mode_key: Ключ режима
+
+        Returns:
+            Список ID пользователей
+        """
+        mask = self.active_bits & self.mode_bits.get(mode_key, 0)
+
+        if not mask:
+            return []
+
+        return self._users(mask & (self.all_leagues_bits | self.league_bits.get(league_id, 0)))
+
+    def has_recipients(self, league_id: Optional[int], mode_key: str) -> bool:
+        """Есть ли хоть один получатель (только маски, без списка пользователей)"""
+        mask = self.active_bits & self.mode_bits.get(mode_key, 0)
+        return bool(mask & (self.all_leagues_bits | self.league_bits.get(league_id, 0)))
+
+    # ===== ИЗМЕНЕНИЕ ПОДПИСОК =====
+
+    def leagues_of(self, user_id: int) -> Optional[Set[int]]:
+        """Лиги пользователя (None - все лиги)"""
+        self._bit(user_id)
+        return self.user_leagues[user_id]
+
+    def modes_of(self, user_id: int) -> Set[str]:
+        self._bit(user_id)
+        return self.user_modes[user_id]
+
+    async def set_leagues(self, user_id: int, leagues: Optional[Iterable[int]]):
+        """Подписывает пользователя на лиги (None - на все)"""
+        self._bit(user_id)
+        self._apply(user_id, set(leagues) if leagues is not None else None, self.user_modes[user_id])
+        await self._save(user_id)
+
+    async def set_modes(self, user_id: int, modes: Iterable[str]):
+        """Включает пользователю только указанные режимы"""
+        self._bit(user_id)
+        self._apply(user_id, self.user_leagues[user_id], set(modes))
+        await self._save(user_id)
+
+    # ===== ХРАНЕНИЕ =====
+
+    async def load(self):
+        """Загружает подписки из БД или JSON файла"""
+        if self.use_db:
+            rows = await self.db.get_subscriptions()
+        else:
+            rows = self._load_file()
+
+        for row in rows:
+            self._bit(row['user_id'])
+            leagues = row.get('leagues')
+            self._apply(
+                row['user_id'],
+                set(leagues) if leagues is not None else None,
+                set(row.get('modes') or ())
+            )
+
+        logger.info(f"🔔 Загружены подписки {len(rows)} пользователей")
+
+    def _load_file(self) -> List[Dict]:
+        if not self.subscriptions_file.exists():
+            return []
+
+        try:
+            with open(self.subscriptions_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"❌ Ошибка загрузки подписок: {e}")
+            return []
+
+    def _row(self, user_id: int) -> Dict:
+        leagues = self.user_leagues[user_id]
+        return {
+            'user_id': user_id,
+            'leagues': sorted(leagues) if leagues is not None else None,
+            'modes': sorted(self.user_modes[user_id])
+        }
+
+    async def _save(self, user_id: int):
+        if self.use_db:
+            row = self._row(user_id)
+            await self.db.save_subscription(user_id, row['leagues'], row['modes'])
+            return
+
+        # Без БД - атомарная перезапись файла вне event loop (обработчик не ждёт диска)
+        async with self._save_lock:
+            data = [self._row(uid) for uid in self._user_of]
+            try:
+                await asyncio.to_thread(write_json_atomic, self.subscriptions_file, data)
+            except Exception as e:
+                logger.error(f"❌ Ошибка сохранения подписок: {e}")
@@ -0,0 +1,202 @@
+"""
+Супервизор фоновых сервисов
+Каждый долгоживущий сервис (live опрос, обновление расписания, диспетчер,
+уборка кэшей) существует в одном экземпляре: повторный запуск ничего не делает,
+упавший сервис перезапускается с экспоненциальной задержкой, при остановке
+бота все сервисы отменяются
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from config import SUPERVISOR_BACKOFF_INITIAL, SUPERVISOR_BACKOFF_MAX
+
+logger = logging.getLogger(__name__)
+
+# Состояния сервиса
+STARTING = 'starting'
+RUNNING = 'running'
+BACKOFF = 'backoff'
+FINISHED = 'finished'
+STOPPED = 'stopped'
+
+STATE_EMOJI = {
+    STARTING: '🟡',
+    RUNNING: '🟢',
+    BACKOFF: '🟠',
+    FINISHED: '⚪',
+    STOPPED: '⚫',
+}
+
+
+class Service:
+    """Зарегистрированный сервис и его состояние"""
+
+    __slots__ = ('name', 'factory', 'restart', 'task', 'state', 'restarts',
+                 'last_error', 'started_at', 'next_restart_at')
+
+    def __init__(self, name: str, factory: Callable[[], Awaitable], restart: bool):
+        self.name = name
+        self.factory = factory
+        self.restart = restart
+        self.task: Optional[asyncio.Task] = None
+        self.state = STOPPED
+        self.restarts = 0
+        self.last_error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.next_restart_at: Optional[float] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+
+class ServiceSupervisor:
+    """
+    Владелец фоновых задач бота
+
+    Сервис - корутина-фабрика. Нормальное завершение корутины = сервис закончил
+    работу (например, глобальный цикл без активных пользователей), исключение =
+    падение: перезапуск через SUPERVISOR_BACKOFF_INITIAL, 2x, 4x ... секунд
+    (не больше SUPERVISOR_BACKOFF_MAX; задержка сбрасывается, если сервис
+    проработал дольше максимальной задержки)
+    """
+
+    def __init__(self, backoff_initial: float = SUPERVISOR_BACKOFF_INITIAL,
+                 backoff_max: float = SUPERVISOR_BACKOFF_MAX):
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.services: Dict[str, Service] = {}
+
+    def register(self, name: str, factory: Callable[[], Awaitable], restart: bool = True):
+        """
+        Регистрирует сервис (без запуска)
+
+        Args:
+            name: Имя сервиса
+            factory: Функция, возвращающая корутину сервиса
+            restart: Перезапускать ли после падения
+        """
+        self.services[name] = Service(name, factory, restart)
+
+    def is_running(self, name: str) -> bool:
+        service = self.services.get(name)
+        return service is not None and service.is_running
+
+    def start(self, name: str) -> bool:
+        """
+        Запускает сервис, если он ещё не запущен
+
+        Returns:
+            True если запущен новый экземпляр
+        """
+        service = self.services[name]
+
+        if service.is_running:
+            return False
+
+        service.state = STARTING
+        service.task = asyncio.create_task(self._run(service), name=f'service-{name}')
+        return True
+
+    async def _run(self, service: Service):
+        backoff = self.backoff_initial
+
+        while True:
+            service.state = RUNNING
+            service.started_at = time.time()
+            service.next_restart_at = None
+
+            try:
+                await service.factory()
+                service.state = FINISHED
+                return
+            except asyncio.CancelledError:
+                service.state = STOPPED
+                raise
+            except Exception as e:
+                service.last_error = f"{type(e).__name__}: {e}"
+                logger.error(f"❌ Сервис {service.name} упал: {service.last_error}")
+
+                if not service.restart:
+                    service.state = FINISHED
+                    return
+
+            # Долго проработал - значит падение случайное, начинаем задержки заново
+            if time.time() - service.started_at > self.backoff_max:
+                backoff = self.backoff_initial
+
+            service.state = BACKOFF
+            service.restarts += 1
+            service.next_restart_at = time.time() + backoff
+            logger.warning(f"🔁 Перезапуск сервиса {service.name} через {backoff:.0f}с")
+
+            try:
+                await asyncio.sleep(backoff)
+            except asyncio.CancelledError:
+                service.state = STOPPED
+                raise
+
+            backoff = min(backoff * 2, self.backoff_max)
+
+    async def stop(self, name: str, timeout: float = 5):
+        """Отменяет сервис и ждёт его завершения"""
+        service = self.services.get(name)
+
+        if service is None or service.task is None:
+            return
+
+        if not service.task.done():
+            service.task.cancel()
+            try:
+                await asyncio.wait_for(asyncio.gather(service.task, return_exceptions=True), timeout=timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"⚠️ Сервис {service.name} не остановился за {timeout}с")
+
+        service.state = STOPPED
+        service.task = None
+
+    async def stop_all(self, timeout: float = 5):
+        """Останавливает все сервисы (в обратном порядке регистрации)"""
+        for name in reversed(list(self.services)):
+            await self.stop(name, timeout)
+
+        logger.info("⏹ Все фоновые сервисы остановлены")
+
+    def status(self) -> List[Dict]:
+        """Состояние сервисов для /status"""
+        now = time.time()
+        report = []
+
+        for service in self.services.values():
+            report.append({
+                'name': service.name,
+                'state': service.state,
+                'restarts': service.restarts,
+                'last_error': service.last_error,
+                'uptime': now - service.started_at if service.state == RUNNING and service.started_at else None,
+                'restart_in': max(0.0, service.next_restart_at - now) if service.state == BACKOFF else None,
+            })
+
+        return report
+
+    def report(self) -> str:
+        """Текстовый отчёт о сервисах"""
+        lines = []
+
+        for item in self.status():
+            line = f"{STATE_EMOJI.get(item['state'], '❔')} {item['name']}: {item['state']}"
+
+            if item['uptime'] is not None:
+                line += f", {int(item['uptime'] // 3600)}ч {int(item['uptime'] % 3600 // 60)}мин"
+            if item['restart_in'] is not None:
+                line += f", перезапуск через {item['restart_in']:.0f}с"
+            if item['restarts']:
+                line += f", перезапусков: {item['restarts']}"
+            if item['last_error']:
+                line += f"\n    последняя ошибка: {item['last_error']}"
+
+            lines.append(line)
+
+        return '\n'.join(lines)
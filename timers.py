@@ -0,0 +1,140 @@
+"""
+Таймеры пробуждения глобального цикла
+Куча (min-heap) моментов, когда циклу нужно проснуться (начало окна матча,
+подход к окну режима, финальный свисток, обновление расписания),
+плюс asyncio.Event для внешних «толчков» (/start, новое расписание)
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Ключ пробуждений от внешних толчков
+NUDGE = 'nudge'
+
+
+class Wakeup:
+    """Запланированное пробуждение"""
+
+    __slots__ = ('when', 'seq', 'key', 'reason', 'cancelled')
+
+    def __init__(self, when: float, seq: int, key: Hashable, reason: str):
+        self.when = when
+        self.seq = seq
+        self.key = key
+        self.reason = reason
+        self.cancelled = False
+
+    def __lt__(self, other: 'Wakeup') -> bool:
+        return (self.when, self.seq) < (other.when, other.seq)
+
+
+class WakeupTimers:
+    """
+    Куча пробуждений с ленивым удалением
+
+    Ключ таймера уникален: повторное планирование заменяет старый момент
+    (старая запись помечается отменённой и выбрасывается при извлечении)
+    """
+
+    def __init__(self):
+        self._heap: List[Wakeup] = []
+        self._entries: Dict[Hashable, Wakeup] = {}
+        self._seq = itertools.count()
+
+        self._nudge = asyncio.Event()
+        self._nudge_reasons: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def schedule(self, key: Hashable, when: float, reason: str = ''):
+        """
+        Планирует пробуждение (заменяет прежнее с тем же ключом)
+
+        Args:
+            key: Ключ таймера, например (fixture_id, 'kickoff')
+            when: Момент в секундах эпохи
+            reason: Описание для лога
+        """
+        previous = self._entries.get(key)
+
+        if previous is not None:
+            if previous.when == when:
+                return
+            previous.cancelled = True
+
+        entry = Wakeup(when, next(self._seq), key, reason)
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+
+    def cancel(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            entry.cancelled = True
+
+    def _drop_cancelled(self):
+        while self._heap and self._heap[0].cancelled:
+            heapq.heappop(self._heap)
+
+    def next_wakeup(self) -> Optional[Wakeup]:
+        """Ближайшее пробуждение (или None)"""
+        self._drop_cancelled()
+        return self._heap[0] if self._heap else None
+
+    def pop_due(self, now: Optional[float] = None) -> List[Wakeup]:
+        """Извлекает все наступившие пробуждения"""
+        now = time.time() if now is None else now
+        due = []
+
+        self._drop_cancelled()
+        while self._heap and self._heap[0].when <= now:
+            entry = heapq.heappop(self._heap)
+            if not entry.cancelled:
+                del self._entries[entry.key]
+                due.append(entry)
+            self._drop_cancelled()
+
+        return due
+
+    def nudge(self, reason: str):
+        """Будит спящий цикл немедленно"""
+        self._nudge_reasons.append(reason)
+        self._nudge.set()
+
+    async def sleep(self, max_seconds: Optional[float] = None) -> List[Wakeup]:
+        """
+        Спит до ближайшего таймера, внешнего толчка или max_seconds
+
+        Args:
+            max_seconds: Наибольшая длительность сна (None - без ограничения)
+
+        Returns:
+            Сработавшие пробуждения (толчки - с ключом NUDGE; пустой список - истёк max_seconds)
+        """
+        now = time.time()
+        deadline = now + max_seconds if max_seconds is not None else None
+
+        upcoming = self.next_wakeup()
+        if upcoming is not None and (deadline is None or upcoming.when < deadline):
+            deadline = upcoming.when
+
+        timeout = max(0.0, deadline - now) if deadline is not None else None
+
+        if not self._nudge.is_set():
+            try:
+                await asyncio.wait_for(self._nudge.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        now = time.time()
+        woke = [Wakeup(now, next(self._seq), NUDGE, reason) for reason in self._nudge_reasons]
+        self._nudge_reasons = []
+        self._nudge.clear()
+
+        woke.extend(self.pop_due(now))
+        return woke